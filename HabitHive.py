@@ -15,9 +15,6 @@ API_KEY = os.getenv("FIREBASE_API_KEY", "your-default-api-key")
 DATA_FILE = "users.json"
 AVATAR_DIR = "avatars"
 
-# Create folders if not exist
-os.makedirs(AVATAR_DIR, exist_ok=True)
-
 # ------------------------------
 # HELPER FUNCTIONS
 # ------------------------------
@@ -229,6 +226,7 @@ def get_user_input(prompt):
 
 
 def main():
+    os.makedirs(AVATAR_DIR, exist_ok=True)
     print("\n🌱 Welcome to HabitHive!")
     print("Your personal habit-tracking and profile management app 🐝")
 
@@ -0,0 +1,81 @@
+"""
+Build-free asset fingerprinting.
+
+`AssetManifest(static_folder, patterns)` hashes the matching files once at
+startup and maps each logical name to a content-addressed one:
+
+    css/style.css  ->  css/style.5f1c0e9a2b7d.css
+
+Templates link assets through `static_url()` (see web_app.py), which emits
+the hashed name; `/assets/<name>` serves hashed names as immutable for a
+year, so a repeat page view makes no requests for them. A changed file gets
+a new name and therefore a new URL. With `auto_reload` (debug mode) files
+are re-hashed when their mtime changes.
+"""
+import glob
+import hashlib
+import os
+import re
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+HASH_LENGTH = 12
+_HASHED = re.compile(r'^(?P<stem>.+)\.(?P<digest>[0-9a-f]{%d})(?P<ext>\.[^./]+)$' % HASH_LENGTH)
+
+
+def hashed_name(name: str, digest: str) -> str:
+    stem, ext = os.path.splitext(name)
+    return f'{stem}.{digest[:HASH_LENGTH]}{ext}'
+
+
+def logical_name(name: str) -> Optional[str]:
+    """`css/style.<digest>.css` -> `css/style.css`; None for a name without a digest."""
+    match = _HASHED.match(name)
+    return match.group('stem') + match.group('ext') if match else None
+
+
+class AssetManifest:
+    def __init__(self, static_folder: str, patterns: Iterable[str], auto_reload: bool = False):
+        self.static_folder = static_folder
+        self.patterns = tuple(patterns)
+        self.auto_reload = auto_reload
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Tuple[float, str]] = {}  # logical -> (mtime, hashed)
+        self._reverse: Dict[str, str] = {}  # hashed -> logical
+        self.build()
+
+    def _files(self):
+        for pattern in self.patterns:
+            for path in sorted(glob.glob(os.path.join(self.static_folder, pattern))):
+                if os.path.isfile(path):
+                    yield os.path.relpath(path, self.static_folder).replace(os.sep, '/'), path
+
+    def build(self):
+        """Hash every matching file whose mtime changed since the last build."""
+        entries = {}
+        for name, path in self._files():
+            mtime = os.path.getmtime(path)
+            previous = self._entries.get(name)
+            if previous and previous[0] == mtime:
+                entries[name] = previous
+                continue
+            with open(path, 'rb') as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+            entries[name] = (mtime, hashed_name(name, digest))
+        with self._lock:
+            self._entries = entries
+            self._reverse = {hashed: name for name, (_, hashed) in entries.items()}
+
+    def url_name(self, name: str) -> Optional[str]:
+        """Hashed name for a logical asset name, or None if it is not fingerprinted."""
+        if self.auto_reload:
+            self.build()
+        entry = self._entries.get(name)
+        return entry[1] if entry else None
+
+    def resolve(self, hashed: str) -> Optional[str]:
+        """Logical name a current hashed name stands for, or None."""
+        return self._reverse.get(hashed)
+
+    def __len__(self) -> int:
+        return len(self._entries)
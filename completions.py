@@ -0,0 +1,594 @@
+"""
+Canonical habit completion records (Firestore).
+
+Every completion is one document in `habit_completions` with the
+deterministic ID `{habitID}_{YYYY-MM-DD}`:
+
+    habitID        habit document id
+    userID         owner uid
+    day            'YYYY-MM-DD' (sorts like a date; indexed, used for range queries)
+    completedDate  timestamp of the completion
+    schemaVersion  SCHEMA_VERSION
+
+Because the ID is derived from (habit, day), "was it done on day X" is a
+point get, marking complete twice is an idempotent set, and undoing a day
+is a single delete. `migrate()` rewrites the legacy shapes into this one:
+
+  * habit_completions docs with random IDs and a `date` string or only a
+    `completedDate` timestamp
+  * the `completed_dates` array on habit documents
+  * the client-side `progress` collection (`habitId` + `date`)
+
+Indexes: (habitID ASC, day ASC) for range reads,
+(userID ASC, day ASC) for per-user day ranges.
+
+Monthly storage (COMPLETION_STORAGE=monthly) packs one habit-month into
+`habit_completion_months/{habitID}_{YYYY-MM}` instead:
+
+    habitID, userID, month ('YYYY-MM'), schemaVersion
+    mask           bit (d - 1) set if the habit was done on day d
+    meta           {'DD': {completedDate}} per completed day
+
+A year of history is then 12 reads (or 12 deletes) per habit instead of
+365. The public functions below hide which layout is in use. Index:
+(habitID ASC, month ASC).
+"""
+import json
+import os
+import re
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+import rollups
+import streaks
+from firebase_client import firestore
+from firestore_batch import BatchWriter
+
+COLLECTION = 'habit_completions'
+MONTHLY_COLLECTION = 'habit_completion_months'
+SCHEMA_VERSION = 2
+STORAGE_DAILY = 'daily'
+STORAGE_MONTHLY = 'monthly'
+STORAGE = os.environ.get('COMPLETION_STORAGE', STORAGE_DAILY)
+FIRESTORE_IN_LIMIT = 30
+ROLLUP_WRITES_PER_DAY = 3  # rollups.increments: daily, weekly and monthly documents
+
+_DAY_RE = re.compile(r'^\d{4}-\d{2}-\d{2}')
+
+
+# ---------- keys ---------- #
+def day_key(value=None) -> Optional[str]:
+    """
+    'YYYY-MM-DD' for a date, datetime, Firestore timestamp or date-like string.
+    Aware datetimes are converted to UTC first; None means today.
+    Returns None if the value cannot be interpreted as a day.
+    """
+    if value is None:
+        return date.today().isoformat()
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc)
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, str):
+        m = _DAY_RE.match(value.strip())
+        return m.group(0) if m else None
+    return None
+
+
+def completion_id(habit_id: str, day=None) -> str:
+    return f"{habit_id}_{day_key(day)}"
+
+
+def month_key(day=None) -> str:
+    return day_key(day)[:7]
+
+
+def bucket_id(habit_id: str, day=None) -> str:
+    return f"{habit_id}_{month_key(day)}"
+
+
+def day_bit(day=None) -> int:
+    return 1 << (int(day_key(day)[8:10]) - 1)
+
+
+def mask_days(month: str, mask: int) -> List[str]:
+    """'YYYY-MM' + day mask -> sorted 'YYYY-MM-DD' days."""
+    return [f"{month}-{d + 1:02d}" for d in range(31) if mask >> d & 1]
+
+
+def completion_record(user_id: str, habit_id: str, day=None, completed_at=None) -> Dict[str, Any]:
+    return {
+        'habitID': habit_id,
+        'userID': user_id,
+        'day': day_key(day),
+        'completedDate': completed_at or datetime.now(),
+        'schemaVersion': SCHEMA_VERSION,
+    }
+
+
+# ---------- reads / writes ---------- #
+def _monthly() -> bool:
+    return STORAGE == STORAGE_MONTHLY
+
+
+def _habit_writes(transaction, habit_ref, habit_snap, streak_update, habit_fields):
+    fields = {**(habit_fields or {}), **streak_update}
+    if fields and habit_snap.exists:
+        transaction.update(habit_ref, fields)
+
+
+def _streak_update(db, transaction, habit_id, habit_snap, day, completed, changed=True):
+    """
+    The habit's new streak fields once `day` is completed (or cleared).
+    Back-dated days read the habit's recent completed days inside
+    `transaction` and recompute (streaks.rebuild); other days need no
+    history. No run is longer than longestStreak, so every run touching
+    `day` starts within longestStreak + 1 days before it.
+    """
+    if not habit_snap.exists:
+        return {}
+    habit = habit_snap.to_dict() or {}
+    if streaks.backdated(habit, day):
+        if not changed:
+            return {}
+        since = streaks.parse_day(day) - timedelta(days=streaks.longest(habit) + 1)
+        days = completion_days(db, [habit_id], start=since, transaction=transaction)[habit_id]
+        return streaks.rebuild(habit, days, day, completed)
+    return streaks.advance(habit, day) if completed else streaks.retreat(habit, day)
+
+
+def _rollup_writes(transaction, writes):
+    for ref, data in writes:
+        transaction.set(ref, data, merge=True)
+
+
+def record_completion(db, user_id: str, habit_id: str, day=None, completed_at=None,
+                      habit_fields=None) -> Dict[str, Any]:
+    """
+    Mark `habit_id` done on `day` (default today). Idempotent. One transaction
+    writes the completion, updates the habit's streak (`_streak_update`) along
+    with any extra `habit_fields`, and, if the day was not already done,
+    bumps the user's rollups.
+    Returns {id, currentStreak, longestStreak, lastCompletedDay}.
+    """
+    completed_at = completed_at or datetime.now()
+    day = day_key(day)
+    first_time = {(habit_id, day): 1}
+    habit_ref = db.collection('habits').document(habit_id)
+    result: Dict[str, Any] = {}
+
+    if not _monthly():
+        doc_id = completion_id(habit_id, day)
+        ref = db.collection(COLLECTION).document(doc_id)
+
+        @firestore.transactional
+        def write(transaction):
+            snap = ref.get(transaction=transaction)
+            habit = habit_ref.get(transaction=transaction)
+            streak = _streak_update(db, transaction, habit_id, habit, day, True, changed=not snap.exists)
+            transaction.set(ref, completion_record(user_id, habit_id, day, completed_at))
+            _habit_writes(transaction, habit_ref, habit, streak, habit_fields)
+            _rollup_writes(transaction, [] if snap.exists else rollups.increments(db, user_id, first_time))
+            result.update(_streak_result(habit, streak))
+    else:
+        doc_id = bucket_id(habit_id, day)
+        ref = db.collection(MONTHLY_COLLECTION).document(doc_id)
+
+        @firestore.transactional
+        def write(transaction):
+            snap = ref.get(transaction=transaction)
+            habit = habit_ref.get(transaction=transaction)
+            mask = (snap.to_dict() or {}).get('mask', 0) if snap.exists else 0
+            bit = day_bit(day)
+            streak = _streak_update(db, transaction, habit_id, habit, day, True, changed=not mask & bit)
+            bucket = {
+                'habitID': habit_id, 'userID': user_id, 'month': month_key(day),
+                'schemaVersion': SCHEMA_VERSION,
+                'meta': {day[8:10]: {'completedDate': completed_at}},
+            }
+            if not mask & bit:
+                bucket['mask'] = firestore.Increment(bit)
+            transaction.set(ref, bucket, merge=True)
+            _habit_writes(transaction, habit_ref, habit, streak, habit_fields)
+            _rollup_writes(transaction, [] if mask & bit else rollups.increments(db, user_id, first_time))
+            result.update(_streak_result(habit, streak))
+
+    write(db.transaction())
+    return {'id': doc_id, **result}
+
+
+def _streak_result(habit_snap, streak_update) -> Dict[str, int]:
+    habit = {**((habit_snap.to_dict() or {}) if habit_snap.exists else {}), **streak_update}
+    return {'currentStreak': streaks.current(habit), 'longestStreak': streaks.longest(habit),
+            'lastCompletedDay': habit.get('lastCompletedDay')}
+
+
+def remove_completion(db, habit_id: str, day=None, habit_fields=None) -> Dict[str, Any]:
+    """
+    Undo `day` (default today) for `habit_id`: the completion, the streak
+    (`_streak_update`) and the rollups, in one transaction as in record_completion.
+    """
+    day = day_key(day)
+    habit_ref = db.collection('habits').document(habit_id)
+    result: Dict[str, Any] = {}
+
+    if not _monthly():
+        ref = db.collection(COLLECTION).document(completion_id(habit_id, day))
+
+        @firestore.transactional
+        def write(transaction):
+            snap = ref.get(transaction=transaction)
+            habit = habit_ref.get(transaction=transaction)
+            streak, writes = {}, []
+            if snap.exists:
+                streak = _streak_update(db, transaction, habit_id, habit, day, False)  # reads before writes
+                transaction.delete(ref)
+                user_id = (snap.to_dict() or {}).get('userID')
+                writes = rollups.increments(db, user_id, {(habit_id, day): -1}) if user_id else []
+            _habit_writes(transaction, habit_ref, habit, streak, habit_fields)
+            _rollup_writes(transaction, writes)
+            result.update(_streak_result(habit, streak))
+    else:
+        ref = db.collection(MONTHLY_COLLECTION).document(bucket_id(habit_id, day))
+
+        @firestore.transactional
+        def write(transaction):
+            snap = ref.get(transaction=transaction)
+            habit = habit_ref.get(transaction=transaction)
+            data = (snap.to_dict() or {}) if snap.exists else {}
+            bit = day_bit(day)
+            streak, writes = {}, []
+            if data.get('mask', 0) & bit:
+                streak = _streak_update(db, transaction, habit_id, habit, day, False)
+                transaction.update(ref, {
+                    'mask': firestore.Increment(-bit),
+                    f"meta.`{day[8:10]}`": firestore.DELETE_FIELD,
+                })
+                if data.get('userID'):
+                    writes = rollups.increments(db, data['userID'], {(habit_id, day): -1})
+            _habit_writes(transaction, habit_ref, habit, streak, habit_fields)
+            _rollup_writes(transaction, writes)
+            result.update(_streak_result(habit, streak))
+
+    write(db.transaction())
+    return result
+
+
+def is_completed(db, habit_id: str, day=None) -> bool:
+    """Point get on the deterministic ID; no query or index needed."""
+    if not _monthly():
+        return db.collection(COLLECTION).document(completion_id(habit_id, day)).get().exists
+    snap = db.collection(MONTHLY_COLLECTION).document(bucket_id(habit_id, day)).get()
+    return bool(snap.exists and (snap.to_dict() or {}).get('mask', 0) & day_bit(day))
+
+
+def _buckets(db, habit_ids: List[str], start=None, end=None, transaction=None):
+    """Stream month buckets for `habit_ids` overlapping [start, end]."""
+    for i in range(0, len(habit_ids), FIRESTORE_IN_LIMIT):
+        query = db.collection(MONTHLY_COLLECTION).where('habitID', 'in', habit_ids[i:i + FIRESTORE_IN_LIMIT])
+        if start is not None:
+            query = query.where('month', '>=', month_key(start))
+        if end is not None:
+            query = query.where('month', '<=', month_key(end))
+        for doc in query.stream(transaction=transaction):
+            data = doc.to_dict() or {}
+            if data.get('habitID') and data.get('month'):
+                yield data
+
+
+def completion_days(db, habit_ids: Iterable[str], start=None, end=None,
+                    transaction=None) -> Dict[str, Set[str]]:
+    """
+    habit_id -> set of 'YYYY-MM-DD' days completed in [start, end] (both optional).
+    One indexed query per 30 habits, read inside `transaction` if given.
+    """
+    days: Dict[str, Set[str]] = {habit_id: set() for habit_id in habit_ids}
+    habit_ids = list(days)
+    lo = day_key(start) if start is not None else ''
+    hi = day_key(end) if end is not None else '9999-12-31'
+
+    if _monthly():
+        for data in _buckets(db, habit_ids, start, end, transaction):
+            if data['habitID'] in days:
+                days[data['habitID']].update(
+                    d for d in mask_days(data['month'], data.get('mask', 0)) if lo <= d <= hi)
+        return days
+
+    for i in range(0, len(habit_ids), FIRESTORE_IN_LIMIT):
+        query = db.collection(COLLECTION).where('habitID', 'in', habit_ids[i:i + FIRESTORE_IN_LIMIT])
+        if start is not None:
+            query = query.where('day', '>=', lo)
+        if end is not None:
+            query = query.where('day', '<=', hi)
+        for doc in query.stream(transaction=transaction):
+            data = doc.to_dict() or {}
+            if data.get('habitID') in days and data.get('day'):
+                days[data['habitID']].add(data['day'])
+    return days
+
+
+def completion_times(db, habit_ids: Iterable[str], since: datetime) -> Dict[str, List[Any]]:
+    """
+    habit_id -> completedDate values at or after `since`.
+    Daily storage range-queries completedDate, which needs the composite index
+    habit_completions (habitID ASC, completedDate ASC).
+    """
+    times: Dict[str, List[Any]] = {habit_id: [] for habit_id in habit_ids}
+    habit_ids = list(times)
+
+    if _monthly():
+        first = day_key(since)
+        for data in _buckets(db, habit_ids, since):
+            meta = data.get('meta') or {}
+            for d in mask_days(data['month'], data.get('mask', 0)):
+                if d >= first and data['habitID'] in times:
+                    stamp = (meta.get(d[8:10]) or {}).get('completedDate')
+                    times[data['habitID']].append(stamp or datetime.fromisoformat(d))
+        return times
+
+    for i in range(0, len(habit_ids), FIRESTORE_IN_LIMIT):
+        query = db.collection(COLLECTION) \
+                  .where('habitID', 'in', habit_ids[i:i + FIRESTORE_IN_LIMIT]) \
+                  .where('completedDate', '>=', since)
+        for doc in query.stream():
+            data = doc.to_dict() or {}
+            if data.get('habitID') in times:
+                times[data['habitID']].append(data.get('completedDate'))
+    return times
+
+
+def clear_completions(db, habit_ids: Iterable[str], writer: BatchWriter) -> int:
+    """
+    Delete every completion for `habit_ids` together with the matching
+    rollup decrements; returns the number of documents (days, or months in
+    monthly storage) deleted.
+
+    Each chunk of deletes is committed in one batch with its own decrements,
+    so a failure part way leaves the rollups matching whatever is left.
+    Writes already queued on `writer` are committed first.
+    """
+    habit_ids = list(dict.fromkeys(habit_ids))
+    collection = MONTHLY_COLLECTION if _monthly() else COLLECTION
+    deleted = 0
+    chunk: List[Any] = []
+    deltas: Dict[str, Dict[Any, int]] = {}
+
+    def flush():
+        writer.commit()
+        for ref in chunk:
+            writer.delete(ref)
+        for user_id, user_deltas in deltas.items():
+            for ref, data in rollups.increments(db, user_id, user_deltas):
+                writer.set(ref, data, merge=True)
+        writer.commit()
+        chunk.clear()
+        deltas.clear()
+
+    for i in range(0, len(habit_ids), FIRESTORE_IN_LIMIT):
+        query = db.collection(collection).where('habitID', 'in', habit_ids[i:i + FIRESTORE_IN_LIMIT])
+        for doc in query.stream():
+            data = doc.to_dict() or {}
+            days = []
+            if data.get('userID') and data.get('habitID'):
+                days = mask_days(data['month'], data.get('mask', 0)) if _monthly() else [data.get('day')]
+                days = [d for d in days if d]
+            # each day touches at most 3 rollup documents (day, week, month)
+            pending = sum(len(user) for user in deltas.values())
+            if chunk and len(chunk) + 1 + ROLLUP_WRITES_PER_DAY * (pending + len(days)) > writer.limit:
+                flush()
+            chunk.append(doc.reference)
+            deleted += 1
+            user = deltas.setdefault(data['userID'], {}) if days else {}
+            for d in days:
+                user[(data['habitID'], d)] = user.get((data['habitID'], d), 0) - 1
+
+    if chunk:
+        flush()
+    return deleted
+
+
+# ---------- migration ---------- #
+def _legacy_day(data: Dict[str, Any]) -> Optional[str]:
+    for field in ('day', 'date', 'completedDate', 'completedAt', 'createdAt'):
+        key = day_key(data.get(field)) if data.get(field) is not None else None
+        if key:
+            return key
+    return None
+
+
+def _migrate_completion_doc(db, writer: BatchWriter, snap, owners: Dict[str, Optional[str]]) -> bool:
+    data = snap.to_dict() or {}
+    habit_id = data.get('habitID')
+    day = _legacy_day(data)
+    if not habit_id or not day:
+        return False
+    target_id = f"{habit_id}_{day}"
+    if snap.id == target_id and data.get('schemaVersion') == SCHEMA_VERSION:
+        return False
+
+    user_id = data.get('userID') or _habit_owner(db, habit_id, owners)
+    completed_at = data.get('completedDate') or data.get('completedAt') or data.get('createdAt')
+    writer.set(db.collection(COLLECTION).document(target_id),
+               completion_record(user_id, habit_id, day, completed_at), merge=True)
+    if snap.id != target_id:
+        writer.delete(snap.reference)
+    return True
+
+
+def _migrate_habit_doc(db, writer: BatchWriter, snap, owners) -> bool:
+    data = snap.to_dict() or {}
+    if 'completed_dates' not in data:
+        return False
+    for value in data.get('completed_dates') or []:
+        day = day_key(value)
+        if day:
+            writer.set(db.collection(COLLECTION).document(f"{snap.id}_{day}"),
+                       completion_record(data.get('userID'), snap.id, day,
+                                         value if isinstance(value, datetime) else None),
+                       merge=True)
+    writer.update(snap.reference, {'completed_dates': firestore.DELETE_FIELD})
+    return True
+
+
+def _migrate_progress_doc(db, writer: BatchWriter, snap, owners) -> bool:
+    data = snap.to_dict() or {}
+    habit_id = data.get('habitId') or data.get('habitID')
+    day = day_key(data.get('date'))
+    if habit_id and day and data.get('completed', True):
+        writer.set(db.collection(COLLECTION).document(f"{habit_id}_{day}"),
+                   completion_record(data.get('userID'), habit_id, day, data.get('createdAt')),
+                   merge=True)
+    writer.delete(snap.reference)
+    return True
+
+
+def _habit_owner(db, habit_id: str, owners: Dict[str, Optional[str]]) -> Optional[str]:
+    if habit_id not in owners:
+        snap = db.collection('habits').document(habit_id).get()
+        owners[habit_id] = (snap.to_dict() or {}).get('userID') if snap.exists else None
+    return owners[habit_id]
+
+
+def _pack_habit_months(db, writer: BatchWriter, snap, owners) -> bool:
+    """Fold one habit's daily records into month buckets (for COMPLETION_STORAGE=monthly)."""
+    buckets: Dict[str, Dict[str, Any]] = {}
+    for doc in db.collection(MONTHLY_COLLECTION).where('habitID', '==', snap.id).stream():
+        data = doc.to_dict() or {}
+        if data.get('month'):
+            buckets[data['month']] = {**data, 'meta': dict(data.get('meta') or {})}
+
+    daily = list(db.collection(COLLECTION).where('habitID', '==', snap.id).stream())
+    if not daily:
+        return False
+    for doc in daily:
+        data = doc.to_dict() or {}
+        day = data.get('day') or _legacy_day(data)
+        if not day:
+            continue
+        bucket = buckets.setdefault(day[:7], {
+            'habitID': snap.id, 'userID': data.get('userID'), 'month': day[:7],
+            'mask': 0, 'meta': {}, 'schemaVersion': SCHEMA_VERSION,
+        })
+        bucket['mask'] = bucket.get('mask', 0) | day_bit(day)
+        bucket['meta'][day[8:10]] = {'completedDate': data.get('completedDate')}
+
+    # Buckets are written whole (absolute masks), so a replayed page is harmless
+    for month, bucket in buckets.items():
+        writer.set(db.collection(MONTHLY_COLLECTION).document(f"{snap.id}_{month}"), bucket)
+    for doc in daily:
+        writer.delete(doc.reference)
+    return True
+
+
+def _rebuild_user_rollups(db, writer: BatchWriter, snap, owners) -> bool:
+    """Recompute a user's rollup documents from their completions (absolute values)."""
+    habit_ids = [h.id for h in db.collection('habits').where('userID', '==', snap.id).stream()]
+    fresh = rollups.build(db, snap.id, completion_days(db, habit_ids))
+    keep = {ref.path for ref, _ in fresh}
+
+    for collection in (rollups.DAILY, rollups.WEEKLY, rollups.MONTHLY):
+        for doc in db.collection(collection).where('userID', '==', snap.id).stream():
+            if doc.reference.path not in keep:
+                writer.delete(doc.reference)
+    for ref, data in fresh:
+        writer.set(ref, data)
+    return True
+
+
+# (phase name, source collection, per-document handler)
+MIGRATION_PHASES = [
+    ('habit_completions', COLLECTION, _migrate_completion_doc),
+    ('habit_completed_dates', 'habits', _migrate_habit_doc),
+    ('progress', 'progress', _migrate_progress_doc),
+]
+
+# Run only when named explicitly, after switching to COMPLETION_STORAGE=monthly
+PACK_PHASE = ('monthly_buckets', 'habits', _pack_habit_months)
+
+# Backfill / repair of user_daily_stats and the weekly and monthly rollups
+ROLLUP_PHASE = ('user_rollups', 'users', _rebuild_user_rollups)
+
+
+def _backfill_habit_streak(db, writer: BatchWriter, snap, owners) -> bool:
+    """Recompute lastCompletedDay / currentStreak / longestStreak from history."""
+    days = completion_days(db, [snap.id])[snap.id]
+    writer.update(snap.reference, streaks.from_days(days))
+    return True
+
+
+STREAK_PHASE = ('habit_streaks', 'habits', _backfill_habit_streak)
+
+
+def _load_checkpoint(path: Optional[str]) -> Dict[str, Any]:
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {'done': [], 'cursor': {}}
+
+
+def _save_checkpoint(path: Optional[str], state: Dict[str, Any]):
+    if not path:
+        return
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+
+def migrate(db, checkpoint_path: Optional[str] = None, page_size: int = 300,
+            dry_run: bool = False, phases: Optional[List[str]] = None,
+            log: Callable[[str], None] = print) -> Dict[str, int]:
+    """
+    Rewrite legacy completion data into canonical records (and, for the
+    'monthly_buckets' phase, canonical records into month buckets).
+
+    Source collections are walked in document-id order, `page_size` documents
+    at a time; each page is committed in WriteBatches of at most 500
+    operations, then the last document id is saved to `checkpoint_path`.
+    A crashed or interrupted run resumes after the last committed page; since
+    every write targets a deterministic ID, replaying a page is harmless.
+
+    Returns {phase: documents converted}.
+    """
+    state = _load_checkpoint(checkpoint_path)
+    owners: Dict[str, Optional[str]] = {}
+    stats: Dict[str, int] = {}
+
+    for name, collection, handler in MIGRATION_PHASES + [ROLLUP_PHASE, STREAK_PHASE, PACK_PHASE]:
+        if (name not in phases) if phases else name == PACK_PHASE[0]:
+            continue
+        if name in state['done']:
+            log(f"[migrate] {name}: already done, skipping")
+            continue
+
+        converted = 0
+        cursor = state['cursor'].get(name)
+        while True:
+            query = db.collection(collection).order_by('__name__').limit(page_size)
+            if cursor:
+                query = query.start_after({'__name__': cursor})
+            page = list(query.stream())
+            if not page:
+                break
+
+            writer = BatchWriter(db, dry_run)
+            for snap in page:
+                if handler(db, writer, snap, owners):
+                    converted += 1
+            writer.commit()
+
+            cursor = page[-1].id
+            state['cursor'][name] = cursor
+            if not dry_run:
+                _save_checkpoint(checkpoint_path, state)
+            log(f"[migrate] {name}: {converted} converted, through {cursor}")
+
+        state['done'].append(name)
+        state['cursor'].pop(name, None)
+        if not dry_run:
+            _save_checkpoint(checkpoint_path, state)
+        stats[name] = converted
+
+    return stats
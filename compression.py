@@ -0,0 +1,210 @@
+"""
+WSGI middleware compressing text responses (HTML, JSON, JS, CSS, SVG).
+
+    app.wsgi_app = CompressionMiddleware(app.wsgi_app, level=6, min_size=500)
+
+Picks Brotli (when the optional `brotli` package is installed) or gzip
+from Accept-Encoding, leaves alone bodies that are small, already encoded,
+not compressible, marked no-transform or not 200-ish. Every response with
+a compressible content type gets `Vary: Accept-Encoding`, compressed or
+not, so a shared cache never hands one client's encoding to another. Bodies of known size up to `buffer_limit` are
+compressed in one go and keep a Content-Length; larger or unsized bodies
+are compressed chunk by chunk as the application yields them.
+"""
+import zlib
+from typing import Callable, Iterable, List, Optional
+
+from werkzeug.http import parse_accept_header
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+COMPRESSIBLE = ('text/', 'application/json', 'application/javascript', 'application/xml',
+                'image/svg+xml')
+SKIP_STATUS = (204, 206, 304)
+
+
+class _Gzip:
+    def __init__(self, level: int):
+        self._z = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._z.compress(data)
+
+    def flush(self) -> bytes:
+        return self._z.flush()
+
+
+class _Brotli:
+    def __init__(self, quality: int):
+        self._c = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._c.process(data)
+
+    def flush(self) -> bytes:
+        return self._c.finish()
+
+
+class CompressionMiddleware:
+    def __init__(self, app, level: int = 6, min_size: int = 500, brotli_quality: int = 4,
+                 buffer_limit: int = 1 << 20):
+        self.app = app
+        self.level = level
+        self.min_size = min_size
+        self.brotli_quality = brotli_quality
+        self.buffer_limit = buffer_limit
+
+    def _choose(self, accept_encoding: str) -> Optional[str]:
+        if not accept_encoding:
+            return None
+        accept = parse_accept_header(accept_encoding)
+        if brotli is not None and accept['br']:
+            return 'br'
+        if accept['gzip']:
+            return 'gzip'
+        return None
+
+    def _compressor(self, encoding: str):
+        return _Brotli(self.brotli_quality) if encoding == 'br' else _Gzip(self.level)
+
+    def __call__(self, environ, start_response):
+        encoding = self._choose(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None or environ.get('REQUEST_METHOD') == 'HEAD':
+            def vary(status, headers, exc_info=None):
+                return start_response(status, _varied(headers), exc_info)
+            return self.app(environ, vary)
+
+        captured = {}
+        written: List[bytes] = []
+
+        def capture(status, headers, exc_info=None):
+            captured.update(status=status, headers=headers, exc_info=exc_info)
+            return written.append  # legacy write(): buffered ahead of the iterable
+
+        app_iter = self.app(environ, capture)
+        return self._respond(encoding, captured, written, app_iter, start_response)
+
+    def _compressible(self, status: str, headers) -> bool:
+        if int(status.split(' ', 1)[0]) in SKIP_STATUS:
+            return False
+        names = {name.lower(): value for name, value in headers}
+        if 'content-encoding' in names or 'no-transform' in names.get('cache-control', ''):
+            return False
+        if not _compressible_type(headers):
+            return False
+        length = names.get('content-length')
+        return length is None or int(length) >= self.min_size
+
+    def _respond(self, encoding, captured, written, app_iter, start_response) -> Iterable[bytes]:
+        status, headers = captured['status'], captured['headers']
+        if not self._compressible(status, headers):
+            start_response(status, _varied(headers), captured['exc_info'])
+            return _chain(written, app_iter)
+
+        length = next((int(v) for k, v in headers if k.lower() == 'content-length'), None)
+        if length is not None and length <= self.buffer_limit:
+            chunks = _chain(written, app_iter)
+            try:
+                body = b''.join(chunks)
+            finally:
+                chunks.close()
+            compressor = self._compressor(encoding)
+            data = compressor.compress(body) + compressor.flush()
+            start_response(status, _encoded_headers(headers, encoding, len(data)), captured['exc_info'])
+            return [data]
+
+        return self._stream(encoding, status, headers, captured['exc_info'], written, app_iter, start_response)
+
+    def _stream(self, encoding, status, headers, exc_info, written, app_iter, start_response):
+        chunks = _chain(written, app_iter)
+        head, size = [], 0
+        for chunk in chunks:  # unsized: read enough to know whether it is worth it
+            head.append(chunk)
+            size += len(chunk)
+            if size >= self.min_size:
+                break
+        else:
+            chunks.close()
+            start_response(status, _varied(headers), exc_info)
+            return head
+
+        start_response(status, _encoded_headers(headers, encoding, None), exc_info)
+        compressor = self._compressor(encoding)
+
+        def generate():
+            try:
+                for chunk in head:
+                    yield compressor.compress(chunk)
+                for chunk in chunks:
+                    out = compressor.compress(chunk)
+                    if out:
+                        yield out
+                yield compressor.flush()
+            finally:
+                chunks.close()
+        return generate()
+
+
+class _chain:
+    """Written chunks, then the application's iterable; close() closes the iterable (PEP 3333)."""
+
+    def __init__(self, written: List[bytes], app_iter: Iterable[bytes]):
+        self._written = written
+        self._app_iter = app_iter
+        self._it = None
+
+    def __iter__(self):
+        if self._it is None:
+            self._it = self._gen()
+        return self._it
+
+    def _gen(self):
+        yield from self._written
+        yield from self._app_iter
+
+    def close(self):
+        close: Optional[Callable] = getattr(self._app_iter, 'close', None)
+        if close:
+            close()
+
+
+def _compressible_type(headers) -> bool:
+    content_type = next((v for k, v in headers if k.lower() == 'content-type'), '')
+    return content_type.lower().startswith(COMPRESSIBLE)
+
+
+def _varied(headers):
+    """`headers` with Accept-Encoding in Vary if the content type is one we may compress."""
+    if not _compressible_type(headers):
+        return headers
+    out, vary = [], None
+    for name, value in headers:
+        if name.lower() == 'vary':
+            vary = value
+        else:
+            out.append((name, value))
+    if vary is None:
+        out.append(('Vary', 'Accept-Encoding'))
+    elif 'accept-encoding' not in vary.lower() and vary.strip() != '*':
+        out.append(('Vary', f'{vary}, Accept-Encoding'))
+    else:
+        out.append(('Vary', vary))
+    return out
+
+
+def _encoded_headers(headers, encoding: str, length: Optional[int]):
+    out = []
+    for name, value in headers:
+        lower = name.lower()
+        if lower == 'content-length':
+            continue
+        if lower == 'etag' and not value.startswith('W/'):
+            value = 'W/' + value  # the compressed bytes differ from the identity representation
+        out.append((name, value))
+    out.append(('Content-Encoding', encoding))
+    if length is not None:
+        out.append(('Content-Length', str(length)))
+    return _varied(out)
@@ -10,9 +10,8 @@ st.title("US-14 — View Dashboard")
 BASE_DIR = Path(__file__).parent
 DB_PATH = BASE_DIR / "habits.db"
 DB_URL = f"sqlite:///{DB_PATH}"
-engine = create_engine(DB_URL, future=True)
 
-def init_db():
+def init_db(engine):
     # —— 2) begin() -> auto commit
     with engine.begin() as conn:
         conn.execute(text("""
@@ -32,26 +31,51 @@ def init_db():
               ('Run 3km', 0, 0)
             """))
 
-# —— 3) search without cache
+# Streamlit re-runs this script on every interaction: keep one engine per
+# process and run the schema setup only when it is created.
+@st.cache_resource
+def get_engine():
+    engine = create_engine(DB_URL, future=True)
+    init_db(engine)
+    return engine
+
+engine = get_engine()
+
+# —— 3) cached read; every write below calls list_active.clear()
+@st.cache_data
 def list_active():
-    with engine.begin() as conn:
-        return conn.execute(text(
+    with engine.connect() as conn:
+        rows = conn.execute(text(
             "SELECT id,name,completion FROM habits WHERE active=1 ORDER BY id"
         )).mappings().all()
+    return [dict(r) for r in rows]
 
 def add_habit(name: str):
     with engine.begin() as conn:
         conn.execute(text(
             "INSERT INTO habits(name, active, completion) VALUES(:n, 1, 0)"
         ), {"n": name})
+    list_active.clear()
 
 def update_completion(hid: int, val: int):
     with engine.begin() as conn:
         conn.execute(text(
             "UPDATE habits SET completion=:v WHERE id=:i"
         ), {"v": int(val), "i": int(hid)})
+    list_active.clear()
+
+def update_completions(changes: dict):
+    """Apply {habit_id: completion} in one transaction (executemany)."""
+    if not changes:
+        return
+    with engine.begin() as conn:
+        conn.execute(text(
+            "UPDATE habits SET completion=:v WHERE id=:i"
+        ), [{"v": int(v), "i": int(i)} for i, v in changes.items()])
+    list_active.clear()
+
+PAGE_SIZE = 20
 
-init_db()
 st.caption(f"DB path: {DB_PATH.resolve()}")  
 
 # 新增
@@ -68,22 +92,58 @@ rows = list_active()
 if not rows:
     st.info("No active habits.")
 else:
-    for r in rows:
-        col1, col2 = st.columns([3, 3], vertical_alignment="center")
-        with col1:
-            st.write(f"**{r['name']}** — {r['completion']}%")
-            st.progress(int(r["completion"]))
-        with col2:
-            new_val = st.slider(
-                f"Completion — {r['name']}",
-                0, 100, int(r['completion']),
-                key=f"comp-{r['id']}"
-            )
-            if st.button("Save", key=f"save-{r['id']}"):
-                update_completion(r['id'], new_val)
-                st.success("Saved")
-                st.rerun()  # refresh immediately
-
-# refresh button
+    bulk = st.toggle("Bulk edit", help="Edit several habits, then save them all at once")
+
+    # paginate long lists so each rerun only renders one page of widgets
+    pages = (len(rows) - 1) // PAGE_SIZE + 1
+    page = 1
+    if pages > 1:
+        page = st.number_input("Page", 1, pages, 1, step=1)
+    page_rows = rows[(page - 1) * PAGE_SIZE: page * PAGE_SIZE]
+
+    if bulk:
+        # widgets inside a form don't rerun the script until it is submitted
+        with st.form("bulk-edit"):
+            new_vals = {}
+            for r in page_rows:
+                col1, col2 = st.columns([3, 3], vertical_alignment="center")
+                with col1:
+                    st.write(f"**{r['name']}** — {r['completion']}%")
+                    st.progress(int(r["completion"]))
+                with col2:
+                    new_vals[r["id"]] = st.slider(
+                        f"Completion — {r['name']}",
+                        0, 100, int(r['completion']),
+                        key=f"bulk-{r['id']}"
+                    )
+            submitted = st.form_submit_button("Save all")
+
+        if submitted:
+            changed = {
+                r["id"]: new_vals[r["id"]] for r in page_rows
+                if new_vals[r["id"]] != int(r["completion"])
+            }
+            update_completions(changed)
+            st.success(f"Saved {len(changed)} habit(s)")
+            st.rerun()  # one refresh for the whole batch
+    else:
+        for r in page_rows:
+            col1, col2 = st.columns([3, 3], vertical_alignment="center")
+            with col1:
+                st.write(f"**{r['name']}** — {r['completion']}%")
+                st.progress(int(r["completion"]))
+            with col2:
+                new_val = st.slider(
+                    f"Completion — {r['name']}",
+                    0, 100, int(r['completion']),
+                    key=f"comp-{r['id']}"
+                )
+                if st.button("Save", key=f"save-{r['id']}"):
+                    update_completion(r['id'], new_val)
+                    st.success("Saved")
+                    st.rerun()  # refresh immediately
+
+# refresh button (also picks up changes made outside this app)
 if st.button("🔄 Refresh"):
+    list_active.clear()
     st.rerun()
\ No newline at end of file
@@ -0,0 +1,116 @@
+"""
+Firebase Admin app and Firestore client, created on first use.
+
+Importing web_app used to initialize firebase_admin, read the credentials
+file and open a Firestore client; every test import and every (pre-fork)
+worker boot paid for that, and one failure left `db = None` for the life
+of the process. Now:
+
+    firebase_app = LazyClient(init_firebase_app, 'Firebase Admin SDK')
+    db = LazyClient(lambda: firestore.client(firebase_app.get()), 'Firestore')
+
+`db` stands in for the client: `if not db:` initializes it (once, under a
+lock) and is False while it is unavailable; attribute access is forwarded
+to the real client. A failed initialization is retried on the first use
+after `retry_after` seconds.
+
+Nothing here imports firebase_admin (or google.cloud.firestore, ~0.15s)
+until a client is created. Modules that only need Firestore's write helpers
+(Increment, DELETE_FIELD, transactional, ...) use `firestore` from here, a
+stand-in that imports firebase_admin.firestore on first attribute access.
+"""
+import importlib
+import threading
+import time
+from typing import Callable, Optional
+
+from logs import get_logger
+
+log = get_logger(__name__)
+
+RETRY_AFTER = 30.0  # seconds between initialization attempts after a failure
+
+
+def init_firebase_app(credentials_path: str, options: Optional[dict] = None):
+    """The default firebase_admin app, initializing it from `credentials_path` if needed."""
+    import firebase_admin
+    try:
+        return firebase_admin.get_app()
+    except ValueError:
+        from firebase_admin import credentials
+        return firebase_admin.initialize_app(credentials.Certificate(credentials_path), options or {})
+
+
+class LazyModule:
+    """A module imported on first attribute access."""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+    def __repr__(self) -> str:
+        return f"<LazyModule {self._name}>"
+
+
+firestore = LazyModule('firebase_admin.firestore')
+
+
+class LazyClient:
+    def __init__(self, factory: Callable[[], object], name: str, retry_after: float = RETRY_AFTER,
+                 clock: Callable[[], float] = time.monotonic):
+        self._factory = factory
+        self._name = name
+        self._retry_after = retry_after
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._client = None
+        self._failed_at: Optional[float] = None
+
+    def get(self):
+        """The client, or None while it cannot be created."""
+        client = self._client
+        if client is not None:
+            return client
+        with self._lock:
+            if self._client is None:
+                if self._failed_at is not None and self._clock() - self._failed_at < self._retry_after:
+                    return None
+                try:
+                    self._client = self._factory()
+                    self._failed_at = None
+                    log.info("%s initialized", self._name)
+                except Exception as e:
+                    self._failed_at = self._clock()
+                    log.warning("%s initialization failed: %s", self._name, e)
+            return self._client
+
+    @property
+    def initialized(self) -> bool:
+        return self._client is not None
+
+    def reset(self):
+        """Forget the client (e.g. after a fork or a configuration change)."""
+        with self._lock:
+            self._client = None
+            self._failed_at = None
+
+    def __bool__(self) -> bool:
+        return self.get() is not None
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        client = self.get()
+        if client is None:
+            raise RuntimeError(f"{self._name} is not available")
+        return getattr(client, name)
+
+    def __repr__(self) -> str:
+        return f"<LazyClient {self._name} {'ready' if self.initialized else 'not initialized'}>"
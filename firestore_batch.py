@@ -0,0 +1,55 @@
+"""
+Firestore write batching beyond the 500-operation limit of one WriteBatch.
+
+    writer = BatchWriter(db)
+    for ref in refs:
+        writer.delete(ref)      # commits automatically every `limit` operations
+    writer.commit()             # commits the rest
+
+Each automatic commit is atomic on its own; the writes as a whole are not.
+Call `commit()` to close a batch early when some writes must land together.
+"""
+FIRESTORE_BATCH_LIMIT = 500
+
+
+class BatchWriter:
+    """WriteBatch that commits itself before exceeding `limit` operations."""
+
+    def __init__(self, db, dry_run: bool = False, limit: int = FIRESTORE_BATCH_LIMIT):
+        self.db = db
+        self.dry_run = dry_run
+        self.limit = limit
+        self.batch = None
+        self.ops = 0
+        self.written = 0
+
+    def _op(self):
+        if self.batch is None:
+            self.batch = self.db.batch()
+        self.ops += 1
+
+    def set(self, ref, data, merge=False):
+        self._op()
+        self.batch.set(ref, data, merge=merge)
+        if self.ops >= self.limit:
+            self.commit()
+
+    def update(self, ref, data):
+        self._op()
+        self.batch.update(ref, data)
+        if self.ops >= self.limit:
+            self.commit()
+
+    def delete(self, ref):
+        self._op()
+        self.batch.delete(ref)
+        if self.ops >= self.limit:
+            self.commit()
+
+    def commit(self):
+        if self.batch is not None and self.ops:
+            if not self.dry_run:
+                self.batch.commit()
+            self.written += self.ops
+        self.batch = None
+        self.ops = 0
@@ -0,0 +1,298 @@
+"""
+Friend graph stored as per-user subcollections (Firestore).
+
+    users/{uid}/friends/{friendUid}     {uid, displayName, email, since}
+    users/{uid}/requests/{otherUid}     {uid, displayName, email, direction, createdAt}
+
+`direction` is 'incoming' or 'outgoing'. Every edge is stored on both sides
+with the other user's display data, so a friends page is one paged query
+with no profile lookups, and a transition only writes the few edge
+documents involved - never users/{uid} itself, which keeps popular users
+clear of the per-document write rate and the 1 MB document limit.
+
+The write helpers take anything with set/delete (a WriteBatch, a
+firestore_batch.BatchWriter or a Transaction) so callers decide how the
+writes are committed, and they bump the `friends` version stamp
+(versions.py) of every user whose friends page changes in the same commit.
+Transitions that depend on the current state (`request_friend`,
+`accept_request`, `decline_request`, `cancel_request`) run as one
+transaction: one batched read of every document involved, then one
+all-or-nothing commit. Removing a friend is a blind delete and needs only a
+single batch.
+
+Older accounts still carry `friends` / `friendRequests` arrays on the user
+document; `migrate_user` moves them into the subcollections the first time
+the account is used.
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from firebase_client import firestore
+import versions
+
+FRIENDS = 'friends'
+REQUESTS = 'requests'
+INCOMING = 'incoming'
+OUTGOING = 'outgoing'
+REQUEST_LIMIT = 100
+LEGACY_FIELDS = ('friends', 'friendRequests')
+
+# transition outcomes
+SENT = 'sent'
+ACCEPTED = 'accepted'
+DROPPED = 'dropped'
+WRONG_DIRECTION = 'wrong_direction'
+ALREADY_FRIENDS = 'already_friends'
+ALREADY_SENT = 'already_sent'
+NOT_FOUND = 'not_found'
+USER_MISSING = 'user_missing'
+
+
+def card(uid: str, profile: Mapping[str, Any]) -> Dict[str, Any]:
+    """The display data copied onto the other side of an edge."""
+    return {'uid': uid, 'displayName': profile.get('displayName') or 'User', 'email': profile.get('email')}
+
+
+def friend_ref(db, uid: str, other_uid: str):
+    return db.collection('users').document(uid).collection(FRIENDS).document(other_uid)
+
+
+def request_ref(db, uid: str, other_uid: str):
+    return db.collection('users').document(uid).collection(REQUESTS).document(other_uid)
+
+
+# ---------- writes ---------- #
+def _stamp(writer, db, *uids: str):
+    for uid in uids:
+        versions.bump(db, uid, 'friends', writer=writer)
+
+
+def send_request(writer, db, uid: str, profile: Mapping[str, Any], other_uid: str, other_profile: Mapping[str, Any]):
+    now = datetime.now()
+    writer.set(request_ref(db, uid, other_uid),
+               {**card(other_uid, other_profile), 'direction': OUTGOING, 'createdAt': now})
+    writer.set(request_ref(db, other_uid, uid),
+               {**card(uid, profile), 'direction': INCOMING, 'createdAt': now})
+    _stamp(writer, db, uid, other_uid)
+
+
+def accept(writer, db, uid: str, profile: Mapping[str, Any], other_uid: str, other_profile: Mapping[str, Any]):
+    """Turn the pending request between the two users into a friendship."""
+    now = datetime.now()
+    writer.delete(request_ref(db, uid, other_uid))
+    writer.delete(request_ref(db, other_uid, uid))
+    writer.set(friend_ref(db, uid, other_uid), {**card(other_uid, other_profile), 'since': now})
+    writer.set(friend_ref(db, other_uid, uid), {**card(uid, profile), 'since': now})
+    _stamp(writer, db, uid, other_uid)
+
+
+def drop_request(writer, db, uid: str, other_uid: str):
+    """Remove a pending request from both sides (decline or cancel)."""
+    writer.delete(request_ref(db, uid, other_uid))
+    writer.delete(request_ref(db, other_uid, uid))
+    _stamp(writer, db, uid, other_uid)
+
+
+def unfriend(writer, db, uid: str, other_uid: str):
+    writer.delete(friend_ref(db, uid, other_uid))
+    writer.delete(friend_ref(db, other_uid, uid))
+    _stamp(writer, db, uid, other_uid)
+
+
+def _get_all(db, refs, transaction=None) -> list:
+    """Snapshots for `refs` in the same order, in one round trip."""
+    snaps = {snap.reference.path: snap for snap in db.get_all(refs, transaction=transaction)}
+    return [snaps.get(ref.path) for ref in refs]
+
+
+def _exists(snap) -> bool:
+    return snap is not None and snap.exists
+
+
+# ---------- transitions ---------- #
+def request_friend(db, uid: str, other_uid: str) -> Tuple[str, Dict[str, Any]]:
+    """
+    Send a friend request from `uid` to `other_uid`; a request `other_uid`
+    already sent is accepted instead. Returns (outcome, other user's card).
+    """
+    users = db.collection('users')
+    refs = [users.document(uid), users.document(other_uid),
+            friend_ref(db, uid, other_uid), request_ref(db, uid, other_uid)]
+
+    @firestore.transactional
+    def run(transaction):
+        me, other, friendship, pending = _get_all(db, refs, transaction)
+        if not _exists(other):
+            return NOT_FOUND, {}
+        other_profile = other.to_dict() or {}
+        if not _exists(me):
+            return USER_MISSING, card(other_uid, other_profile)
+        if _exists(friendship):
+            return ALREADY_FRIENDS, card(other_uid, other_profile)
+        direction = (pending.to_dict() or {}).get('direction') if _exists(pending) else None
+        if direction == OUTGOING:
+            return ALREADY_SENT, card(other_uid, other_profile)
+        if direction == INCOMING:
+            accept(transaction, db, uid, me.to_dict() or {}, other_uid, other_profile)
+            return ACCEPTED, card(other_uid, other_profile)
+        send_request(transaction, db, uid, me.to_dict() or {}, other_uid, other_profile)
+        return SENT, card(other_uid, other_profile)
+
+    return run(db.transaction())
+
+
+def accept_request(db, uid: str, other_uid: str) -> str:
+    """Accept `other_uid`'s pending request to `uid`. Returns ACCEPTED or NOT_FOUND."""
+    refs = [request_ref(db, uid, other_uid), db.collection('users').document(uid)]
+
+    @firestore.transactional
+    def run(transaction):
+        incoming, me = _get_all(db, refs, transaction)
+        if not _exists(incoming) or (incoming.to_dict() or {}).get('direction') != INCOMING:
+            return NOT_FOUND
+        # the request document already carries the requester's display data
+        profile = (me.to_dict() or {}) if _exists(me) else {}
+        accept(transaction, db, uid, profile, other_uid, incoming.to_dict() or {})
+        return ACCEPTED
+
+    return run(db.transaction())
+
+
+def _drop_pending(db, uid: str, other_uid: str, direction: str) -> str:
+    ref = request_ref(db, uid, other_uid)
+
+    @firestore.transactional
+    def run(transaction):
+        pending, = _get_all(db, [ref], transaction)
+        if not _exists(pending):
+            return NOT_FOUND
+        if (pending.to_dict() or {}).get('direction') != direction:
+            return WRONG_DIRECTION
+        drop_request(transaction, db, uid, other_uid)
+        return DROPPED
+
+    return run(db.transaction())
+
+
+def decline_request(db, uid: str, requester_uid: str) -> str:
+    """Decline the request `requester_uid` sent to `uid`. DROPPED, NOT_FOUND or WRONG_DIRECTION."""
+    return _drop_pending(db, uid, requester_uid, INCOMING)
+
+
+def cancel_request(db, uid: str, target_uid: str) -> str:
+    """Withdraw the request `uid` sent to `target_uid`. DROPPED, NOT_FOUND or WRONG_DIRECTION."""
+    return _drop_pending(db, uid, target_uid, OUTGOING)
+
+
+def forget_user(writer, db, uid: str) -> List[str]:
+    """Delete every edge of `uid`, on both sides. Returns the users on the other side."""
+    others = []
+    for collection in (FRIENDS, REQUESTS):
+        for snap in db.collection('users').document(uid).collection(collection).select([]).stream():
+            writer.delete(snap.reference)
+            writer.delete(db.collection('users').document(snap.id).collection(collection).document(uid))
+            others.append(snap.id)
+    _stamp(writer, db, *dict.fromkeys(others))
+    return others
+
+
+def refresh_cards(writer, db, uid: str, profile: Mapping[str, Any]) -> List[str]:
+    """Push `uid`'s new display data onto the other side of all its edges. Returns those users."""
+    fresh = {k: v for k, v in card(uid, profile).items() if k != 'uid'}
+    others = []
+    for collection in (FRIENDS, REQUESTS):
+        for snap in db.collection('users').document(uid).collection(collection).select([]).stream():
+            other = db.collection('users').document(snap.id).collection(collection).document(uid)
+            writer.set(other, fresh, merge=True)
+            others.append(snap.id)
+    _stamp(writer, db, *dict.fromkeys(others))
+    return others
+
+
+# ---------- reads ---------- #
+def list_friends(db, uid: str, limit: int, after: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """One page of friend cards in uid order and the cursor for the next page (None at the end)."""
+    query = db.collection('users').document(uid).collection(FRIENDS).order_by('__name__')
+    if after:
+        query = query.start_after({'__name__': after})
+    snaps = list(query.limit(limit + 1).stream())
+    page = [{**(snap.to_dict() or {}), 'uid': snap.id} for snap in snaps[:limit]]
+    return page, (page[-1]['uid'] if len(snaps) > limit else None)
+
+
+def count_friends(db, uid: str) -> int:
+    result = db.collection('users').document(uid).collection(FRIENDS).count().get()
+    return int(result[0][0].value)
+
+
+def friend_ids(db, uid: str) -> List[str]:
+    return [snap.id for snap in db.collection('users').document(uid).collection(FRIENDS).select([]).stream()]
+
+
+def list_requests(db, uid: str) -> Dict[str, List[Dict[str, Any]]]:
+    """Pending requests split by direction, newest first."""
+    found = {INCOMING: [], OUTGOING: []}
+    query = db.collection('users').document(uid).collection(REQUESTS) \
+              .order_by('createdAt', direction=firestore.Query.DESCENDING).limit(REQUEST_LIMIT)
+    for snap in query.stream():
+        data = {**(snap.to_dict() or {}), 'uid': snap.id}
+        if data.get('direction') in found:
+            found[data['direction']].append(data)
+    return found
+
+
+# ---------- legacy arrays ---------- #
+def has_legacy(user_data: Optional[Mapping[str, Any]]) -> bool:
+    return bool(user_data) and any(field in user_data for field in LEGACY_FIELDS)
+
+
+def legacy_edges(user_data: Mapping[str, Any]) -> List[Tuple[str, Optional[str]]]:
+    """(other uid, None for a friend / request direction) from the legacy arrays."""
+    requests = user_data.get('friendRequests') or {}
+    edges = [(other, None) for other in user_data.get('friends') or []]
+    edges += [(other, INCOMING) for other in requests.get('incoming') or []]
+    edges += [(other, OUTGOING) for other in requests.get('outgoing') or []]
+    return edges
+
+
+def migrate_user(writer, db, uid: str, user_data: Mapping[str, Any]) -> int:
+    """
+    Move `uid`'s legacy `friends` / `friendRequests` arrays into edge
+    documents on both sides and strip `uid` from the other users' legacy
+    arrays, so each relationship is moved exactly once. Edges to users that
+    no longer exist are dropped. Returns the number of edges written.
+    """
+    if not has_legacy(user_data):
+        return 0
+    edges = legacy_edges(user_data)
+    others = list(dict.fromkeys(other for other, _ in edges if other and other != uid))
+    refs = [db.collection('users').document(other) for other in others]
+    profiles = {snap.id: snap.to_dict() or {} for snap in db.get_all(refs) if snap.exists} if refs else {}
+
+    me = card(uid, user_data)
+    now = datetime.now()
+    written = 0
+    for other, direction in edges:
+        if other not in profiles:
+            continue
+        if direction is None:
+            writer.set(friend_ref(db, uid, other), {**card(other, profiles[other]), 'since': now})
+            writer.set(friend_ref(db, other, uid), {**me, 'since': now})
+        else:
+            mirror = OUTGOING if direction == INCOMING else INCOMING
+            writer.set(request_ref(db, uid, other),
+                       {**card(other, profiles[other]), 'direction': direction, 'createdAt': now})
+            writer.set(request_ref(db, other, uid), {**me, 'direction': mirror, 'createdAt': now})
+        written += 1
+
+    for other in others:
+        if has_legacy(profiles.get(other)):
+            writer.update(db.collection('users').document(other), {
+                'friends': firestore.ArrayRemove([uid]),
+                'friendRequests.incoming': firestore.ArrayRemove([uid]),
+                'friendRequests.outgoing': firestore.ArrayRemove([uid]),
+            })
+    writer.update(db.collection('users').document(uid),
+                  {field: firestore.DELETE_FIELD for field in LEGACY_FIELDS})
+    _stamp(writer, db, uid, *[other for other in others if other in profiles])
+    return written
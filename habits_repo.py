@@ -1,11 +1,12 @@
 # habits_repo.py
-from datetime import datetime
+from datetime import date, datetime, timedelta
 from typing import Dict, Any, List, Optional
 
 from sqlalchemy import (
     create_engine, MetaData, Table, Column, Integer, String, Boolean,
-    DateTime, ForeignKey, select, text, Index
+    Date, DateTime, ForeignKey, select, text, Index, UniqueConstraint
 )
+from sqlalchemy.exc import IntegrityError
 
 # -------------------------
 # Engine
@@ -49,6 +50,21 @@ users = Table(
     Column("email", String),
 )
 
+habit_completions = Table(
+    "habit_completions", metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("habit_id", Integer, ForeignKey("habits.id", ondelete="CASCADE"), nullable=False),
+    Column("user_id", String, nullable=False),
+    Column("day", Date, nullable=False),
+    Column("created_at", DateTime, nullable=False, default=datetime.utcnow),
+    UniqueConstraint("habit_id", "day", name="uq_habit_completions_habit_day"),
+)
+# Covering index: analytics filter on user_id and only read habit_id/day
+Index(
+    "ix_habit_completions_user_habit_day",
+    habit_completions.c.user_id, habit_completions.c.habit_id, habit_completions.c.day,
+)
+
 # -------------------------
 # DB init
 # -------------------------
@@ -139,6 +155,185 @@ def add_journal_entry(
         print(f"Error adding journal entry: {e}")
         return False
 
+# -------------------------
+# Completions
+# -------------------------
+def record_completion(
+    engine, user_id: str, habit_id: int, day: Optional[date] = None
+) -> bool:
+    """
+    Mark a habit as done for a day (today by default).
+    Returns True if a new row was written, False if it was already recorded.
+    """
+    if not user_id or not habit_id:
+        raise ValueError("'user_id' and 'habit_id' are required")
+
+    payload = {
+        "habit_id": habit_id,
+        "user_id": user_id,
+        "day": day or date.today(),
+        "created_at": datetime.utcnow(),
+    }
+
+    try:
+        with engine.begin() as conn:
+            conn.execute(habit_completions.insert().values(**payload))
+        return True
+    except IntegrityError:
+        # uq_habit_completions_habit_day: already completed that day
+        return False
+    except Exception as e:
+        print(f"Error recording completion: {e}")
+        return False
+
+def remove_completion(engine, habit_id: int, day: Optional[date] = None) -> bool:
+    """Undo a completion for a day (today by default). Returns True if a row was removed."""
+    stmt = habit_completions.delete().where(
+        habit_completions.c.habit_id == habit_id,
+        habit_completions.c.day == (day or date.today()),
+    )
+    try:
+        with engine.begin() as conn:
+            return conn.execute(stmt).rowcount > 0
+    except Exception as e:
+        print(f"Error removing completion: {e}")
+        return False
+
+# -------------------------
+# Completion analytics (computed in SQL)
+# -------------------------
+# Gaps-and-islands: consecutive days share the same (julianday - row_number),
+# so grouping on that difference yields one row per unbroken streak.
+_STREAKS_SQL = text("""
+    WITH numbered AS (
+        SELECT habit_id, day,
+               julianday(day) - ROW_NUMBER() OVER (
+                   PARTITION BY habit_id ORDER BY day
+               ) AS grp
+        FROM habit_completions
+        WHERE user_id = :user_id
+          AND (:habit_id IS NULL OR habit_id = :habit_id)
+    ),
+    islands AS (
+        SELECT habit_id, MAX(day) AS end_day, COUNT(*) AS length
+        FROM numbered
+        GROUP BY habit_id, grp
+    )
+    SELECT habit_id,
+           MAX(CASE WHEN end_day >= :yesterday THEN length ELSE 0 END) AS current,
+           MAX(length) AS longest
+    FROM islands
+    GROUP BY habit_id
+""")
+
+# Monday-based weeks: date(day, '-6 days', 'weekday 1') is the Monday on/before day
+_WEEKLY_COUNTS_SQL = text("""
+    SELECT habit_id,
+           date(day, '-6 days', 'weekday 1') AS week_start,
+           COUNT(*) AS count
+    FROM habit_completions
+    WHERE user_id = :user_id
+      AND day BETWEEN :start AND :today
+    GROUP BY habit_id, week_start
+    ORDER BY habit_id, week_start
+""")
+
+_CALENDAR_SQL = text("""
+    WITH RECURSIVE calendar(day) AS (
+        SELECT :start
+        UNION ALL
+        SELECT date(day, '+1 day') FROM calendar WHERE day < :today
+    )
+    SELECT calendar.day AS date, COUNT(c.habit_id) AS count
+    FROM calendar
+    LEFT JOIN habit_completions AS c
+           ON c.day = calendar.day
+          AND c.user_id = :user_id
+          AND (:habit_id IS NULL OR c.habit_id = :habit_id)
+    GROUP BY calendar.day
+    ORDER BY calendar.day
+""")
+
+def get_streaks(
+    engine,
+    user_id: str,
+    habit_id: Optional[int] = None,
+    today: Optional[date] = None,
+) -> Dict[int, Dict[str, int]]:
+    """
+    Current and longest streak per habit:
+      { habit_id: {"current": int, "longest": int} }
+    A streak is still current if its last day is today or yesterday.
+    Habits without completions are absent from the result.
+    """
+    today = today or date.today()
+    params = {
+        "user_id": user_id,
+        "habit_id": habit_id,
+        "yesterday": (today - timedelta(days=1)).isoformat(),
+    }
+    try:
+        with engine.connect() as conn:
+            rows = conn.execute(_STREAKS_SQL, params).mappings().all()
+        return {
+            r["habit_id"]: {"current": int(r["current"]), "longest": int(r["longest"])}
+            for r in rows
+        }
+    except Exception as e:
+        print(f"Error computing streaks: {e}")
+        return {}
+
+def current_streak(engine, user_id: str, habit_id: int, today: Optional[date] = None) -> int:
+    return get_streaks(engine, user_id, habit_id, today).get(habit_id, {}).get("current", 0)
+
+def longest_streak(engine, user_id: str, habit_id: int) -> int:
+    return get_streaks(engine, user_id, habit_id).get(habit_id, {}).get("longest", 0)
+
+def weekly_counts(
+    engine, user_id: str, weeks: int = 4, today: Optional[date] = None
+) -> List[Dict[str, Any]]:
+    """
+    Completions per habit per week for the last `weeks` weeks (incl. this one):
+      [ {habit_id, week_start: 'YYYY-MM-DD', count}, ... ]
+    Weeks with no completions are omitted.
+    """
+    today = today or date.today()
+    start = today - timedelta(days=today.weekday(), weeks=weeks - 1)
+    params = {"user_id": user_id, "start": start.isoformat(), "today": today.isoformat()}
+    try:
+        with engine.connect() as conn:
+            return [dict(r) for r in conn.execute(_WEEKLY_COUNTS_SQL, params).mappings()]
+    except Exception as e:
+        print(f"Error computing weekly counts: {e}")
+        return []
+
+def completion_calendar(
+    engine,
+    user_id: str,
+    days: int = 30,
+    habit_id: Optional[int] = None,
+    today: Optional[date] = None,
+) -> List[Dict[str, Any]]:
+    """
+    One row per day for the last `days` days, oldest first:
+      [ {date: 'YYYY-MM-DD', done: bool, count: int}, ... ]
+    `count` is the number of habits completed that day (0/1 when habit_id is given).
+    """
+    today = today or date.today()
+    params = {
+        "user_id": user_id,
+        "habit_id": habit_id,
+        "start": (today - timedelta(days=days - 1)).isoformat(),
+        "today": today.isoformat(),
+    }
+    try:
+        with engine.connect() as conn:
+            rows = conn.execute(_CALENDAR_SQL, params).mappings().all()
+        return [{"date": r["date"], "done": r["count"] > 0, "count": r["count"]} for r in rows]
+    except Exception as e:
+        print(f"Error building completion calendar: {e}")
+        return []
+
 # -------------------------
 # Profile (read-only)
 # -------------------------
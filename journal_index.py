@@ -0,0 +1,290 @@
+import html
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+_WORD_RE = re.compile(r"\w+")
+_QUERY_RE = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def _tokenize(content: str) -> List[str]:
+    return [m.group(0).lower() for m in _WORD_RE.finditer(content or "")]
+
+
+class _UserIndex:
+    """Inverted index over one user's journal entries."""
+
+    def __init__(self):
+        self.entries: Dict[str, Dict[str, Any]] = {}          # entry_id -> {content, createdAt}
+        self.postings: Dict[str, Dict[str, List[int]]] = {}   # term -> {entry_id: [positions]}
+        self.vocab: List[str] = []                            # sorted terms, for prefix lookups
+        self.size = 0                                         # indexed tokens (memory estimate)
+
+    def add(self, entry_id: str, content: str, created_at=None):
+        self.remove(entry_id)
+        tokens = _tokenize(content)
+        self.entries[entry_id] = {"content": content or "", "createdAt": created_at}
+        for pos, term in enumerate(tokens):
+            docs = self.postings.get(term)
+            if docs is None:
+                docs = self.postings[term] = {}
+                insort(self.vocab, term)
+            docs.setdefault(entry_id, []).append(pos)
+        self.size += len(tokens) + 1
+
+    def remove(self, entry_id: str):
+        old = self.entries.pop(entry_id, None)
+        if old is None:
+            return
+        tokens = _tokenize(old["content"])
+        for term in set(tokens):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            docs.pop(entry_id, None)
+            if not docs:
+                del self.postings[term]
+                del self.vocab[bisect_left(self.vocab, term)]
+        self.size -= len(tokens) + 1
+
+    def prefix_terms(self, prefix: str) -> List[str]:
+        start = bisect_left(self.vocab, prefix)
+        end = bisect_left(self.vocab, prefix + "\uffff")
+        return self.vocab[start:end]
+
+    def match_term(self, term: str, prefix: bool) -> Dict[str, List[int]]:
+        """entry_id -> positions of every vocabulary term matching `term`."""
+        terms = self.prefix_terms(term) if prefix else [term]
+        hits: Dict[str, List[int]] = {}
+        for t in terms:
+            for entry_id, positions in self.postings.get(t, {}).items():
+                hits.setdefault(entry_id, []).extend(positions)
+        return hits
+
+    def match_phrase(self, words: List[str]) -> Dict[str, List[int]]:
+        """entry_id -> start positions where `words` appear consecutively."""
+        first = self.postings.get(words[0], {})
+        hits: Dict[str, List[int]] = {}
+        for entry_id, starts in first.items():
+            following = [set(self.postings.get(w, {}).get(entry_id, ())) for w in words[1:]]
+            found = [p for p in starts if all(p + i + 1 in s for i, s in enumerate(following))]
+            if found:
+                hits[entry_id] = found
+        return hits
+
+
+class JournalSearchIndex:
+    """
+    Per-user in-memory inverted index for journal search on the Firestore backend.
+
+    A user's index is built lazily (see `build`) the first time they search and
+    is then kept current through `upsert`/`remove` from the write handlers.
+    Call `start_build` before reading the entries to build from: writes that
+    land while the read is in flight are buffered and replayed onto the
+    snapshot, so an entry saved mid-build is not lost.
+    Total memory is bounded by `max_tokens` indexed words across all users;
+    least recently used users are evicted first and rebuilt on their next search.
+
+    Query syntax: words must all match, `word*` matches a prefix (the last word
+    is always treated as a prefix) and "quoted words" must appear as a phrase.
+    """
+
+    def __init__(self, max_tokens: int = 2_000_000, max_users: int = 1000):
+        self.max_tokens = max_tokens
+        self.max_users = max_users
+        self._users: "OrderedDict[str, _UserIndex]" = OrderedDict()
+        self._size = 0
+        self._building: Dict[str, list] = {}  # user_id -> [builders in flight, buffered writes]
+        self._lock = threading.Lock()
+
+    # ---------- maintenance ---------- #
+    def has_user(self, user_id: str) -> bool:
+        with self._lock:
+            return user_id in self._users
+
+    def start_build(self, user_id: str):
+        """Mark a build as in flight; writes from now on are replayed by `build`."""
+        with self._lock:
+            self._building.setdefault(user_id, [0, []])[0] += 1
+
+    def cancel_build(self, user_id: str):
+        """The read for a started build failed: stop buffering for it."""
+        with self._lock:
+            self._finish_build(user_id)
+
+    def build(self, user_id: str, entries: Iterable[Dict[str, Any]]):
+        """(Re)build a user's index from {id, content, createdAt} dicts."""
+        index = _UserIndex()
+        for e in entries:
+            index.add(e["id"], e.get("content", ""), e.get("createdAt"))
+        with self._lock:
+            for write in self._finish_build(user_id):
+                _apply(index, *write)
+            old = self._users.pop(user_id, None)
+            if old is not None:
+                self._size -= old.size
+            self._users[user_id] = index
+            self._size += index.size
+            self._evict(keep=user_id)
+
+    def _finish_build(self, user_id: str) -> List[tuple]:
+        """Writes buffered for one finished build (kept while other builds are still reading)."""
+        building = self._building.get(user_id)
+        if building is None:
+            return []
+        building[0] -= 1
+        if building[0] <= 0:
+            del self._building[user_id]
+        return list(building[1])
+
+    def upsert(self, user_id: str, entry_id: str, content: str, created_at=None):
+        """Index a new or edited entry. No-op until the user's index has been built or a build started."""
+        with self._lock:
+            if user_id in self._building:
+                self._building[user_id][1].append((entry_id, content, created_at))
+            index = self._users.get(user_id)
+            if index is None:
+                return
+            before = index.size
+            _apply(index, entry_id, content, created_at)
+            self._size += index.size - before
+            self._users.move_to_end(user_id)
+            self._evict(keep=user_id)
+
+    def remove(self, user_id: str, entry_id: str):
+        with self._lock:
+            if user_id in self._building:
+                self._building[user_id][1].append((entry_id, None, None))
+            index = self._users.get(user_id)
+            if index is None:
+                return
+            before = index.size
+            index.remove(entry_id)
+            self._size += index.size - before
+
+    def drop_user(self, user_id: str):
+        with self._lock:
+            old = self._users.pop(user_id, None)
+            if old is not None:
+                self._size -= old.size
+
+    def _evict(self, keep: str):
+        while self._users and (self._size > self.max_tokens or len(self._users) > self.max_users):
+            user_id = next(iter(self._users))
+            if user_id == keep:
+                break
+            self._size -= self._users.pop(user_id).size
+
+    # ---------- search ---------- #
+    def search(self, user_id: str, query: str, limit: int = 10, offset: int = 0) -> Dict[str, Any]:
+        """
+        Ranked search over a user's entries (most matches first, then newest):
+          { total, results: [ {id, snippet, createdAt, score}, ... ] }
+        `snippet` is HTML-safe with matches wrapped in <mark>.
+        Returns None if the user's index has not been built.
+        """
+        clauses = self._parse(query)
+        with self._lock:
+            index = self._users.get(user_id)
+            if index is None:
+                return None
+            self._users.move_to_end(user_id)
+            if not clauses:
+                return {"total": 0, "results": []}
+
+            scores: Optional[Dict[str, int]] = None
+            highlight: Dict[str, set] = {}
+            for kind, words, prefix in clauses:
+                if kind == "phrase":
+                    hits = index.match_phrase(words)
+                    spans = {eid: {p + i for p in ps for i in range(len(words))} for eid, ps in hits.items()}
+                else:
+                    hits = index.match_term(words[0], prefix)
+                    spans = {eid: set(ps) for eid, ps in hits.items()}
+                if scores is None:
+                    scores = {eid: len(ps) for eid, ps in hits.items()}
+                else:
+                    scores = {eid: s + len(hits[eid]) for eid, s in scores.items() if eid in hits}
+                for eid, ps in spans.items():
+                    highlight.setdefault(eid, set()).update(ps)
+
+            ranked = sorted(
+                scores.items(),
+                key=lambda kv: (kv[1], _sort_key(index.entries[kv[0]]["createdAt"])),
+                reverse=True,
+            )
+            page = [(eid, score, dict(index.entries[eid])) for eid, score in ranked[offset:offset + limit]]
+
+        results = [{
+            "id": eid,
+            "snippet": _snippet(entry["content"], highlight.get(eid, set())),
+            "createdAt": entry["createdAt"],
+            "score": score,
+        } for eid, score, entry in page]
+        return {"total": len(ranked), "results": results}
+
+    @staticmethod
+    def _parse(query: str) -> List[Tuple[str, List[str], bool]]:
+        """Split a query into ('phrase', words, False) and ('term', [word], is_prefix) clauses."""
+        clauses = []
+        for phrase, bare in _QUERY_RE.findall(query or ""):
+            if phrase:
+                words = _tokenize(phrase)
+                if len(words) > 1:
+                    clauses.append(("phrase", words, False))
+                elif words:
+                    clauses.append(("term", words, False))
+            else:
+                words = _tokenize(bare)
+                for i, w in enumerate(words):
+                    clauses.append(("term", [w], bare.endswith("*") and i == len(words) - 1))
+        # search-as-you-type: the last bare word is always a prefix
+        if clauses and clauses[-1][0] == "term" and not (query or "").rstrip().endswith('"'):
+            kind, words, _ = clauses[-1]
+            clauses[-1] = (kind, words, True)
+        return clauses
+
+
+def _apply(index: _UserIndex, entry_id: str, content: Optional[str], created_at=None):
+    """Apply one write to a user's index (content None removes the entry)."""
+    if content is None:
+        index.remove(entry_id)
+        return
+    if created_at is None and entry_id in index.entries:
+        created_at = index.entries[entry_id]["createdAt"]
+    index.add(entry_id, content, created_at)
+
+
+def _sort_key(created_at) -> float:
+    """Seconds since epoch for datetime / Firestore timestamps; 0 if unknown."""
+    try:
+        return created_at.timestamp()
+    except Exception:
+        return 0.0
+
+
+def _snippet(content: str, positions: set, width: int = 12) -> str:
+    """~`width` words around the first match, HTML-escaped, matches in <mark>."""
+    words = list(_WORD_RE.finditer(content))
+    if not words:
+        return html.escape(content[:120])
+    first = min(positions) if positions else 0
+    start = max(0, first - width // 3)
+    end = min(len(words), start + width)
+
+    out = ["…" if start > 0 else ""]
+    cursor = words[start].start()
+    for i in range(start, end):
+        m = words[i]
+        out.append(html.escape(content[cursor:m.start()]))
+        word = html.escape(m.group(0))
+        out.append(f"<mark>{word}</mark>" if i in positions else word)
+        cursor = m.end()
+    out.append(html.escape(content[cursor:]) if end == len(words) else "…")
+    return "".join(out)
+
+
+# Global instance
+journal_index = JournalSearchIndex()
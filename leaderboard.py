@@ -0,0 +1,151 @@
+"""
+In-process streak leaderboard.
+
+Every user's score is their best live habit streak, the max of
+`streaks.current()` over their habits. Users with a positive score sit in
+one Python list sorted by (-score, uid): a global page of K is a slice, a
+user's position is a bisect, and a score change is a bisect-delete plus an
+insort - O(log N) comparisons but an O(N) memmove, which stays well under a
+millisecond for the user counts one process holds. Friends boards only look
+at the given uids (O(F log K) with a heap).
+
+Streaks expire without a write when a day is missed, so each entry
+remembers the last day it is valid for; expired entries found while reading
+are rescored on the spot, and there is no midnight job.
+
+The board is built once per process from the habits collection (`build`,
+see `_ensure_leaderboard` in web_app.py) and then kept current by the
+completion / reopen / reset / delete routes through `update_habit` and
+`remove_habit`. Until it is built, updates are no-ops.
+"""
+import heapq
+import threading
+from bisect import bisect_left, insort
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+import streaks
+
+
+class StreakLeaderboard:
+    """In-process ranking of users by their best live habit streak (see the module docstring)."""
+
+    def __init__(self):
+        self._habits: Dict[str, Dict[str, Tuple[int, Optional[date]]]] = {}  # uid -> hid -> (streak, last day)
+        self._best: Dict[str, Tuple[int, Optional[date]]] = {}               # uid -> (score, valid through)
+        self._ranked: List[Tuple[int, str]] = []                             # sorted (-score, uid)
+        self._built = False
+        self._lock = threading.RLock()
+
+    # ---------- maintenance ---------- #
+    def is_built(self) -> bool:
+        return self._built
+
+    def build(self, habits: Iterable[Mapping[str, Any]], today: Optional[date] = None):
+        """(Re)build from habit dicts carrying `id`, `userID` and the streak fields."""
+        with self._lock:
+            self._habits, self._best, self._ranked = {}, {}, []
+            for h in habits:
+                if h.get('userID') and h.get('id'):
+                    self._habits.setdefault(h['userID'], {})[h['id']] = _habit_state(h)
+            for user_id in self._habits:
+                self._rescore(user_id, today)
+            self._built = True
+
+    def update_habit(self, user_id: str, habit_id: str, fields: Mapping[str, Any],
+                     today: Optional[date] = None):
+        """Apply a habit's new streak fields. No-op until the board has been built."""
+        with self._lock:
+            if not self._built or not user_id:
+                return
+            old = self._habits.setdefault(user_id, {}).get(habit_id, (0, None))
+            streak = fields.get('currentStreak', old[0]) or 0
+            last = streaks.parse_day(fields['lastCompletedDay']) if 'lastCompletedDay' in fields else old[1]
+            self._habits[user_id][habit_id] = (streak, last)
+            self._rescore(user_id, today)
+
+    def remove_habit(self, user_id: str, habit_id: str, today: Optional[date] = None):
+        with self._lock:
+            if not self._built or habit_id not in self._habits.get(user_id, {}):
+                return
+            del self._habits[user_id][habit_id]
+            self._rescore(user_id, today)
+
+    def remove_user(self, user_id: str):
+        with self._lock:
+            self._habits.pop(user_id, None)
+            self._set_score(user_id, 0, None)
+
+    def _rescore(self, user_id: str, today: Optional[date] = None):
+        today = today or date.today()
+        best, through = 0, None
+        for streak, last in self._habits.get(user_id, {}).values():
+            live = streaks.current({'currentStreak': streak, 'lastCompletedDay': last}, today)
+            if live > best:
+                best, through = live, (last + timedelta(days=1) if last else None)
+        self._set_score(user_id, best, through)
+
+    def _set_score(self, user_id: str, score: int, through: Optional[date]):
+        old = self._best.pop(user_id, None)
+        if old is not None:
+            i = bisect_left(self._ranked, (-old[0], user_id))
+            if i < len(self._ranked) and self._ranked[i] == (-old[0], user_id):
+                del self._ranked[i]
+        if score > 0:
+            self._best[user_id] = (score, through)
+            insort(self._ranked, (-score, user_id))
+
+    # ---------- queries ---------- #
+    def score(self, user_id: str, today: Optional[date] = None) -> int:
+        with self._lock:
+            entry = self._best.get(user_id)
+            if entry and _expired(entry, today):
+                self._rescore(user_id, today)
+                entry = self._best.get(user_id)
+            return entry[0] if entry else 0
+
+    def top(self, limit: int = 10, offset: int = 0, user_ids: Optional[Iterable[str]] = None,
+            today: Optional[date] = None) -> Dict[str, Any]:
+        """
+        One page of the board: {total, entries: [{uid, streak, rank}]}.
+        Global when `user_ids` is None, otherwise only among `user_ids`
+        (users without a live streak are listed with 0).
+        """
+        with self._lock:
+            if user_ids is not None:
+                uids = list(dict.fromkeys(user_ids))
+                scored = [(-self.score(uid, today), uid) for uid in uids]
+                page = heapq.nsmallest(offset + limit, scored)[offset:]
+                total = len(uids)
+            else:
+                self._expire_prefix(offset + limit, today)
+                page = self._ranked[offset:offset + limit]
+                total = len(self._ranked)
+            return {
+                'total': total,
+                'entries': [{'uid': uid, 'streak': -neg, 'rank': offset + i + 1}
+                            for i, (neg, uid) in enumerate(page)],
+            }
+
+    def _expire_prefix(self, needed: int, today: Optional[date]):
+        """Rescore expired entries among the first `needed` ranks."""
+        i = 0
+        while i < min(needed, len(self._ranked)):
+            uid = self._ranked[i][1]
+            if _expired(self._best[uid], today):
+                self._rescore(uid, today)  # moves the user down (or out); re-check index i
+            else:
+                i += 1
+
+
+def _habit_state(habit: Mapping[str, Any]) -> Tuple[int, Optional[date]]:
+    return habit.get('currentStreak') or 0, streaks.parse_day(habit.get('lastCompletedDay'))
+
+
+def _expired(entry: Tuple[int, Optional[date]], today: Optional[date]) -> bool:
+    through = entry[1]
+    return through is not None and (today or date.today()) > through
+
+
+# Global instance
+leaderboard = StreakLeaderboard()
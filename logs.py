@@ -0,0 +1,187 @@
+"""
+Structured, leveled, sampled logging.
+
+    from logs import get_logger
+    log = get_logger(__name__)
+    log.debug("found %d habits", len(habits))           # free when DEBUG is off
+    log.info("friend request sent", extra={'outcome': outcome})
+    log.exception("error getting friends")               # traceback included
+
+`configure(level, fmt, sample_rates)` (done by web_app.py from LOG_LEVEL,
+LOG_FORMAT and LOG_SAMPLE_RATES) routes every `habithive.*` logger through
+a QueueHandler: the request thread only builds the record - message,
+`extra` fields and the current request's method/path/endpoint - and puts
+it on an in-memory queue; a QueueListener thread formats it (one JSON
+object per line by default) and writes it to stdout. Threads do not
+survive fork(), so a pre-forked worker (gunicorn, uwsgi) starts its own
+listener on a fresh queue right after the fork.
+
+Records below WARNING are sampled per route: with
+`LOG_SAMPLE_RATES="get_friends=0.1"` one request in ten to /api/friends
+logs its info/debug lines (all or none of them); warnings and errors always
+get through.
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+ROOT = 'habithive'
+# attributes every LogRecord has; anything else on a record came from `extra=`
+_STANDARD = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request'}
+
+
+def get_logger(name: str) -> logging.Logger:
+    """A logger under the `habithive` hierarchy (`web_app` -> `habithive.web_app`)."""
+    return logging.getLogger(name if name.startswith(ROOT) else f'{ROOT}.{name}')
+
+
+def parse_sample_rates(spec: Optional[str]) -> Dict[str, float]:
+    """'get_friends=0.1, search_friend=0.5' -> {'get_friends': 0.1, 'search_friend': 0.5}"""
+    rates = {}
+    for item in (spec or '').split(','):
+        name, _, rate = item.partition('=')
+        if name.strip() and rate.strip():
+            rates[name.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+def _request_fields() -> Optional[dict]:
+    try:
+        from flask import has_request_context, request
+    except ImportError:
+        return None
+    if not has_request_context():
+        return None
+    return {'method': request.method, 'path': request.path, 'endpoint': request.endpoint}
+
+
+class RouteSampler(logging.Filter):
+    """Keeps a `rate` fraction of requests' sub-WARNING records, decided once per request."""
+
+    def __init__(self, rates: Dict[str, float], default: float = 1.0, rand=random.random):
+        super().__init__()
+        self.rates = rates
+        self.default = default
+        self._rand = rand
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        try:
+            from flask import g, has_request_context, request
+        except ImportError:
+            return True
+        if not has_request_context():
+            return True
+        keep = g.get('_log_sampled')
+        if keep is None:
+            rate = self.rates.get(request.endpoint or '', self.default)
+            keep = rate >= 1.0 or self._rand() < rate
+            g._log_sampled = keep
+        return keep
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        request = getattr(record, 'request', None)
+        if request:
+            data.update(request)
+        for key, value in vars(record).items():
+            if key not in _STANDARD and not key.startswith('_'):
+                data[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exc'] = record.exc_text
+        return json.dumps(data, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Resolves everything that depends on the calling thread before enqueueing."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.request = _request_fields()
+        return record
+
+
+_lock = threading.Lock()
+_listener: Optional[logging.handlers.QueueListener] = None
+_handler: Optional[_QueueHandler] = None
+
+
+def configure(level='INFO', fmt: str = 'json', sample_rates: Optional[Dict[str, float]] = None,
+              sample_default: float = 1.0, stream=None) -> logging.Logger:
+    """(Re)configure the `habithive` logger; safe to call more than once."""
+    global _listener, _handler
+    root = logging.getLogger(ROOT)
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+
+        records = queue.SimpleQueue()
+        output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(JsonFormatter() if fmt == 'json' else TextFormatter())
+        handler = _handler = _QueueHandler(records)
+        handler.addFilter(RouteSampler(sample_rates or {}, sample_default))
+        root.addHandler(handler)
+        root.setLevel(level.upper() if isinstance(level, str) else level)
+        root.propagate = False
+
+        _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+        _listener.start()
+    return root
+
+
+def flush():
+    """Stop the listener thread after it has written everything queued (e.g. at exit)."""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def _after_fork_in_child():
+    """Replace the listener thread fork() left behind (records queued in the parent stay there)."""
+    global _lock, _listener
+    _lock = threading.Lock()  # another thread may have held it at the fork
+    if _listener is None or _handler is None:
+        return
+    records = queue.SimpleQueue()
+    _handler.queue = records
+    _listener = logging.handlers.QueueListener(records, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
+
+
+atexit.register(flush)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
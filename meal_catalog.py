@@ -0,0 +1,95 @@
+"""
+The predefined meal plans, frozen and pre-serialized once at startup.
+
+`MealCatalog(plans)` deep-freezes the plan dict (read-only mappings and
+tuples), then renders every response body the catalog can produce - the
+plan list and each plan - to JSON bytes, gzip (and Brotli when the
+`brotli` package is installed) and a strong ETag. The meal routes hand
+those bytes out as they are, so a catalog request costs a dict lookup.
+"""
+import gzip
+import hashlib
+import json
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+
+def freeze(value):
+    if isinstance(value, Mapping):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def thaw(value):
+    if isinstance(value, Mapping):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(v) for v in value]
+    return value
+
+
+def dumps(value) -> bytes:
+    return json.dumps(thaw(value), separators=(',', ':'), sort_keys=True).encode('utf-8')
+
+
+class Body:
+    """One immutable JSON body with its encodings and strong ETag."""
+    __slots__ = ('identity', 'encoded', 'etag')
+
+    def __init__(self, data: bytes):
+        self.identity = data
+        self.encoded: Dict[str, bytes] = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            self.encoded['br'] = brotli.compress(data)
+        self.etag = hashlib.sha256(data).hexdigest()[:32]
+
+    def negotiate(self, accept_encodings) -> Tuple[bytes, Optional[str]]:
+        """(bytes, Content-Encoding) for a werkzeug Accept-Encoding header, preferring br."""
+        for encoding in ('br', 'gzip'):
+            if encoding in self.encoded and accept_encodings[encoding]:
+                return self.encoded[encoding], encoding
+        return self.identity, None
+
+    def etag_for(self, encoding: Optional[str]) -> str:
+        """Strong ETag of one encoding (each set of bytes gets its own tag)."""
+        return f'{self.etag}-{encoding}' if encoding else self.etag
+
+
+class MealCatalog:
+    def __init__(self, plans: Mapping[str, Mapping[str, Any]]):
+        self.plans = freeze(plans)
+        summaries = [{'type': plan_type, 'name': plan['name'], 'description': plan['description']}
+                     for plan_type, plan in self.plans.items()]
+        self.list_body = Body(dumps({'success': True, 'plans': summaries}))
+        # each plan as a JSON object, spliced into the per-user current-plan response
+        self.plan_json: Mapping[str, bytes] = MappingProxyType({
+            plan_type: dumps({'type': plan_type, 'name': plan['name'],
+                              'description': plan['description'], 'meals': plan['meals']})
+            for plan_type, plan in self.plans.items()
+        })
+
+    def __contains__(self, plan_type) -> bool:
+        return plan_type in self.plans
+
+    def __getitem__(self, plan_type: str):
+        return self.plans[plan_type]
+
+    def meals(self, plan_type: str) -> Dict[str, Any]:
+        """A plan's meals as a plain, mutable dict (e.g. to copy into Firestore)."""
+        return thaw(self.plans[plan_type]['meals'])
+
+    def current_plan_body(self, plan_type: str, extra: Mapping[str, Any], encode=dumps) -> bytes:
+        """
+        {"success": true, "hasPlan": true, "plan": {...plan, ...extra}} from the
+        pre-serialized plan plus the few per-user fields in `extra`.
+        """
+        plan = self.plan_json[plan_type]
+        tail = b''.join(b',' + json.dumps(k).encode('utf-8') + b':' + encode(v) for k, v in extra.items())
+        return b'{"hasPlan":true,"plan":' + plan[:-1] + tail + b'},"success":true}'
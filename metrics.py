@@ -0,0 +1,343 @@
+"""
+Request latency and Firestore operation metrics, in Prometheus text format.
+
+    metrics.instrument(app)                  # per-endpoint latency + status counts
+    db = metrics.count_firestore(client)     # per-request Firestore reads/writes/...
+    metrics.registry.render()                # body of GET /metrics
+
+Firestore operations are counted where they hit the wire - on the client's
+GAPIC API object - so batches, transactions, `get_all` and streamed
+queries are all seen, whichever module issued them:
+
+    read    documents fetched (point gets and documents returned by queries)
+    write   set/update writes in a commit
+    delete  delete writes in a commit
+    query   query, aggregation and list round trips
+    rpc     every round trip to Firestore
+
+Totals are kept per endpoint; the per-request counts also go into a
+histogram, so a route whose reads grow with the data (an N+1 loop) shows
+up as a heavy tail. No prometheus_client dependency: the handful of
+metric types needed are implemented here.
+"""
+import bisect
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+OPERATION_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+OPERATIONS = ('read', 'write', 'delete', 'query', 'rpc')
+BACKGROUND = '<background>'  # operations issued outside a request (e.g. warm-up threads)
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1):
+        with self._lock:
+            self._values[tuple(label_values)] += amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(tuple(label_values), 0)
+
+    def items(self):
+        with self._lock:
+            return sorted(self._values.items())
+
+    def samples(self) -> Iterable[str]:
+        for values, total in self.items():
+            yield f'{self.name}{_labels(self.labels, values)} {_number(total)}'
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], list] = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def snapshot(self, *label_values: str) -> Optional[dict]:
+        """{'count', 'sum', 'buckets': [(le, cumulative)]} for one label set."""
+        with self._lock:
+            series = list(self._series.get(tuple(label_values)) or ())
+        if not series:
+            return None
+        cumulative, out = 0, []
+        for le, n in zip(self.buckets, series):
+            cumulative += n
+            out.append((le, cumulative))
+        return {'count': series[-1], 'sum': series[-2], 'buckets': out}
+
+    def quantile(self, q: float, *label_values: str) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile (None when empty or beyond the last bucket)."""
+        snap = self.snapshot(*label_values)
+        if not snap:
+            return None
+        target = q * snap['count']
+        for le, cumulative in snap['buckets']:
+            if cumulative >= target:
+                return le
+        return None
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            keys = sorted(self._series)
+        for values in keys:
+            snap = self.snapshot(*values)
+            for le, cumulative in snap['buckets'] + [(float('inf'), snap['count'])]:
+                le_label = 'le="%s"' % _number(le)
+                yield f'{self.name}_bucket{_labels(self.labels, values, le_label)} {cumulative}'
+            yield f'{self.name}_sum{_labels(self.labels, values)} {_number(snap["sum"])}'
+            yield f'{self.name}_count{_labels(self.labels, values)} {snap["count"]}'
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+request_latency = registry.register(Histogram(
+    'habithive_request_duration_seconds', 'Time to produce a response, by endpoint.',
+    ('endpoint', 'method')))
+requests_total = registry.register(Counter(
+    'habithive_requests_total', 'Responses by endpoint and status code.',
+    ('endpoint', 'method', 'status')))
+firestore_ops = registry.register(Counter(
+    'habithive_firestore_operations_total', 'Firestore operations by endpoint and kind.',
+    ('endpoint', 'op')))
+firestore_ops_per_request = registry.register(Histogram(
+    'habithive_firestore_operations_per_request', 'Firestore operations issued by one request.',
+    ('endpoint', 'op'), buckets=OPERATION_BUCKETS))
+
+
+# -- per-request accounting ---------------------------------------------------- #
+def _request_state():
+    """(g, endpoint) for the current request, or (None, BACKGROUND)."""
+    try:
+        from flask import g, has_request_context, request
+    except ImportError:
+        return None, BACKGROUND
+    if not has_request_context():
+        return None, BACKGROUND
+    return g, request.endpoint or '<unmatched>'
+
+
+def record_operation(op: str, amount: int = 1):
+    if amount <= 0:
+        return
+    g, endpoint = _request_state()
+    firestore_ops.inc(endpoint, op, amount=amount)
+    if g is not None:
+        ops = g.setdefault('_firestore_ops', defaultdict(int))
+        ops[op] += amount
+
+
+def record_wait(seconds: float):
+    """Time the current request spent waiting on Firestore (calls and streamed results)."""
+    g, _ = _request_state()
+    if g is not None:
+        g._firestore_wait = g.get('_firestore_wait', 0.0) + seconds
+
+
+def request_wait() -> float:
+    g, _ = _request_state()
+    return g.get('_firestore_wait', 0.0) if g is not None else 0.0
+
+
+def request_operations() -> Dict[str, int]:
+    """Firestore operations issued so far by the current request."""
+    g, _ = _request_state()
+    return dict(g.get('_firestore_ops') or {}) if g is not None else {}
+
+
+def instrument(app):
+    """Time every request and count responses by endpoint and status."""
+    from flask import g, request
+
+    @app.before_request
+    def _metrics_start():
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _metrics_response(response):
+        _finish(g, request, response.status_code)
+        return response
+
+    @app.teardown_request
+    def _metrics_teardown(exc):
+        if exc is not None:
+            _finish(g, request, 500)  # unhandled: after_request did not run
+
+    return app
+
+
+def _finish(g, request, status: int):
+    start = g.pop('_metrics_start', None)
+    if start is None:
+        return
+    endpoint = request.endpoint or '<unmatched>'
+    request_latency.observe(time.perf_counter() - start, endpoint, request.method)
+    requests_total.inc(endpoint, request.method, str(status))
+    ops = g.get('_firestore_ops') or {}
+    for op in OPERATIONS:
+        firestore_ops_per_request.observe(ops.get(op, 0), endpoint, op)
+
+
+def endpoint_summary(endpoints: Iterable[str]) -> Dict[str, dict]:
+    """Per-endpoint counts, latency percentiles (bucket bounds) and Firestore ops, for _debug/routes."""
+    summary = {}
+    by_status = requests_total.items()
+    for endpoint in endpoints:
+        methods = sorted({m for (e, m, _), _ in by_status if e == endpoint})
+        if not methods:
+            continue
+        summary[endpoint] = {
+            'requests': {f'{m} {s}': int(n) for (e, m, s), n in by_status if e == endpoint},
+            'latency_p50_le': {m: request_latency.quantile(0.5, endpoint, m) for m in methods},
+            'latency_p95_le': {m: request_latency.quantile(0.95, endpoint, m) for m in methods},
+            'firestore': {op: int(firestore_ops.value(endpoint, op)) for op in OPERATIONS
+                          if firestore_ops.value(endpoint, op)},
+        }
+    return summary
+
+
+# -- Firestore wrapper ---------------------------------------------------------- #
+def _field(request, name):
+    if request is None:
+        return None
+    if isinstance(request, dict):
+        return request.get(name)
+    return getattr(request, name, None)
+
+
+def _request_arg(args, kwargs):
+    return kwargs.get('request', args[0] if args else None)
+
+
+def _timed_stream(responses, field: Optional[str] = None):
+    """Yield a server stream's responses, timing each wait (and counting documents in `field`)."""
+    iterator = iter(responses)
+    while True:
+        start = time.perf_counter()
+        try:
+            response = next(iterator)
+        except StopIteration:
+            record_wait(time.perf_counter() - start)
+            return
+        record_wait(time.perf_counter() - start)
+        if field and _field(response, field):
+            record_operation('read')
+        yield response
+
+
+# observer(method_name, request) is called before every Firestore round trip (see query_trace.py)
+observers = []
+
+
+def count_firestore(client):
+    """
+    Count the operations `client` (a google.cloud.firestore Client) sends,
+    by wrapping its GAPIC API methods in place. Returns the client.
+    """
+    api = client._firestore_api
+
+    def wrap(name, count):
+        method = getattr(api, name, None)
+        if method is None:
+            return
+
+        def counted(*args, **kwargs):
+            request = _request_arg(args, kwargs)
+            for observer in observers:
+                observer(name, request)
+            record_operation('rpc')
+            start = time.perf_counter()
+            try:
+                result = method(*args, **kwargs)
+            finally:
+                record_wait(time.perf_counter() - start)
+            return count(request, result)
+        setattr(api, name, counted)
+
+    def gets(request, result):
+        record_operation('read', len(_field(request, 'documents') or ()))
+        return _timed_stream(result)
+
+    def commit(request, result):
+        writes = list(_field(request, 'writes') or ())
+        deletes = sum(1 for w in writes if _field(w, 'delete'))
+        record_operation('delete', deletes)
+        record_operation('write', len(writes) - deletes)
+        return result
+
+    def query(request, result):
+        record_operation('query')
+        return _timed_stream(result, 'document')
+
+    def listing(request, result):
+        record_operation('query')
+        return result
+
+    def passthrough(request, result):
+        return result
+
+    wrap('batch_get_documents', gets)
+    wrap('commit', commit)
+    wrap('run_query', query)
+    wrap('run_aggregation_query', listing)
+    wrap('list_documents', listing)
+    wrap('list_collection_ids', listing)
+    wrap('begin_transaction', passthrough)
+    wrap('rollback', passthrough)
+    return client
@@ -0,0 +1,54 @@
+"""
+Rewrite legacy habit completion data into the canonical schema (see completions.py).
+
+    python migrate_completions.py                      # run / resume all phases
+    python migrate_completions.py --dry-run            # count only, write nothing
+    python migrate_completions.py --phase progress     # one phase
+    python migrate_completions.py --phase user_rollups      # rebuild per-user daily/weekly/monthly stats
+    python migrate_completions.py --phase habit_streaks     # recompute streak fields from history
+    python migrate_completions.py --phase monthly_buckets   # pack days into month docs
+    python migrate_completions.py --reset              # forget the checkpoint
+
+Progress is checkpointed to --checkpoint after every committed page, so the
+script can be stopped and re-run at any time.
+"""
+import argparse
+import os
+
+import firebase_admin
+from firebase_admin import credentials, firestore
+
+import completions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--credentials', default='firebase-credentials.json')
+    parser.add_argument('--checkpoint', default='.completions_migration.json')
+    parser.add_argument('--page-size', type=int, default=300)
+    parser.add_argument('--phase', action='append',
+                        choices=[name for name, _, _ in
+                                 completions.MIGRATION_PHASES
+                                 + [completions.ROLLUP_PHASE, completions.STREAK_PHASE,
+                                    completions.PACK_PHASE]])
+    parser.add_argument('--dry-run', action='store_true')
+    parser.add_argument('--reset', action='store_true')
+    args = parser.parse_args(argv)
+
+    if args.reset and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
+    try:
+        firebase_admin.get_app()
+    except ValueError:
+        firebase_admin.initialize_app(credentials.Certificate(args.credentials))
+    db = firestore.client()
+
+    stats = completions.migrate(db, checkpoint_path=args.checkpoint, page_size=args.page_size,
+                                dry_run=args.dry_run, phases=args.phase)
+    for phase, count in stats.items():
+        print(f"{phase}: {count} documents converted")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+Development-mode Firestore tracing: N+1 detection and per-route budgets.
+
+With QUERY_TRACE on, every Firestore round trip made while handling a
+request (seen through the metrics.py client wrapper) is recorded with its
+*shape* - the method, collection path with ids replaced by `*` and, for
+queries, the structured query with literal values removed - and its call
+site in this repository:
+
+    query users/*/friends {"from": [...], "where": {... "field": "uid", "op": "EQUAL"}}
+        friend_graph.py:161 in list_friends < web_app.py:652 in get_friends
+
+A shape issued QUERY_REPEAT_LIMIT times in one request is reported as an
+N+1 pattern (a query inside a loop), and a request that exceeds its
+read/write/query budget (QUERY_BUDGETS, per endpoint with a '*' default)
+is reported too - logged as a warning, or raised as QueryBudgetExceeded
+when QUERY_TRACE_ACTION is 'raise' (useful in tests and CI).
+"""
+import json
+import os
+import sys
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import metrics
+from logs import get_logger
+
+log = get_logger(__name__)
+
+DEFAULT_REPEAT_LIMIT = 3
+DEFAULT_BUDGETS = {'*': {'read': 300, 'write': 200, 'query': 25}}
+_ROOT = os.path.dirname(os.path.abspath(__file__))
+_SKIP_FILES = {os.path.join(_ROOT, name) for name in ('metrics.py', 'query_trace.py', 'firebase_client.py')}
+_SCRUB = {'value', 'values', 'start_at', 'end_at', 'startAt', 'endAt', 'offset'}
+
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+
+# -- shapes ------------------------------------------------------------------- #
+def path_shape(name: Optional[str]) -> str:
+    """'projects/p/databases/(default)/documents/users/abc/friends/x' -> 'users/*/friends/*'"""
+    if not name:
+        return ''
+    _, sep, rest = str(name).partition('/documents')
+    segments = [s for s in (rest if sep else str(name)).split('/') if s]
+    return '/'.join('*' if i % 2 else s for i, s in enumerate(segments))
+
+
+def _as_dict(message):
+    if message is None or isinstance(message, (dict, list, str, int, float, bool)):
+        return message
+    to_dict = getattr(type(message), 'to_dict', None)
+    if to_dict is not None:
+        return to_dict(message)
+    if hasattr(message, 'DESCRIPTOR'):
+        from google.protobuf.json_format import MessageToDict
+        return MessageToDict(message)
+    return repr(message)
+
+
+def _scrub(value):
+    if isinstance(value, dict):
+        return {k: _scrub(v) for k, v in value.items() if k not in _SCRUB}
+    if isinstance(value, list):
+        return [_scrub(v) for v in value]
+    return value
+
+
+def shape(method: str, request) -> str:
+    field = metrics._field
+    if method == 'batch_get_documents':
+        paths = sorted({path_shape(d) for d in field(request, 'documents') or ()})
+        return 'get ' + ','.join(paths)
+    if method in ('run_query', 'run_aggregation_query'):
+        query = field(request, 'structured_query') or field(request, 'structured_aggregation_query')
+        body = json.dumps(_scrub(_as_dict(query)), sort_keys=True, default=str)
+        return f"query {path_shape(field(request, 'parent'))} {body}"
+    if method == 'commit':
+        paths = set()
+        for write in field(request, 'writes') or ():
+            paths.add(path_shape(field(write, 'delete') or field(field(write, 'update'), 'name')))
+        return 'commit ' + ','.join(sorted(paths))
+    return method
+
+
+def call_site(depth: int = 2) -> str:
+    """The innermost `depth` frames in this repository (outside the tracing modules), innermost first."""
+    frames = []
+    frame = sys._getframe(1)
+    while frame is not None and len(frames) < depth:
+        path = frame.f_code.co_filename
+        if path.startswith(_ROOT) and path not in _SKIP_FILES and 'site-packages' not in path:
+            frames.append(f'{os.path.relpath(path, _ROOT)}:{frame.f_lineno} in {frame.f_code.co_name}')
+        frame = frame.f_back
+    return ' < '.join(frames) or '<unknown>'
+
+
+# -- tracer ------------------------------------------------------------------- #
+class QueryTracer:
+    """Reads QUERY_TRACE, QUERY_TRACE_ACTION, QUERY_REPEAT_LIMIT and QUERY_BUDGETS from app.config on each call."""
+
+    def install(self, app):
+        if self.observe not in metrics.observers:  # one observer however many apps are built
+            metrics.observers.append(self.observe)
+        app.after_request(self._after_request)
+        return self
+
+    @staticmethod
+    def _state():
+        from flask import current_app, g, has_request_context, request
+        if not has_request_context() or not current_app.config.get('QUERY_TRACE'):
+            return None, None, None
+        return current_app.config, g, request.endpoint or '<unmatched>'
+
+    def observe(self, method: str, request):
+        config, g, endpoint = self._state()
+        if config is None:
+            return
+        calls = g.setdefault('_query_trace', [])
+        call = {'method': method, 'shape': shape(method, request), 'site': call_site()}
+        calls.append(call)
+
+        same = [c for c in calls if c['shape'] == call['shape']]
+        if len(same) == int(config.get('QUERY_REPEAT_LIMIT', DEFAULT_REPEAT_LIMIT)):
+            self._report(config, f"N+1: same Firestore {method} issued {len(same)} times in {endpoint}",
+                         shape=call['shape'], sites=sorted({c['site'] for c in same}))
+        self._check_budget(config, g, endpoint)
+
+    def _after_request(self, response):
+        config, g, endpoint = self._state()
+        if config is not None and g.get('_query_trace'):
+            self._check_budget(config, g, endpoint)
+            log.debug("%d Firestore calls", len(g._query_trace), extra={'firestore': metrics.request_operations()})
+        return response
+
+    def _check_budget(self, config, g, endpoint):
+        budgets = config.get('QUERY_BUDGETS') or DEFAULT_BUDGETS
+        budget = budgets.get(endpoint) or budgets.get('*') or {}
+        ops = metrics.request_operations()
+        used = {'read': ops.get('read', 0), 'write': ops.get('write', 0) + ops.get('delete', 0),
+                'query': ops.get('query', 0)}
+        flagged = g.setdefault('_query_budget_flagged', set())
+        for kind, limit in budget.items():
+            if used.get(kind, 0) > limit and kind not in flagged:
+                flagged.add(kind)
+                self._report(config, f"{endpoint} exceeded its Firestore {kind} budget: {used[kind]} > {limit}",
+                             sites=_sites(g.get('_query_trace') or []))
+
+    @staticmethod
+    def _report(config, message: str, **fields):
+        if config.get('QUERY_TRACE_ACTION') == 'raise':
+            raise QueryBudgetExceeded(message)
+        log.warning(message, extra=fields)
+
+
+def _sites(calls: List[dict], top: int = 5) -> Dict[str, int]:
+    counts = defaultdict(int)
+    for call in calls:
+        counts[call['site']] += 1
+    return dict(sorted(counts.items(), key=lambda item: -item[1])[:top])
+
+
+def request_trace() -> List[dict]:
+    """The calls traced so far in the current request ([] when tracing is off)."""
+    from flask import g, has_request_context
+    return list(g.get('_query_trace') or []) if has_request_context() else []
+
+
+query_tracer = QueryTracer()
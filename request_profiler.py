@@ -0,0 +1,211 @@
+"""
+On-demand profiling of a single request, for debug/staging deployments.
+
+A request is profiled only when profiling is allowed (debug mode, or
+PROFILER_ENABLED on a staging copy), PROFILER_SECRET is set and the request
+carries it:
+
+    curl -H "X-Profile: $PROFILER_SECRET" -b cookies.txt http://staging/api/friends
+
+A sampling profiler (a thread snapshotting the request thread's stack every
+PROFILER_INTERVAL seconds) always runs. Its stacks are cut at the view
+function, so Flask and WSGI frames do not crowd out the code being profiled,
+and each sample counts for the measured wall time over the number of
+samples: the sampler wakes late whenever it waits for the GIL.
+`X-Profile-Mode: cprofile` adds cProfile for exact call counts. The result has
+
+    top         the PROFILER_TOP functions by total time, with their share of the samples
+    collapsed   "frame;frame;frame count" lines - flamegraph.pl / speedscope input
+    firestore   time spent waiting on Firestore and its operation counts (metrics.py)
+
+`X-Profile-Output: inline` (the default) replaces the response with that
+JSON; `store` keeps the response and writes <id>.json and <id>.collapsed
+under PROFILER_DIR, returning the id in an X-Profile-Id header.
+"""
+import cProfile
+import hmac
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from types import CodeType
+from typing import List, Optional
+
+import metrics
+from logs import get_logger
+
+log = get_logger(__name__)
+
+HEADER = 'X-Profile'
+MODE_HEADER = 'X-Profile-Mode'
+OUTPUT_HEADER = 'X-Profile-Output'
+_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def _label(name: str, path: str, line: int) -> str:
+    """'get_friends (web_app.py:640)' - repo files relative, others by basename; no ';' (the stack separator)."""
+    path = os.path.relpath(path, _ROOT) if path.startswith(_ROOT) else os.path.basename(path)
+    return f'{name} ({path}:{line})'.replace(';', ':')
+
+
+class StackSampler:
+    """Samples one thread's Python stack from a background thread, up to `root` (a code object) if given."""
+
+    def __init__(self, thread_id: int, interval: float = 0.002, root: Optional[CodeType] = None):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.root = root
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.elapsed = 0.0
+        self._started = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.elapsed = time.perf_counter() - self._started
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(_label(code.co_name, code.co_filename, code.co_firstlineno))
+                if code is self.root:
+                    break
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+                self.samples += 1
+
+    def collapsed(self) -> str:
+        return '\n'.join(f"{';'.join(stack)} {count}" for stack, count in self.stacks.most_common())
+
+    @property
+    def sample_ms(self) -> float:
+        """Wall time each sample stands for; about the interval, more when the sampler was starved."""
+        return self.elapsed * 1000 / self.samples if self.samples else 0.0
+
+    def top(self, n: int) -> List[dict]:
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for label in set(stack):
+                total[label] += count
+        ms = self.sample_ms
+        return [{'function': label, 'total_ms': round(count * ms, 1), 'self_ms': round(own[label] * ms, 1),
+                 'percent': round(100 * count / self.samples, 1), 'samples': count}
+                for label, count in total.most_common(n)]
+
+
+def cprofile_top(profile: cProfile.Profile, n: int) -> List[dict]:
+    stats = pstats.Stats(profile)
+    rows = []
+    for (path, line, name), (_, calls, own, total, _) in stats.stats.items():
+        rows.append({'function': _label(name, path, line), 'calls': calls,
+                     'self_ms': round(own * 1000, 3), 'total_ms': round(total * 1000, 3)})
+    rows.sort(key=lambda row: row['total_ms'], reverse=True)
+    return rows[:n]
+
+
+class RequestProfiler:
+    """Reads PROFILER_* settings from app.config on each request."""
+
+    def install(self, app):
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.teardown_request(self._teardown)
+        return self
+
+    @staticmethod
+    def allowed(app, headers) -> bool:
+        secret = app.config.get('PROFILER_SECRET') or ''
+        token = headers.get(HEADER) or ''
+        if not secret or not token or not (app.debug or app.config.get('PROFILER_ENABLED')):
+            return False
+        return hmac.compare_digest(token.encode('utf-8'), secret.encode('utf-8'))
+
+    def _start(self):
+        from flask import current_app, g, request
+        if not self.allowed(current_app, request.headers):
+            return
+        config = current_app.config
+        view = current_app.view_functions.get(request.endpoint)
+        state = {'started': time.perf_counter(),
+                 'mode': (request.headers.get(MODE_HEADER) or 'sample').lower(),
+                 'sampler': StackSampler(threading.get_ident(), config.get('PROFILER_INTERVAL', 0.002),
+                                         getattr(view, '__code__', None)).start()}
+        if state['mode'] == 'cprofile':
+            state['profile'] = cProfile.Profile()
+            state['profile'].enable()
+        g._request_profile = state
+
+    def _stop(self, state) -> float:
+        if state.get('profile'):
+            state['profile'].disable()
+        state['sampler'].stop()
+        return time.perf_counter() - state['started']
+
+    def _finish(self, response):
+        from flask import current_app, g, jsonify, request
+        state = g.pop('_request_profile', None)
+        if state is None:
+            return response
+        elapsed = self._stop(state)
+        top_n = int(current_app.config.get('PROFILER_TOP', 30))
+        sampler = state['sampler']
+        report = {
+            'id': f"{time.strftime('%Y%m%d-%H%M%S')}-{request.endpoint or 'unmatched'}-{uuid.uuid4().hex[:6]}",
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'mode': state['mode'],
+            'duration_ms': round(elapsed * 1000, 3),
+            'firestore': {'wait_ms': round(metrics.request_wait() * 1000, 3),
+                          'operations': metrics.request_operations()},
+            'samples': sampler.samples,
+            'interval_ms': sampler.interval * 1000,
+            'sample_ms': round(sampler.sample_ms, 3),
+            'top': cprofile_top(state['profile'], top_n) if state.get('profile') else sampler.top(top_n),
+            'collapsed': sampler.collapsed(),
+        }
+        if (request.headers.get(OUTPUT_HEADER) or 'inline').lower() == 'store':
+            try:
+                self._store(current_app.config.get('PROFILER_DIR', 'profiles'), report)
+                response.headers['X-Profile-Id'] = report['id']
+            except OSError:
+                log.exception("could not store request profile")
+            return response
+        profiled = jsonify(report)
+        profiled.headers['Cache-Control'] = 'no-store'
+        return profiled
+
+    @staticmethod
+    def _store(directory: str, report: dict):
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, report['id'] + '.collapsed'), 'w') as f:
+            f.write(report['collapsed'] + '\n')
+        with open(os.path.join(directory, report['id'] + '.json'), 'w') as f:
+            json.dump(report, f, indent=1)
+
+    def _teardown(self, exc):
+        from flask import g
+        state = g.pop('_request_profile', None)
+        if state is not None:  # the view raised: after_request never ran
+            self._stop(state)
+
+
+request_profiler = RequestProfiler()
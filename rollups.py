@@ -0,0 +1,145 @@
+"""
+Pre-aggregated completion counts per user (Firestore).
+
+    user_daily_stats/{uid}_{YYYY-MM-DD}     one day
+    user_weekly_stats/{uid}_{YYYY-MM-DD}    one week, keyed by its Monday
+    user_monthly_stats/{uid}_{YYYY-MM}      one month
+
+Each document holds `userID`, its period key (`day` / `week` / `month`),
+`total` completions and `habits` {habitID: completions}. completions.py
+keeps them current with Increment transforms inside the same transaction
+or batch as the completion write itself, so analytics never have to scan
+raw completions: any date range is covered by at most a few dozen
+documents fetched in one batched read (see `range_totals`).
+
+Indexes: (userID ASC, day ASC) on user_daily_stats.
+"""
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Mapping, Tuple
+
+from firebase_client import firestore
+
+DAILY = 'user_daily_stats'
+WEEKLY = 'user_weekly_stats'
+MONTHLY = 'user_monthly_stats'
+
+
+def _as_date(value) -> date:
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+
+def week_start(day) -> date:
+    day = _as_date(day)
+    return day - timedelta(days=day.weekday())
+
+
+def _periods(day) -> List[Tuple[str, str, str]]:
+    """(collection, period field, period key) for every rollup `day` counts towards."""
+    day = _as_date(day)
+    return [
+        (DAILY, 'day', day.isoformat()),
+        (WEEKLY, 'week', week_start(day).isoformat()),
+        (MONTHLY, 'month', day.isoformat()[:7]),
+    ]
+
+
+def increments(db, user_id: str, deltas: Mapping[Tuple[str, str], int]) -> List[Tuple[Any, Dict[str, Any]]]:
+    """
+    Writes applying `deltas` {(habit_id, 'YYYY-MM-DD'): +n / -n} to every
+    rollup they touch, as (ref, data) pairs for set(..., merge=True).
+    """
+    docs: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for (habit_id, day), n in deltas.items():
+        if not n:
+            continue
+        for collection, field, key in _periods(day):
+            doc = docs.setdefault((collection, key), {
+                'userID': user_id, field: key, 'total': 0, 'habits': defaultdict(int),
+            })
+            doc['total'] += n
+            doc['habits'][habit_id] += n
+
+    writes = []
+    for (collection, key), doc in docs.items():
+        data = {k: v for k, v in doc.items() if k not in ('total', 'habits')}
+        data['total'] = firestore.Increment(doc['total'])
+        data['habits'] = {h: firestore.Increment(n) for h, n in doc['habits'].items()}
+        writes.append((db.collection(collection).document(f"{user_id}_{key}"), data))
+    return writes
+
+
+def build(db, user_id: str, days_by_habit: Mapping[str, Iterable[str]]) -> List[Tuple[Any, Dict[str, Any]]]:
+    """Absolute rollup documents for a user's full history, as (ref, data) pairs to set()."""
+    docs: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for habit_id, days in days_by_habit.items():
+        for day in days:
+            for collection, field, key in _periods(day):
+                doc = docs.setdefault((collection, key), {
+                    'userID': user_id, field: key, 'total': 0, 'habits': {},
+                })
+                doc['total'] += 1
+                doc['habits'][habit_id] = doc['habits'].get(habit_id, 0) + 1
+    return [(db.collection(collection).document(f"{user_id}_{key}"), doc)
+            for (collection, key), doc in docs.items()]
+
+
+# ---------- reads ---------- #
+def daily_stats(db, user_id: str, start, end) -> Dict[str, Dict[str, Any]]:
+    """
+    'YYYY-MM-DD' -> {total, habits} for each day in [start, end], oldest
+    first (days without completions are zero). One query.
+    """
+    start, end = _as_date(start), _as_date(end)
+    stats = {(start + timedelta(days=i)).isoformat(): {'total': 0, 'habits': {}}
+             for i in range((end - start).days + 1)}
+    query = db.collection(DAILY) \
+              .where('userID', '==', user_id) \
+              .where('day', '>=', start.isoformat()) \
+              .where('day', '<=', end.isoformat())
+    for doc in query.stream():
+        data = doc.to_dict() or {}
+        if data.get('day') in stats:
+            stats[data['day']] = {'total': data.get('total', 0), 'habits': data.get('habits') or {}}
+    return stats
+
+
+def _cover(start: date, end: date) -> List[Tuple[str, str]]:
+    """(collection, key) rollups - months, then weeks, then days - that exactly tile [start, end]."""
+    parts = []
+    cursor = start
+    while cursor <= end:
+        next_month = (cursor.replace(day=28) + timedelta(days=4)).replace(day=1)
+        if cursor.day == 1 and next_month - timedelta(days=1) <= end:
+            parts.append((MONTHLY, cursor.isoformat()[:7]))
+            cursor = next_month
+        elif cursor.weekday() == 0 and cursor + timedelta(days=6) <= end \
+                and (cursor + timedelta(days=6)).month == cursor.month:
+            parts.append((WEEKLY, cursor.isoformat()))
+            cursor += timedelta(days=7)
+        else:
+            parts.append((DAILY, cursor.isoformat()))
+            cursor += timedelta(days=1)
+    return parts
+
+
+def range_totals(db, user_id: str, start, end) -> Dict[str, Any]:
+    """
+    {total, habits: {habitID: completions}, reads} for [start, end], from
+    whole months, then whole weeks, then single days - one batched read.
+    Weeks that straddle a month boundary are read as days so that the
+    following month can still be read whole.
+    """
+    start, end = _as_date(start), _as_date(end)
+    refs = [db.collection(collection).document(f"{user_id}_{key}")
+            for collection, key in _cover(start, end)]
+
+    total, habits = 0, defaultdict(int)
+    for snap in db.get_all(refs) if refs else []:
+        if not snap.exists:
+            continue
+        data = snap.to_dict() or {}
+        total += data.get('total', 0)
+        for habit_id, n in (data.get('habits') or {}).items():
+            habits[habit_id] += n
+    return {'total': total, 'habits': dict(habits), 'reads': len(refs)}
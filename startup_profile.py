@@ -0,0 +1,184 @@
+"""
+Startup profiler: where does worker boot time go?
+
+Off unless HABITHIVE_PROFILE_STARTUP is set, e.g.
+
+    HABITHIVE_PROFILE_STARTUP=startup-profile.jsonl python -c "import web_app"
+
+(`1` writes to startup-profile.jsonl). web_app.py calls `start()` before its
+first import and `finish(app, ...)` after its last route. Each boot appends
+one JSON line with
+
+- per-module import times (cumulative and self, in ms), measured by
+  wrapping `builtins.__import__` while the profiler is running,
+- named phases (creating the Flask app, initializing Firebase and the
+  Firestore client - which otherwise happens lazily on the first request),
+- the time spent in `app.add_url_rule` and the number of routes,
+
+so boot-time regressions can be tracked across commits.
+"""
+import builtins
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional
+
+from logs import get_logger
+
+log = get_logger(__name__)
+
+ENV_VAR = 'HABITHIVE_PROFILE_STARTUP'
+DEFAULT_REPORT = 'startup-profile.jsonl'
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 3)
+
+
+def _absolute(name: str, globals_, level: int) -> str:
+    if level == 0 or not globals_:
+        return name
+    package = globals_.get('__package__') or ''
+    base = package.rsplit('.', level - 1)[0] if level > 1 else package
+    return f'{base}.{name}' if name else base
+
+
+class StartupProfiler:
+    def __init__(self, clock=time.perf_counter):
+        self._clock = clock
+        self.started = clock()
+        self.imports: Dict[str, List[float]] = {}  # module -> [cumulative, self] seconds
+        self.phases: Dict[str, float] = {}
+        self.route_seconds = 0.0
+        self.route_count = 0
+        self._original_import = None
+        self._local = threading.local()
+
+    # -- imports -------------------------------------------------------- #
+    def start(self):
+        if self._original_import is None:
+            self._original_import = builtins.__import__
+            builtins.__import__ = self._import
+
+    def stop(self):
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        original = self._original_import or builtins.__import__
+        module = _absolute(name, globals, level)
+        if module in sys.modules:  # already loaded: nothing to measure
+            return original(name, globals, locals, fromlist, level)
+        stack = self._local.__dict__.setdefault('stack', [])
+        stack.append(0.0)  # time spent in nested first-time imports
+        start = self._clock()
+        try:
+            return original(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = self._clock() - start
+            nested = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            record = self.imports.setdefault(module, [0.0, 0.0])
+            record[0] += elapsed
+            record[1] += elapsed - nested
+
+    # -- phases and routes ---------------------------------------------- #
+    @contextmanager
+    def phase(self, name: str):
+        start = self._clock()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + self._clock() - start
+
+    def time_routes(self, app):
+        """Measure `app.add_url_rule` (every @app.route goes through it)."""
+        add_url_rule = app.add_url_rule
+
+        def timed(*args, **kwargs):
+            start = self._clock()
+            try:
+                return add_url_rule(*args, **kwargs)
+            finally:
+                self.route_seconds += self._clock() - start
+                self.route_count += 1
+        app.add_url_rule = timed
+
+    # -- report --------------------------------------------------------- #
+    def report(self, **extra) -> dict:
+        imports = sorted(self.imports.items(), key=lambda item: item[1][0], reverse=True)
+        return {
+            'timestamp': time.time(),
+            'pid': os.getpid(),
+            'python': platform.python_version(),
+            'total_ms': _ms(self._clock() - self.started),
+            'phases_ms': {name: _ms(seconds) for name, seconds in self.phases.items()},
+            'routes': {'count': self.route_count, 'register_ms': _ms(self.route_seconds)},
+            'imports': [{'module': module, 'cumulative_ms': _ms(cumulative), 'self_ms': _ms(own)}
+                        for module, (cumulative, own) in imports],
+            **extra,
+        }
+
+    def write(self, path: str, **extra) -> dict:
+        data = self.report(**extra)
+        with open(path, 'a') as f:
+            f.write(json.dumps(data, sort_keys=True) + '\n')
+        return data
+
+
+def _report_path() -> Optional[str]:
+    value = os.environ.get(ENV_VAR, '').strip()
+    if not value or value == '0':
+        return None
+    return DEFAULT_REPORT if value == '1' else value
+
+
+profiler: Optional[StartupProfiler] = None
+
+
+def start():
+    """Begin profiling this process's startup if HABITHIVE_PROFILE_STARTUP is set."""
+    global profiler
+    if profiler is None and _report_path():
+        profiler = StartupProfiler()
+        profiler.start()
+
+
+def phase(name: str):
+    return profiler.phase(name) if profiler else nullcontext()
+
+
+def time_routes(app):
+    if profiler:
+        profiler.time_routes(app)
+
+
+def finish(app, clients=()):
+    """
+    Stop measuring imports, initialize `clients` (name, LazyClient) pairs
+    under their own phases and append the report. No-op when disabled.
+    """
+    if not profiler:
+        return None
+    profiler.stop()
+    app.__dict__.pop('add_url_rule', None)  # drop the timing wrapper
+    for name, client in clients:
+        with profiler.phase(name):
+            client.get()
+    ready = {name: client.initialized for name, client in clients}
+    for _, client in clients:
+        if not client.initialized:
+            client.reset()  # no retry back-off for the first real request
+    try:
+        data = profiler.write(_report_path(), ready=ready)
+        log.info("startup took %sms, %d modules -> %s", data['total_ms'], len(data['imports']), _report_path())
+        return data
+    except Exception:
+        log.warning("could not write startup report", exc_info=True)
+        return None
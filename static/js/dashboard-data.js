@@ -1,11 +1,27 @@
 // static/js/dashboard-data.js
 import {
-  getFirestore, collection, addDoc, doc, deleteDoc, getDocs,
-  query, where, serverTimestamp, limit
+  getFirestore, collection, addDoc, getDocs,
+  query, where, serverTimestamp
 } from "https://www.gstatic.com/firebasejs/10.7.0/firebase-firestore.js";
 
 const db = getFirestore(window.firebaseAuth.app);
 
+// Canonical completion records: habit_completions/{habitID}_{YYYY-MM-DD} (see completions.py).
+// Read-only here: the server writes them together with the streak, rollups and month buckets.
+const COMPLETIONS = "habit_completions";
+
+async function setCompletion(habitId, date, completed) {
+  const res = await fetch(`/api/habits/${encodeURIComponent(habitId)}/completions/${date}`, {
+    method: completed ? "PUT" : "DELETE",
+    credentials: "same-origin",
+  });
+  if (!res.ok) {
+    const body = await res.json().catch(() => ({}));
+    throw new Error(body.error || `Failed to update completion (${res.status})`);
+  }
+  return res.json();
+}
+
 export function dayKey(d = new Date()) {
   const yyyy = d.getFullYear();
   const mm = String(d.getMonth() + 1).padStart(2, "0");
@@ -36,32 +52,35 @@ export async function listActiveHabits(uid) {
 
 // 今天完成 map（只以 userID 查，回來過濾今天）
 export async function mapTodayProgress(uid) {
-  const today = dayKey();
-  const qp = query(collection(db, "progress"), where("userID", "==", uid));
+  const qp = query(collection(db, COMPLETIONS),
+    where("userID", "==", uid), where("day", "==", dayKey()));
   const snap = await getDocs(qp);
   const m = {};
   snap.forEach(d => {
     const data = d.data();
-    if (data.date === today && data.habitId) m[data.habitId] = d.id;
+    if (data.habitID) m[data.habitID] = d.id;
   });
   return m;
 }
 
 // 最近 7 天每個 habit 的完成日集合與次數
 export async function mapProgressLast7(uid) {
-  const days = new Set(lastNDates(7));
-  const qp = query(collection(db, "progress"), where("userID", "==", uid));
+  const last7 = lastNDates(7);
+  const days = new Set(last7);
+  // range query on the indexed day key: (userID ASC, day ASC)
+  const qp = query(collection(db, COMPLETIONS),
+    where("userID", "==", uid), where("day", ">=", last7[last7.length - 1]));
   const snap = await getDocs(qp);
 
   const byHabit = {}; // { habitId: { count, days: { 'YYYY-MM-DD': true } } }
   snap.forEach(docSnap => {
     const p = docSnap.data();
-    if (!p.habitId || !p.date) return;
-    if (!days.has(p.date)) return;
-    if (!byHabit[p.habitId]) byHabit[p.habitId] = { count: 0, days: {} };
-    if (!byHabit[p.habitId].days[p.date]) {
-      byHabit[p.habitId].days[p.date] = true;
-      byHabit[p.habitId].count += 1;
+    if (!p.habitID || !p.day) return;
+    if (!days.has(p.day)) return;
+    if (!byHabit[p.habitID]) byHabit[p.habitID] = { count: 0, days: {} };
+    if (!byHabit[p.habitID].days[p.day]) {
+      byHabit[p.habitID].days[p.day] = true;
+      byHabit[p.habitID].count += 1;
     }
   });
 
@@ -77,44 +96,14 @@ export async function createHabit(uid, { title, markTodayDone }) {
     createdAt: serverTimestamp(),
   });
   if (markTodayDone) {
-    await addDoc(collection(db, "progress"), {
-      userID: uid,
-      habitId: ref.id,
-      date: dayKey(),
-      completed: true,
-      createdAt: serverTimestamp(),
-    });
+    await setCompletion(ref.id, dayKey(), true);
   }
   return ref.id;
 }
 
-// 取得某日的 progress docId（若存在）
-async function getProgressDocId(uid, habitId, date) {
-  const q1 = query(
-    collection(db, "progress"),
-    where("userID", "==", uid),
-    where("habitId", "==", habitId),
-    where("date", "==", date),
-    limit(1)
-  );
-  const s = await getDocs(q1);
-  return s.empty ? null : s.docs[0].id;
-}
-
-// 將某日設為 完成(true) / 未完成(false)（upsert）
+// 將某日設為 完成(true) / 未完成(false)（PUT / DELETE /api/habits/<id>/completions/<day>）
 export async function upsertProgress(uid, habitId, date, completed) {
-  const existingId = await getProgressDocId(uid, habitId, date);
-  if (completed) {
-    if (!existingId) {
-      await addDoc(collection(db, "progress"), {
-        userID: uid, habitId, date, completed: true, createdAt: serverTimestamp(),
-      });
-    }
-  } else {
-    if (existingId) {
-      await deleteDoc(doc(db, "progress", existingId));
-    }
-  }
+  await setCompletion(habitId, date, completed);
 }
 
 // 批次設定多天（datesToState : { 'YYYY-MM-DD': true/false })
@@ -0,0 +1,127 @@
+"""
+Server-owned habit streaks.
+
+Habit documents carry
+
+    lastCompletedDay   'YYYY-MM-DD' of the most recent completion
+    currentStreak      consecutive completed days ending at lastCompletedDay
+    longestStreak      best currentStreak ever reached
+
+`advance` / `retreat` derive the new values from the old ones in O(1) and
+are applied inside the completion transaction (see completions.py), so
+completing or undoing the latest day reads no history. A day before
+lastCompletedDay can join or split runs the stored fields know nothing
+about, so for those edits (`backdated`) the transaction reads the habit's
+completed days and `rebuild` recomputes the fields. `current` applies the
+"broken if neither today nor yesterday was completed" rule at read time,
+so nothing has to run at midnight. `from_days` recomputes all three from
+full history, for `rebuild` and the one-off backfill.
+"""
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, Mapping, Optional, Set
+
+FIELDS = ('lastCompletedDay', 'currentStreak', 'longestStreak')
+
+
+def parse_day(value) -> Optional[date]:
+    if not value:
+        return None
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+
+def backdated(habit: Mapping[str, Any], day) -> bool:
+    """True if `day` is before lastCompletedDay: editing it needs `rebuild`, not advance/retreat."""
+    last = parse_day(habit.get('lastCompletedDay'))
+    return last is not None and parse_day(day) < last
+
+
+def advance(habit: Mapping[str, Any], day) -> Dict[str, Any]:
+    """Fields to write when `day` is completed; {} for days not after lastCompletedDay."""
+    day = parse_day(day)
+    last = parse_day(habit.get('lastCompletedDay'))
+    current = habit.get('currentStreak') or 0
+    longest = habit.get('longestStreak') or 0
+
+    if last is not None and day <= last:
+        return {}
+    current = current + 1 if last == day - timedelta(days=1) else 1
+    return {
+        'lastCompletedDay': day.isoformat(),
+        'currentStreak': current,
+        'longestStreak': max(longest, current),
+    }
+
+
+def retreat(habit: Mapping[str, Any], day) -> Dict[str, Any]:
+    """
+    Fields to write when the completion on `day` is undone; {} unless `day`
+    is the latest completed day. longestStreak is kept as the best reached.
+    """
+    day = parse_day(day)
+    if parse_day(habit.get('lastCompletedDay')) != day:
+        return {}
+    current = max((habit.get('currentStreak') or 0) - 1, 0)
+    return {
+        'lastCompletedDay': (day - timedelta(days=1)).isoformat() if current else None,
+        'currentStreak': current,
+    }
+
+
+def reset() -> Dict[str, Any]:
+    """Fields to write when all of a habit's completions are cleared."""
+    return {'lastCompletedDay': None, 'currentStreak': 0}
+
+
+def current(habit: Mapping[str, Any], today: Optional[date] = None) -> int:
+    """The live current streak: the stored value, or 0 once a day has been missed."""
+    today = today or date.today()
+    last = parse_day(habit.get('lastCompletedDay'))
+    if last is None:
+        # Not backfilled yet: fall back to the stored value
+        return habit.get('currentStreak') or 0
+    return (habit.get('currentStreak') or 0) if last >= today - timedelta(days=1) else 0
+
+
+def longest(habit: Mapping[str, Any]) -> int:
+    return max(habit.get('longestStreak') or 0, habit.get('currentStreak') or 0)
+
+
+def from_days(days: Iterable[Any]) -> Dict[str, Any]:
+    """All three fields recomputed from a habit's completed days (any order)."""
+    ordered = sorted({parse_day(d) for d in days if d})
+    if not ordered:
+        return {'lastCompletedDay': None, 'currentStreak': 0, 'longestStreak': 0}
+
+    best = run = 1
+    for previous, day in zip(ordered, ordered[1:]):
+        run = run + 1 if day - previous == timedelta(days=1) else 1
+        best = max(best, run)
+    return {'lastCompletedDay': ordered[-1].isoformat(), 'currentStreak': run, 'longestStreak': best}
+
+
+def rebuild(habit: Mapping[str, Any], days: Iterable[Any], day, completed: bool) -> Dict[str, Any]:
+    """
+    Fields to write when a back-dated `day` is completed or cleared, given
+    the habit's completed days before the edit (at least every run touching
+    `day`). longestStreak keeps the stored value unless clearing `day` split
+    the run that set it; then it is the best run left in `days`.
+    """
+    day = parse_day(day)
+    before = {parse_day(d) for d in days if d}
+    fields = from_days(before | {day} if completed else before - {day})
+    longest = habit.get('longestStreak') or 0
+    if completed or longest > _run_length(before, day):
+        fields['longestStreak'] = max(fields['longestStreak'], longest)
+    return fields
+
+
+def _run_length(days: Set[date], day: date) -> int:
+    """Length of the run of consecutive days in `days` through `day` (0 if `day` is missing)."""
+    if day not in days:
+        return 0
+    start, end = day, day
+    while start - timedelta(days=1) in days:
+        start -= timedelta(days=1)
+    while end + timedelta(days=1) in days:
+        end += timedelta(days=1)
+    return (end - start).days + 1
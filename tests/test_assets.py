@@ -0,0 +1,72 @@
+import os
+import re
+import tempfile
+import unittest
+
+import assets
+import web_app
+
+
+class AssetManifestTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        os.makedirs(os.path.join(self.tmp.name, "css"))
+        self.css = os.path.join(self.tmp.name, "css", "style.css")
+        self._write("body { color: red; }")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _write(self, text, mtime=None):
+        with open(self.css, "w") as f:
+            f.write(text)
+        if mtime is not None:
+            os.utime(self.css, (mtime, mtime))
+
+    def test_names_are_content_addressed(self):
+        manifest = assets.AssetManifest(self.tmp.name, ["css/*.css"])
+        hashed = manifest.url_name("css/style.css")
+        self.assertRegex(hashed, r"^css/style\.[0-9a-f]{12}\.css$")
+        self.assertEqual(manifest.resolve(hashed), "css/style.css")
+        self.assertEqual(assets.logical_name(hashed), "css/style.css")
+        self.assertIsNone(manifest.url_name("css/other.css"))
+
+    def test_auto_reload_rehashes_changed_files(self):
+        manifest = assets.AssetManifest(self.tmp.name, ["css/*.css"], auto_reload=True)
+        before = manifest.url_name("css/style.css")
+        self._write("body { color: blue; }", mtime=os.path.getmtime(self.css) + 10)
+        after = manifest.url_name("css/style.css")
+        self.assertNotEqual(before, after)
+        self.assertIsNone(manifest.resolve(before))
+
+
+class HashedAssetRouteTestCase(unittest.TestCase):
+    def setUp(self):
+        self.client = web_app.app.test_client()
+
+    def test_hashed_asset_is_immutable(self):
+        with web_app.app.test_request_context():
+            url = web_app.static_url("css/style.css")
+        self.assertRegex(url, r"^/assets/css/style\.[0-9a-f]{12}\.css$")
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("immutable", response.headers["Cache-Control"])
+        self.assertIn("max-age=31536000", response.headers["Cache-Control"])
+        response.close()
+
+    def test_stale_hash_and_relative_imports_are_revalidated(self):
+        for url in ("/assets/css/style.000000000000.css", "/assets/js/dashboard-data.js"):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn("immutable", response.headers.get("Cache-Control", ""))
+            response.close()
+        self.assertEqual(self.client.get("/assets/../web_app.py").status_code, 404)
+
+    def test_pages_link_hashed_assets(self):
+        with web_app.app.test_request_context():
+            html = web_app.render_template("auth_base.html")
+        self.assertTrue(re.search(r'/assets/js/webapp\.[0-9a-f]{12}\.js', html))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+import unittest
+from datetime import date, datetime
+from unittest.mock import MagicMock, patch
+
+import completions
+from firestore_batch import BatchWriter
+
+
+def _snap(doc_id, data):
+    snap = MagicMock()
+    snap.id = doc_id
+    snap.exists = data is not None
+    snap.to_dict.return_value = data
+    return snap
+
+
+@patch("completions.STORAGE", completions.STORAGE_MONTHLY)
+class MonthlyBucketTestCase(unittest.TestCase):
+    def _db(self, bucket=None):
+        db = MagicMock()
+        db.collection.return_value.document.return_value.get.return_value = _snap("b", bucket)
+        return db
+
+    def test_mask_helpers(self):
+        self.assertEqual(completions.day_bit(date(2025, 1, 1)), 1)
+        self.assertEqual(completions.day_bit(date(2025, 1, 31)), 1 << 30)
+        self.assertEqual(completions.mask_days("2025-02", 0b101), ["2025-02-01", "2025-02-03"])
+
+    def test_record_sets_bit_once_with_increment(self):
+        db = self._db()
+        result = completions.record_completion(db, "u1", "h1", date(2025, 1, 5), datetime(2025, 1, 5, 8))
+        self.assertEqual(result["id"], "h1_2025-01")
+        db.collection.assert_any_call(completions.MONTHLY_COLLECTION)
+
+        tx = db.transaction.return_value
+        bucket = tx.set.call_args_list[0]
+        self.assertEqual(bucket.args[1]["mask"].value, 1 << 4)
+        self.assertEqual(bucket.args[1]["meta"], {"05": {"completedDate": datetime(2025, 1, 5, 8)}})
+        self.assertTrue(bucket.kwargs["merge"])
+        self.assertEqual(tx.set.call_count, 4)  # bucket + day/week/month rollups
+
+        # already done that day: metadata refreshed, mask and rollups untouched
+        db = self._db({"mask": 1 << 4})
+        completions.record_completion(db, "u1", "h1", date(2025, 1, 5))
+        tx = db.transaction.return_value
+        self.assertNotIn("mask", tx.set.call_args.args[1])
+        self.assertEqual(tx.set.call_count, 1)
+
+    def test_remove_clears_bit_and_metadata(self):
+        db = self._db({"mask": 0b10000})
+        completions.remove_completion(db, "h1", date(2025, 1, 5), habit_fields={"status": "x"})
+        tx = db.transaction.return_value
+        ref, data = tx.update.call_args_list[0].args
+        self.assertEqual(data["mask"].value, -(1 << 4))
+        self.assertIs(data["meta.`05`"], completions.firestore.DELETE_FIELD)
+        self.assertEqual(tx.update.call_args_list[1].args[1], {"status": "x"})
+
+    def test_is_completed_reads_one_bucket(self):
+        self.assertTrue(completions.is_completed(self._db({"mask": 0b10}), "h1", date(2025, 3, 2)))
+        self.assertFalse(completions.is_completed(self._db({"mask": 0b10}), "h1", date(2025, 3, 3)))
+        self.assertFalse(completions.is_completed(self._db(), "h1", date(2025, 3, 2)))
+
+    def test_range_reads_decode_masks(self):
+        db = MagicMock()
+        query = db.collection.return_value.where.return_value
+        query.where.return_value = query
+        query.stream.return_value = [
+            _snap("h1_2025-01", {"habitID": "h1", "month": "2025-01", "mask": (1 << 30) | 1,
+                                 "meta": {"31": {"completedDate": datetime(2025, 1, 31, 9)}}}),
+            _snap("h1_2025-02", {"habitID": "h1", "month": "2025-02", "mask": 0b11}),
+        ]
+
+        days = completions.completion_days(db, ["h1"], date(2025, 1, 15), date(2025, 2, 1))
+        self.assertEqual(days, {"h1": {"2025-01-31", "2025-02-01"}})
+        query.where.assert_any_call("month", ">=", "2025-01")
+
+        times = completions.completion_times(db, ["h1"], datetime(2025, 1, 20))
+        self.assertEqual(times["h1"], [datetime(2025, 1, 31, 9), datetime(2025, 2, 1), datetime(2025, 2, 2)])
+
+    def test_clear_deletes_month_documents(self):
+        db = MagicMock()
+        months = [_snap(f"h1_2025-{m:02d}", {}) for m in range(1, 13)]
+        db.collection.return_value.where.return_value.stream.return_value = months
+        writer = BatchWriter(db)
+
+        self.assertEqual(completions.clear_completions(db, ["h1"], writer), 12)
+        db.collection.assert_called_with(completions.MONTHLY_COLLECTION)
+        writer.commit()
+        self.assertEqual(db.batch.return_value.delete.call_count, 12)
+
+
+class PackMonthsMigrationTestCase(unittest.TestCase):
+    def test_packs_daily_records_into_buckets(self):
+        daily = [
+            _snap("h1_2025-01-01", {"habitID": "h1", "userID": "u1", "day": "2025-01-01"}),
+            _snap("h1_2025-01-03", {"habitID": "h1", "userID": "u1", "day": "2025-01-03"}),
+            _snap("h1_2025-02-10", {"habitID": "h1", "userID": "u1", "day": "2025-02-10"}),
+        ]
+        db = MagicMock()
+        cols = {}
+
+        def collection(name):
+            col = cols.setdefault(name, MagicMock())
+            col.document.side_effect = lambda doc_id: f"{name}/{doc_id}"
+            if name == "habits":
+                col.order_by.return_value.limit.return_value.stream.return_value = [_snap("h1", {})]
+                col.order_by.return_value.limit.return_value.start_after.return_value.stream.return_value = []
+            elif name == completions.COLLECTION:
+                col.where.return_value.stream.return_value = daily
+            else:
+                col.where.return_value.stream.return_value = []
+            return col
+
+        db.collection.side_effect = collection
+        stats = completions.migrate(db, phases=["monthly_buckets"], log=lambda *_: None)
+
+        self.assertEqual(stats, {"monthly_buckets": 1})
+        batch = db.batch.return_value
+        buckets = {c.args[0]: c.args[1] for c in batch.set.call_args_list}
+        self.assertEqual(buckets[f"{completions.MONTHLY_COLLECTION}/h1_2025-01"]["mask"], 0b101)
+        self.assertEqual(buckets[f"{completions.MONTHLY_COLLECTION}/h1_2025-02"]["mask"], 1 << 9)
+        self.assertEqual(batch.delete.call_count, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+import json
+import unittest
+from datetime import date, datetime, timezone
+from unittest.mock import MagicMock, patch
+
+import completions
+import web_app
+
+
+def _snap(doc_id, data):
+    snap = MagicMock()
+    snap.id = doc_id
+    snap.exists = data is not None
+    snap.to_dict.return_value = data
+    return snap
+
+
+class CompletionKeysTestCase(unittest.TestCase):
+    def test_day_key_normalizes_every_legacy_shape(self):
+        self.assertEqual(completions.day_key(date(2025, 3, 9)), "2025-03-09")
+        self.assertEqual(completions.day_key(datetime(2025, 3, 9, 23, 30)), "2025-03-09")
+        self.assertEqual(completions.day_key("2025-03-09T08:00:00"), "2025-03-09")
+        self.assertEqual(
+            completions.day_key(datetime(2025, 3, 10, 1, 0, tzinfo=timezone.utc).astimezone()),
+            "2025-03-10")
+        self.assertIsNone(completions.day_key("yesterday"))
+
+    def test_deterministic_id(self):
+        self.assertEqual(completions.completion_id("h1", date(2025, 1, 2)), "h1_2025-01-02")
+
+    def test_completion_days_uses_in_chunks_and_day_range(self):
+        db = MagicMock()
+        query = db.collection.return_value.where.return_value
+        query.where.return_value = query
+        query.stream.return_value = [_snap("h1_2025-01-02", {"habitID": "h1", "day": "2025-01-02"})]
+
+        ids = [f"h{i}" for i in range(31)]
+        days = completions.completion_days(db, ids, start=date(2025, 1, 1), end=date(2025, 1, 31))
+
+        self.assertEqual(days["h1"], {"2025-01-02"})
+        self.assertEqual(days["h30"], set())
+        self.assertEqual(db.collection.return_value.where.call_count, 2)
+        query.where.assert_any_call("day", ">=", "2025-01-01")
+        query.where.assert_any_call("day", "<=", "2025-01-31")
+
+
+class MigrationTestCase(unittest.TestCase):
+    def _db(self, collections):
+        """collections: name -> list of snapshots, served as a single page."""
+        db = MagicMock()
+        refs = {}
+
+        def collection(name):
+            col = MagicMock()
+            page = col.order_by.return_value.limit.return_value
+            page.stream.return_value = collections.get(name, [])
+            page.start_after.return_value.stream.return_value = []
+
+            def document(doc_id):
+                return refs.setdefault((name, doc_id), MagicMock(name=f"{name}/{doc_id}"))
+            col.document.side_effect = document
+            return col
+
+        db.collection.side_effect = collection
+        db.refs = refs
+        return db
+
+    def test_rewrites_legacy_shapes_and_checkpoints(self):
+        legacy = _snap("random-id", {"habitID": "h1", "userID": "u1", "date": "2025-01-02"})
+        canonical = _snap("h1_2025-01-03", {"habitID": "h1", "userID": "u1", "day": "2025-01-03",
+                                            "schemaVersion": completions.SCHEMA_VERSION})
+        habit = _snap("h2", {"userID": "u2", "completed_dates": ["2025-01-04", "2025-01-05"]})
+        progress = _snap("p1", {"habitId": "h3", "userID": "u3", "date": "2025-01-06", "completed": True})
+        db = self._db({"habit_completions": [legacy, canonical], "habits": [habit], "progress": [progress]})
+
+        with patch("builtins.open", unittest.mock.mock_open()), patch("os.replace"), \
+                patch("os.path.exists", return_value=False):
+            stats = completions.migrate(db, checkpoint_path="ckpt.json", log=lambda *_: None)
+
+        self.assertEqual(stats, {"habit_completions": 1, "habit_completed_dates": 1, "progress": 1,
+                                 "user_rollups": 0, "habit_streaks": 1})
+        batch = db.batch.return_value
+        written = {call.args[0] for call in batch.set.call_args_list}
+        for key in ["h1_2025-01-02", "h2_2025-01-04", "h2_2025-01-05", "h3_2025-01-06"]:
+            self.assertIn(db.refs[("habit_completions", key)], written)
+        self.assertNotIn(("habit_completions", "h1_2025-01-03"), db.refs)
+
+        deleted = [call.args[0] for call in batch.delete.call_args_list]
+        self.assertEqual(deleted, [legacy.reference, progress.reference])
+        batch.update.assert_any_call(habit.reference, {"completed_dates": completions.firestore.DELETE_FIELD})
+
+    def test_resumes_from_checkpoint(self):
+        db = self._db({"progress": [_snap("p9", {"habitId": "h", "date": "2025-01-01"})]})
+        state = {"done": ["habit_completions", "habit_completed_dates", "user_rollups", "habit_streaks"],
+                 "cursor": {"progress": "p5"}}
+
+        with patch("os.path.exists", return_value=True), \
+                patch("builtins.open", unittest.mock.mock_open(read_data=json.dumps(state))), \
+                patch("os.replace"):
+            stats = completions.migrate(db, checkpoint_path="ckpt.json", log=lambda *_: None)
+
+        self.assertEqual(list(stats), ["progress"])
+        names = [call.args[0] for call in db.collection.call_args_list]
+        self.assertNotIn("habits", names)
+
+
+class MarkCompleteWritesCanonicalRecordTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = web_app.app
+        self.app.config["TESTING"] = True
+        self.client = self.app.test_client()
+        with self.client.session_transaction() as sess:
+            sess["user_email"] = "test@example.com"
+            sess["user_uid"] = "u1"
+
+    @patch("web_app.db")
+    def test_mark_complete_sets_deterministic_completion(self, mock_db):
+        mock_db.collection.return_value.document.return_value.get.return_value = \
+            _snap("h1", {"userID": "u1", "status": "In Progress"})
+
+        resp = self.client.post("/habit/h1/complete")
+        self.assertEqual(resp.status_code, 200)
+
+        today_id = f"h1_{date.today().isoformat()}"
+        mock_db.collection.return_value.document.assert_any_call(today_id)
+        tx = mock_db.transaction.return_value
+        record = tx.set.call_args_list[0].args[1]
+        self.assertEqual((record["habitID"], record["userID"], record["day"]),
+                         ("h1", "u1", date.today().isoformat()))
+        self.assertEqual(tx.update.call_args.args[1]["status"], "Completed")
+
+
+if __name__ == "__main__":
+    unittest.main()
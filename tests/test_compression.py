@@ -0,0 +1,109 @@
+import gzip
+import unittest
+from unittest.mock import MagicMock, patch
+
+import web_app
+from compression import CompressionMiddleware
+
+BIG = b'{"habits": [' + b'{"name": "Read", "streak": 3},' * 100 + b'{}]}'
+
+
+def _app(body=BIG, headers=None, content_type="application/json", sized=True):
+    closed = []
+
+    class Body(list):
+        def close(self):
+            closed.append(True)
+
+    def app(environ, start_response):
+        h = [("Content-Type", content_type)] + list(headers or [])
+        if sized:
+            h.append(("Content-Length", str(len(body))))
+        start_response("200 OK", h)
+        if sized:
+            return Body([body])
+        return Body(body[i:i + 64] for i in range(0, len(body), 64))
+    return app, closed
+
+
+def _call(app, accept="gzip", **mw):
+    out = {}
+
+    def start_response(status, headers, exc_info=None):
+        out.update(status=status, headers=dict(headers))
+    body = b"".join(CompressionMiddleware(app, **mw)({"REQUEST_METHOD": "GET",
+                                                     "HTTP_ACCEPT_ENCODING": accept}, start_response))
+    return out["status"], out["headers"], body
+
+
+class CompressionMiddlewareTestCase(unittest.TestCase):
+    def test_gzips_json_when_accepted(self):
+        app, closed = _app()
+        status, headers, body = _call(app)
+        self.assertEqual(headers["Content-Encoding"], "gzip")
+        self.assertEqual(headers["Vary"], "Accept-Encoding")
+        self.assertEqual(int(headers["Content-Length"]), len(body))
+        self.assertEqual(gzip.decompress(body), BIG)
+        self.assertEqual(closed, [True])
+
+    def test_leaves_small_or_unaccepted_bodies_alone(self):
+        self.assertNotIn("Content-Encoding", _call(_app(b'{"ok": true}')[0])[1])
+        self.assertNotIn("Content-Encoding", _call(_app()[0], accept="identity")[1])
+        self.assertNotIn("Content-Encoding", _call(_app()[0], accept="")[1])
+
+    def test_uncompressed_text_still_varies_on_accept_encoding(self):
+        for app, accept in ((_app(b'{"ok": true}')[0], "gzip"), (_app()[0], "identity"), (_app()[0], "")):
+            self.assertEqual(_call(app, accept=accept)[1]["Vary"], "Accept-Encoding")
+        app, _ = _app(headers=[("Vary", "Cookie")])
+        self.assertEqual(_call(app, accept="")[1]["Vary"], "Cookie, Accept-Encoding")
+        self.assertNotIn("Vary", _call(_app(content_type="image/png")[0])[1])
+
+    def test_passes_through_encoded_and_binary_bodies(self):
+        app, _ = _app(headers=[("Content-Encoding", "gzip")])
+        self.assertEqual(_call(app)[2], BIG)
+        app, _ = _app(content_type="image/png")
+        self.assertEqual(_call(app)[2], BIG)
+
+    def test_streams_unsized_bodies(self):
+        app, closed = _app(sized=False)
+        status, headers, body = _call(app)
+        self.assertEqual(headers["Content-Encoding"], "gzip")
+        self.assertNotIn("Content-Length", headers)
+        self.assertEqual(gzip.decompress(body), BIG)
+        self.assertEqual(closed, [True])
+
+        small, _ = _app(b'{"ok": true}', sized=False)
+        self.assertEqual(_call(small)[2], b'{"ok": true}')
+
+    def test_strong_etag_becomes_weak(self):
+        app, _ = _app(headers=[("ETag", '"abc"')])
+        self.assertEqual(_call(app)[1]["ETag"], 'W/"abc"')
+
+
+class CompressedRevalidationTestCase(unittest.TestCase):
+    def setUp(self):
+        self.client = web_app.app.test_client()
+        with self.client.session_transaction() as sess:
+            sess["user_email"] = "alice@example.com"
+            sess["user_uid"] = "alice"
+
+    @patch("web_app.db")
+    def test_weak_etag_still_answers_304(self, mock_db):
+        snap = MagicMock(exists=True)
+        snap.to_dict.return_value = {"habits": 1}
+        mock_db.collection.return_value.document.return_value.get.return_value = snap
+        habits = [MagicMock(id=f"h{i}", **{"to_dict.return_value": {"name": f"Habit number {i}"}})
+                  for i in range(40)]
+        mock_db.collection.return_value.where.return_value.stream.return_value = habits
+
+        first = self.client.get("/api/habits", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(first.headers["Content-Encoding"], "gzip")
+        self.assertTrue(first.headers["ETag"].startswith("W/"))
+
+        again = self.client.get("/api/habits", headers={"Accept-Encoding": "gzip",
+                                                        "If-None-Match": first.headers["ETag"]})
+        self.assertEqual(again.status_code, 304)
+
+
+if __name__ == "__main__":
+    unittest.main()
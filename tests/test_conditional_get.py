@@ -0,0 +1,86 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+import versions
+import web_app
+
+
+class ConditionalGetTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = web_app.app
+        self.app.config["TESTING"] = True
+        self.client = self.app.test_client()
+        with self.client.session_transaction() as sess:
+            sess["user_email"] = "alice@example.com"
+            sess["user_uid"] = "alice"
+
+    def _stamp(self, mock_db, stamps):
+        snap = MagicMock(exists=True)
+        snap.to_dict.return_value = stamps
+        mock_db.collection.return_value.document.return_value.get.return_value = snap
+
+    @patch("web_app.db")
+    def test_habits_answer_304_without_querying(self, mock_db):
+        self._stamp(mock_db, {"habits": 3})
+        mock_db.collection.return_value.where.return_value.stream.return_value = []
+
+        first = self.client.get("/api/habits")
+        self.assertEqual(first.status_code, 200)
+        self.assertIn("private", first.headers["Cache-Control"])
+        etag = first.headers["ETag"]
+
+        mock_db.collection.return_value.where.reset_mock()
+        again = self.client.get("/api/habits", headers={"If-None-Match": etag})
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again.data, b"")
+        mock_db.collection.return_value.where.assert_not_called()
+
+        self._stamp(mock_db, {"habits": 4})  # a write elsewhere bumped the stamp
+        self.assertEqual(self.client.get("/api/habits", headers={"If-None-Match": etag}).status_code, 200)
+
+    def test_etags_are_per_user_and_per_query(self):
+        self.assertNotEqual(versions.etag("alice", "habits", 1), versions.etag("bob", "habits", 1))
+        self.assertNotEqual(versions.etag("alice", "friends", 1, "after=x"), versions.etag("alice", "friends", 1, ""))
+
+    @patch("web_app.db")
+    def test_creating_a_habit_bumps_the_stamp(self, mock_db):
+        mock_db.collection.return_value.document.return_value.id = "h1"
+        response = self.client.post("/api/habits", json={"name": "Read"})
+        self.assertEqual(response.status_code, 200)
+        stamp_ref = mock_db.collection.return_value.document.return_value
+        args, kwargs = stamp_ref.set.call_args
+        self.assertIn("habits", args[0])
+        self.assertTrue(kwargs["merge"])
+        mock_db.collection.assert_any_call(versions.COLLECTION)
+
+    @patch("web_app.leaderboard")
+    @patch("web_app.friend_graph.friend_ids", return_value=["bob"])
+    @patch("web_app.db")
+    def test_friends_etag_follows_friends_streaks(self, mock_db, friend_ids, board):
+        self._stamp(mock_db, {"friends": 7})
+        board.score.return_value = 2
+        salt = web_app.friend_streaks("alice", 7)
+        self.assertEqual(salt, web_app.friend_streaks("alice", 7))
+        friend_ids.assert_called_once()  # cached until an edge change bumps the stamp
+
+        board.score.return_value = 3  # bob completed a habit; nothing written for alice
+        self.assertNotEqual(web_app.friend_streaks("alice", 7), salt)
+        web_app.friend_streaks("alice", 8)
+        self.assertEqual(friend_ids.call_count, 2)
+
+    def test_meal_catalog_etag_needs_no_database(self):
+        with patch("web_app.db", None):
+            first = self.client.get("/api/meal-plans")
+            again = self.client.get("/api/meal-plans", headers={"If-None-Match": first.headers["ETag"]})
+        self.assertEqual(again.status_code, 304)
+
+    def test_unauthenticated_requests_are_not_cached(self):
+        with self.client.session_transaction() as sess:
+            sess.clear()
+        response = self.client.get("/api/habits")
+        self.assertEqual(response.status_code, 401)
+        self.assertNotIn("ETag", response.headers)
+
+
+if __name__ == "__main__":
+    unittest.main()
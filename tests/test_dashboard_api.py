@@ -0,0 +1,85 @@
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+import web_app
+
+
+def _doc(doc_id, data):
+    doc = MagicMock()
+    doc.id = doc_id
+    doc.to_dict.return_value = data
+    return doc
+
+
+class DashboardApiTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = web_app.app
+        self.app.config["TESTING"] = True
+        self.client = self.app.test_client()
+        with self.client.session_transaction() as sess:
+            sess["user_email"] = "test@example.com"
+            sess["user_uid"] = "dash-user"
+
+    @patch("web_app.db")
+    def test_single_call_returns_habits_progress_and_goals(self, mock_db):
+        now = datetime.now()
+        habits = [_doc(f"h{i}", {"name": f"Habit {i}", "userID": "dash-user", "createdAt": now})
+                  for i in range(35)]
+        habits[0].to_dict.return_value["status"] = "Completed"
+
+        completions_queries, range_filters = [], []
+
+        def completions_where(field, op, value):
+            completions_queries.append((field, op, list(value)))
+            query = MagicMock()
+            query.stream.return_value = [
+                _doc("c1", {"habitID": "h1", "completedDate": now}),
+                _doc("c2", {"habitID": "h1", "completedDate": now - timedelta(days=2)}),
+                _doc("c3", {"habitID": "h1", "completedDate": now - timedelta(days=30)}),
+            ] if "h1" in value else []
+
+            def range_where(field, op, value):
+                range_filters.append((field, op))
+                return query
+            query.where.side_effect = range_where
+            return query
+
+        collections = {
+            "habits": MagicMock(),
+            "habit_completions": MagicMock(),
+            "goals": MagicMock(),
+        }
+        collections["habits"].where.return_value.stream.return_value = habits
+        collections["habit_completions"].where.side_effect = completions_where
+        collections["goals"].where.return_value.stream.return_value = [
+            _doc("g1", {"title": "Run a 5k", "userID": "dash-user"})
+        ]
+        mock_db.collection.side_effect = lambda name: collections[name]
+
+        resp = self.client.get("/api/dashboard")
+        self.assertEqual(resp.status_code, 200)
+        data = resp.get_json()
+
+        self.assertEqual(len(data["habits"]), 35)
+        self.assertEqual(data["goals"][0]["id"], "g1")
+        self.assertEqual(data["progress"]["h1"]["weekly_count"], 2)
+        self.assertTrue(data["progress"]["h1"]["completed_today"])
+        self.assertEqual(data["progress"]["h0"]["weekly_count"], 7)
+        self.assertFalse(data["progress"]["h2"]["completed_today"])
+        self.assertEqual(data["summary"], {"total": 35, "completed_today": 2})
+
+        # 35 habits -> two batched 'in' queries instead of 35 per-habit queries
+        self.assertEqual([len(q[2]) for q in completions_queries], [30, 5])
+        self.assertTrue(all(q[:2] == ("habitID", "in") for q in completions_queries))
+        collections["habits"].document.assert_not_called()
+        self.assertEqual(range_filters, [("completedDate", ">=")] * 2)
+
+    def test_requires_login(self):
+        with self.client.session_transaction() as sess:
+            sess.clear()
+        self.assertEqual(self.client.get("/api/dashboard").status_code, 401)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from firebase_client import LazyClient
+
+
+class LazyClientTestCase(unittest.TestCase):
+    def test_created_on_first_use_only(self):
+        factory = MagicMock(return_value=MagicMock())
+        client = LazyClient(factory, "Firestore")
+        factory.assert_not_called()
+
+        self.assertTrue(client)
+        client.collection("habits")
+        client.collection("goals")
+        factory.assert_called_once_with()
+        factory.return_value.collection.assert_called_with("goals")
+
+    def test_failure_is_retried_after_interval(self):
+        now = [0.0]
+        factory = MagicMock(side_effect=[FileNotFoundError("firebase-credentials.json"), "client"])
+        client = LazyClient(factory, "Firestore", retry_after=30, clock=lambda: now[0])
+
+        self.assertFalse(client)
+        with self.assertRaises(RuntimeError):
+            client.collection
+        now[0] = 10
+        self.assertIsNone(client.get())  # still backing off
+        self.assertEqual(factory.call_count, 1)
+
+        now[0] = 31
+        self.assertEqual(client.get(), "client")
+        self.assertTrue(client.initialized)
+
+    def test_threads_share_one_client(self):
+        def slow():
+            time.sleep(0.05)
+            return object()
+        factory = MagicMock(side_effect=slow)
+        client = LazyClient(factory, "Firestore")
+        seen = []
+        threads = [threading.Thread(target=lambda: seen.append(client.get())) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(factory.call_count, 1)
+        self.assertEqual(len({id(c) for c in seen}), 1)
+
+
+class CreateAppTestCase(unittest.TestCase):
+    def test_factory_builds_a_new_configured_app(self):
+        import web_app
+        app = web_app.create_app({"TESTING": True, "METRICS_TOKEN": "t"})
+        self.assertIsNot(app, web_app.app)
+        self.assertTrue(app.config["TESTING"])
+        self.assertEqual(set(app.view_functions), set(web_app.app.view_functions))
+        self.assertEqual(app.test_client().get("/metrics", headers={"Authorization": "Bearer t"}).status_code, 200)
+        self.assertIsInstance(web_app.db, LazyClient)
+
+    def test_import_does_not_load_firestore(self):
+        code = "import sys, web_app; print(any(m.startswith('firebase_admin') for m in sys.modules))"
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.assertEqual(out.stdout.strip(), "False", out.stderr)
+
+
+if __name__ == "__main__":
+    unittest.main()
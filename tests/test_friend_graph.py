@@ -0,0 +1,216 @@
+import unittest
+from datetime import date
+from unittest.mock import MagicMock, patch
+
+import friend_graph
+import web_app
+from leaderboard import StreakLeaderboard
+
+
+def _path_db():
+    """MagicMock db whose document references are their slash-joined paths."""
+    db = MagicMock()
+
+    def collection(*parts):
+        col = MagicMock()
+        col.document.side_effect = lambda doc_id: _doc(parts + (doc_id,))
+        return col
+
+    def _doc(parts):
+        ref = MagicMock()
+        ref.path = "/".join(parts)
+        ref.collection.side_effect = lambda name: collection(*parts, name)
+        return ref
+
+    db.collection.side_effect = lambda name: collection(name)
+    return db
+
+
+def _snap(doc_id, data, exists=True):
+    snap = MagicMock()
+    snap.id, snap.exists = doc_id, exists
+    snap.to_dict.return_value = data
+    return snap
+
+
+class FriendGraphWritesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.db = _path_db()
+        self.writer = MagicMock()
+
+    def _sets(self):
+        return {c.args[0].path: c.args[1] for c in self.writer.set.call_args_list
+                if c.args[0].path.startswith("users/")}
+
+    def _stamped(self):
+        return {c.args[0].path for c in self.writer.set.call_args_list
+                if c.args[0].path.startswith("user_versions/")}
+
+    def test_send_request_writes_both_sides(self):
+        friend_graph.send_request(self.writer, self.db, "a", {"displayName": "Ann"},
+                                  "b", {"displayName": "Ben", "email": "b@x.com"})
+        sets = self._sets()
+        self.assertEqual(sets["users/a/requests/b"]["direction"], "outgoing")
+        self.assertEqual(sets["users/a/requests/b"]["displayName"], "Ben")
+        self.assertEqual(sets["users/b/requests/a"]["direction"], "incoming")
+        self.assertEqual(sets["users/b/requests/a"]["displayName"], "Ann")
+        self.assertEqual(self._stamped(), {"user_versions/a", "user_versions/b"})  # same commit
+
+    def test_accept_swaps_requests_for_friends(self):
+        friend_graph.accept(self.writer, self.db, "a", {"displayName": "Ann"}, "b", {"displayName": "Ben"})
+        deleted = {c.args[0].path for c in self.writer.delete.call_args_list}
+        self.assertEqual(deleted, {"users/a/requests/b", "users/b/requests/a"})
+        self.assertEqual(set(self._sets()), {"users/a/friends/b", "users/b/friends/a"})
+
+    def test_migrate_user_moves_arrays_once(self):
+        self.db.get_all.return_value = [
+            _snap("b", {"displayName": "Ben", "friends": ["a"]}),
+            _snap("c", {"displayName": "Cat"}),
+        ]
+        legacy = {"displayName": "Ann", "friends": ["b", "gone"],
+                  "friendRequests": {"incoming": ["c"], "outgoing": []}}
+        self.assertEqual(friend_graph.migrate_user(self.writer, self.db, "a", legacy), 2)
+
+        sets = self._sets()
+        self.assertEqual(set(sets), {"users/a/friends/b", "users/b/friends/a",
+                                     "users/a/requests/c", "users/c/requests/a"})
+        self.assertEqual(sets["users/c/requests/a"]["direction"], "outgoing")
+        updated = [c.args[0].path for c in self.writer.update.call_args_list]
+        self.assertEqual(updated, ["users/b", "users/a"])  # c has no legacy arrays to strip
+        self.assertEqual(self._stamped(), {"user_versions/a", "user_versions/b", "user_versions/c"})
+
+    def test_migrate_user_skips_migrated_accounts(self):
+        self.assertEqual(friend_graph.migrate_user(self.writer, self.db, "a", {"displayName": "Ann"}), 0)
+        self.writer.update.assert_not_called()
+
+
+class FriendsEndpointTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = web_app.app
+        self.app.config["TESTING"] = True
+        self.client = self.app.test_client()
+        with self.client.session_transaction() as sess:
+            sess["user_email"] = "alice@example.com"
+            sess["user_uid"] = "alice"
+
+    @patch("web_app.leaderboard")
+    @patch("web_app.db")
+    def test_friends_are_paged_from_subcollection(self, mock_db, board):
+        board.is_built.return_value = True
+        board.score.return_value = 4
+        user = mock_db.collection.return_value.document.return_value
+        user.get.return_value = _snap("alice", {"displayName": "Alice"})
+        sub = user.collection.return_value
+        page = sub.order_by.return_value.start_after.return_value.limit.return_value
+        page.stream.return_value = [_snap("bob", {"displayName": "Bob"}), _snap("cat", {"displayName": "Cat"})]
+
+        data = self.client.get("/api/friends?limit=1&after=amy").get_json()
+        self.assertEqual([(f["uid"], f["maxStreak"]) for f in data["friends"]], [("bob", 4)])
+        self.assertEqual(data["nextCursor"], "bob")
+        self.assertNotIn("incomingRequests", data)  # only on the first page
+        sub.order_by.return_value.start_after.assert_called_once_with({"__name__": "amy"})
+
+    @patch("web_app.leaderboard", new_callable=StreakLeaderboard)
+    @patch("web_app.db")
+    def test_friend_streaks_come_from_one_board_build(self, mock_db, board):
+        today = date.today().isoformat()
+        mock_db.collection.return_value.select.return_value.stream.return_value = [
+            _snap("h1", {"userID": "bob", "currentStreak": 5, "lastCompletedDay": today}),
+            _snap("h2", {"userID": "cat", "currentStreak": 2, "lastCompletedDay": today}),
+        ]
+        friends = [{"uid": "bob", "displayName": "Bob"}, {"uid": "cat", "displayName": "Cat"}]
+        with patch.object(friend_graph, "list_friends", return_value=(friends, None)):
+            data = self.client.get("/api/friends?after=amy").get_json()
+        self.assertEqual([(f["uid"], f["maxStreak"]) for f in data["friends"]], [("bob", 5), ("cat", 2)])
+        mock_db.collection.return_value.where.assert_not_called()  # no per-friend habits query
+
+    @patch("web_app.db", new_callable=_path_db)
+    def test_accept_is_one_transaction(self, mock_db):
+        incoming = _snap("bob", {"displayName": "Bob", "direction": "incoming"})
+        incoming.reference.path = "users/alice/requests/bob"
+        mock_db.get_all.side_effect = lambda refs, transaction=None: [incoming]
+
+        response = self.client.post("/api/friends/accept", json={"requesterUid": "bob"})
+        self.assertEqual(response.status_code, 200)
+        transaction = mock_db.transaction.return_value
+        self.assertIs(mock_db.get_all.call_args.kwargs["transaction"], transaction)
+        self.assertEqual({c.args[0].path for c in transaction.set.call_args_list},
+                         {"users/alice/friends/bob", "users/bob/friends/alice",
+                          "user_versions/alice", "user_versions/bob"})
+        self.assertEqual(transaction.delete.call_count, 2)
+        mock_db.batch.assert_not_called()
+
+    @patch("web_app.db")
+    def test_accept_without_request_is_404(self, mock_db):
+        mock_db.get_all.return_value = []
+        response = self.client.post("/api/friends/accept", json={"requesterUid": "bob"})
+        self.assertEqual(response.status_code, 404)
+        mock_db.transaction.return_value.set.assert_not_called()
+
+    def _pending(self, mock_db, direction):
+        pending = _snap("bob", {"displayName": "Bob", "direction": direction})
+        pending.reference.path = "users/alice/requests/bob"
+        mock_db.get_all.side_effect = lambda refs, transaction=None: [pending]
+
+    @patch("web_app.db", new_callable=_path_db)
+    def test_decline_and_cancel_check_the_direction(self, mock_db):
+        self._pending(mock_db, "incoming")
+        self.assertEqual(self.client.post("/api/friends/cancel", json={"targetUid": "bob"}).status_code, 409)
+        mock_db.transaction.return_value.delete.assert_not_called()
+        self.assertEqual(self.client.post("/api/friends/decline", json={"requesterUid": "bob"}).status_code, 200)
+        self.assertEqual({c.args[0].path for c in mock_db.transaction.return_value.delete.call_args_list},
+                         {"users/alice/requests/bob", "users/bob/requests/alice"})
+
+        self._pending(mock_db, "outgoing")
+        self.assertEqual(self.client.post("/api/friends/decline", json={"requesterUid": "bob"}).status_code, 409)
+        self.assertEqual(self.client.post("/api/friends/cancel", json={"targetUid": "bob"}).status_code, 200)
+
+    @patch("web_app.db")
+    def test_decline_without_request_is_404(self, mock_db):
+        mock_db.get_all.return_value = []
+        self.assertEqual(self.client.post("/api/friends/decline", json={"requesterUid": "bob"}).status_code, 404)
+        self.assertEqual(self.client.post("/api/friends/cancel", json={"targetUid": "bob"}).status_code, 404)
+
+
+class RequestFriendTestCase(unittest.TestCase):
+    def setUp(self):
+        self.db = _path_db()
+        self.docs = {
+            "users/a": _snap("a", {"displayName": "Ann"}),
+            "users/b": _snap("b", {"displayName": "Ben"}),
+        }
+        self.db.get_all.side_effect = lambda refs, transaction=None: [
+            self._with_ref(ref) for ref in refs if ref.path in self.docs]
+        self.transaction = self.db.transaction.return_value
+
+    def _with_ref(self, ref):
+        snap = self.docs[ref.path]
+        snap.reference = ref
+        return snap
+
+    def _written(self):
+        return {c.args[0].path for c in self.transaction.set.call_args_list
+                if c.args[0].path.startswith("users/")}
+
+    def test_sends_request(self):
+        outcome, other = friend_graph.request_friend(self.db, "a", "b")
+        self.assertEqual((outcome, other["displayName"]), (friend_graph.SENT, "Ben"))
+        self.assertEqual(self._written(), {"users/a/requests/b", "users/b/requests/a"})
+
+    def test_mutual_request_is_accepted(self):
+        self.docs["users/a/requests/b"] = _snap("b", {"direction": "incoming"})
+        outcome, _ = friend_graph.request_friend(self.db, "a", "b")
+        self.assertEqual(outcome, friend_graph.ACCEPTED)
+        self.assertEqual(self._written(), {"users/a/friends/b", "users/b/friends/a"})
+
+    def test_preconditions_write_nothing(self):
+        self.docs["users/a/requests/b"] = _snap("b", {"direction": "outgoing"})
+        self.assertEqual(friend_graph.request_friend(self.db, "a", "b")[0], friend_graph.ALREADY_SENT)
+        self.docs["users/a/friends/b"] = _snap("b", {})
+        self.assertEqual(friend_graph.request_friend(self.db, "a", "b")[0], friend_graph.ALREADY_FRIENDS)
+        self.assertEqual(friend_graph.request_friend(self.db, "a", "nobody")[0], friend_graph.NOT_FOUND)
+        self.transaction.set.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+# tests/test_habit_completions_repo.py
+from datetime import date, timedelta
+
+import pytest
+
+from habits_repo import (
+    make_engine, init_db, add_habit, list_active,
+    record_completion, remove_completion, get_streaks, current_streak,
+    longest_streak, weekly_counts, completion_calendar
+)
+
+TODAY = date(2025, 1, 15)  # a Wednesday
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = make_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    init_db(engine)
+    add_habit(engine, {"user_id": "u1", "name": "Drink water"})
+    add_habit(engine, {"user_id": "u1", "name": "Read"})
+    return engine
+
+
+def _habit_ids(engine):
+    return [h["id"] for h in list_active(engine, "u1")]
+
+
+def _complete(engine, habit_id, *days_ago):
+    for n in days_ago:
+        record_completion(engine, "u1", habit_id, TODAY - timedelta(days=n))
+
+
+def test_record_completion_is_unique_per_day(engine):
+    hid = _habit_ids(engine)[0]
+    assert record_completion(engine, "u1", hid, TODAY) is True
+    assert record_completion(engine, "u1", hid, TODAY) is False
+
+    assert remove_completion(engine, hid, TODAY) is True
+    assert remove_completion(engine, hid, TODAY) is False
+
+
+def test_current_and_longest_streak(engine):
+    water, read = _habit_ids(engine)
+    # water: 3-day run ending yesterday, older 5-day run
+    _complete(engine, water, 1, 2, 3, 10, 11, 12, 13, 14)
+    # read: last done 3 days ago -> no current streak
+    _complete(engine, read, 3, 4)
+
+    streaks = get_streaks(engine, "u1", today=TODAY)
+    assert streaks[water] == {"current": 3, "longest": 5}
+    assert streaks[read] == {"current": 0, "longest": 2}
+
+    assert current_streak(engine, "u1", water, today=TODAY) == 3
+    assert longest_streak(engine, "u1", read) == 2
+    assert get_streaks(engine, "someone-else", today=TODAY) == {}
+
+
+def test_weekly_counts_groups_by_monday(engine):
+    water, _ = _habit_ids(engine)
+    # Mon 13th, Tue 14th, Wed 15th this week; Sun 12th last week
+    _complete(engine, water, 0, 1, 2, 3)
+
+    rows = weekly_counts(engine, "u1", weeks=2, today=TODAY)
+    assert rows == [
+        {"habit_id": water, "week_start": "2025-01-06", "count": 1},
+        {"habit_id": water, "week_start": "2025-01-13", "count": 3},
+    ]
+
+
+def test_completion_calendar_fills_missing_days(engine):
+    water, read = _habit_ids(engine)
+    _complete(engine, water, 0, 2)
+    _complete(engine, read, 0)
+
+    cal = completion_calendar(engine, "u1", days=30, today=TODAY)
+    assert len(cal) == 30
+    assert cal[0]["date"] == "2024-12-17"
+    assert cal[-1] == {"date": "2025-01-15", "done": True, "count": 2}
+    assert cal[-2] == {"date": "2025-01-14", "done": False, "count": 0}
+
+    only_read = completion_calendar(engine, "u1", days=3, habit_id=read, today=TODAY)
+    assert [d["done"] for d in only_read] == [False, False, True]
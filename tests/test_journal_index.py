@@ -0,0 +1,138 @@
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+import web_app
+from journal_index import JournalSearchIndex
+
+
+def _entry(entry_id, content, day=1):
+    return {"id": entry_id, "content": content, "createdAt": datetime(2025, 1, day)}
+
+
+class JournalSearchIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        self.index = JournalSearchIndex()
+        self.index.build("u1", [
+            _entry("a", "Went running in the park", 1),
+            _entry("b", "Running late, skipped the run. Park was closed", 2),
+            _entry("c", "Read a book about the park rangers", 3),
+        ])
+
+    def _ids(self, query, user_id="u1"):
+        return [r["id"] for r in self.index.search(user_id, query)["results"]]
+
+    def test_unbuilt_user_returns_none(self):
+        self.assertIsNone(self.index.search("nobody", "park"))
+
+    def test_terms_are_anded_and_ranked(self):
+        self.assertEqual(self._ids("park run"), ["b", "a"])
+        self.assertEqual(self._ids("book park"), ["c"])
+
+    def test_prefix_and_phrase_queries(self):
+        self.assertEqual(sorted(self._ids("rang")), ["c"])
+        self.assertEqual(sorted(self._ids("runn*")), ["a", "b"])
+        self.assertEqual(self._ids('"the park"'), ["c", "a"])
+        self.assertEqual(self._ids('"park was closed"'), ["b"])
+
+    def test_snippet_highlights_and_escapes(self):
+        self.index.upsert("u1", "d", "<b>bold</b> meditation")
+        result = self.index.search("u1", "meditation")["results"][0]
+        self.assertIn("<mark>meditation</mark>", result["snippet"])
+        self.assertNotIn("<b>", result["snippet"])
+
+    def test_upsert_and_remove_keep_index_current(self):
+        self.index.upsert("u1", "a", "Went swimming instead", None)
+        self.assertEqual(self._ids("swim"), ["a"])
+        self.assertEqual(sorted(self._ids("running")), ["b"])
+
+        self.index.remove("u1", "a")
+        self.assertEqual(self._ids("swim"), [])
+        self.assertEqual(self.index.search("u1", "swim")["total"], 0)
+
+    def test_upsert_ignores_users_not_built(self):
+        self.index.upsert("u2", "x", "hello")
+        self.assertFalse(self.index.has_user("u2"))
+
+    def test_writes_during_a_build_are_replayed(self):
+        self.index.start_build("u2")
+        snapshot = [_entry("x", "old snapshot entry")]   # read before the writes below
+        self.index.upsert("u2", "y", "saved while reading")
+        self.index.remove("u2", "x")
+        self.index.build("u2", snapshot)
+        self.assertEqual(self._ids("saved", "u2"), ["y"])
+        self.assertEqual(self._ids("snapshot", "u2"), [])
+
+    def test_overlapping_builds_keep_writes_until_the_last_one(self):
+        self.index.start_build("u2")
+        self.index.start_build("u2")
+        self.index.upsert("u2", "y", "mid build")
+        self.index.build("u2", [])
+        self.index.build("u2", [])  # the slower read also missed "y"
+        self.assertEqual(self._ids("mid", "u2"), ["y"])
+        self.index.build("u2", [])  # no build in flight: nothing left to replay
+        self.assertEqual(self._ids("mid", "u2"), [])
+
+    def test_cancelled_build_stops_buffering(self):
+        self.index.start_build("u2")
+        self.index.cancel_build("u2")
+        self.index.upsert("u2", "y", "hello")
+        self.index.build("u2", [])
+        self.assertEqual(self._ids("hello", "u2"), [])
+
+    def test_lru_eviction_bounds_memory(self):
+        index = JournalSearchIndex(max_tokens=8)
+        index.build("u1", [_entry("a", "one two three four")])
+        index.build("u2", [_entry("b", "five six seven eight")])
+        self.assertFalse(index.has_user("u1"))
+        self.assertTrue(index.has_user("u2"))
+
+        index = JournalSearchIndex(max_users=2)
+        index.build("u1", [])
+        index.build("u2", [])
+        index.search("u1", "x")  # touch u1 so u2 is least recently used
+        index.build("u3", [])
+        self.assertTrue(index.has_user("u1"))
+        self.assertFalse(index.has_user("u2"))
+
+
+class JournalSearchFirestoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = web_app.app
+        self.app.config["TESTING"] = True
+        self.client = self.app.test_client()
+        with self.client.session_transaction() as sess:
+            sess["user_email"] = "test@example.com"
+            sess["user_uid"] = "fs-user"
+        web_app.journal_index.drop_user("fs-user")
+
+    def tearDown(self):
+        web_app.journal_index.drop_user("fs-user")
+
+    @patch("web_app.db")
+    def test_builds_once_then_serves_from_memory(self, mock_db):
+        doc = MagicMock()
+        doc.id = "entry-1"
+        doc.to_dict.return_value = {"content": "Evening walk with the dog", "createdAt": datetime(2025, 1, 1)}
+        collection = MagicMock()
+        collection.where.return_value.stream.return_value = [doc]
+        mock_db.collection.return_value = collection
+
+        resp = self.client.get("/journal/search?q=walk")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.get_json()["results"][0]["id"], "entry-1")
+
+        resp = self.client.get("/journal/search?q=dog")
+        self.assertEqual(resp.get_json()["total"], 1)
+        self.assertEqual(collection.where.return_value.stream.call_count, 1)
+
+        # a new entry written through the journal page is searchable immediately
+        collection.document.return_value.id = "entry-2"
+        self.client.post("/journal", json={"entry": "Morning yoga"})
+        resp = self.client.get("/journal/search?q=yoga")
+        self.assertEqual([r["id"] for r in resp.get_json()["results"]], ["entry-2"])
+        self.assertEqual(collection.where.return_value.stream.call_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
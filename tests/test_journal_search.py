@@ -0,0 +1,48 @@
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+import web_app
+
+
+class JournalSearchEndpointTestCase(unittest.TestCase):
+    """Web journal entries live in Firestore, so the endpoint searches them there."""
+
+    def setUp(self):
+        self.app = web_app.app
+        self.app.config["TESTING"] = True
+        self.client = self.app.test_client()
+        with self.client.session_transaction() as sess:
+            sess["user_email"] = "test@example.com"
+            sess["user_uid"] = "u1"
+        web_app.journal_index.drop_user("u1")
+
+    def tearDown(self):
+        web_app.journal_index.drop_user("u1")
+
+    @patch("web_app.db", None)
+    def test_unavailable_without_firestore(self):
+        resp = self.client.get("/journal/search?q=run")
+        self.assertEqual(resp.status_code, 503)
+
+    @patch("web_app.db")
+    def test_returns_paginated_results(self, mock_db):
+        docs = []
+        for i in range(3):
+            doc = MagicMock()
+            doc.id = f"entry-{i}"
+            doc.to_dict.return_value = {"content": f"long run {i}", "createdAt": datetime(2025, 1, i + 1)}
+            docs.append(doc)
+        mock_db.collection.return_value.where.return_value.stream.return_value = docs
+
+        resp = self.client.get("/journal/search?q=run&per_page=2&page=2")
+        self.assertEqual(resp.status_code, 200)
+        data = resp.get_json()
+        self.assertEqual(data["total"], 3)
+        self.assertEqual(data["page"], 2)
+        self.assertEqual(len(data["results"]), 1)
+        self.assertIn("<mark>run</mark>", data["results"][0]["snippet"])
+
+
+if __name__ == "__main__":
+    unittest.main()
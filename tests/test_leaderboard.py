@@ -0,0 +1,111 @@
+import unittest
+from datetime import date
+from unittest.mock import MagicMock, patch
+
+import web_app
+from leaderboard import StreakLeaderboard
+
+TODAY = date(2025, 1, 15)
+
+
+def _habit(hid, uid, streak, last="2025-01-15"):
+    return {"id": hid, "userID": uid, "currentStreak": streak, "lastCompletedDay": last}
+
+
+class StreakLeaderboardTestCase(unittest.TestCase):
+    def setUp(self):
+        self.board = StreakLeaderboard()
+        self.board.build([
+            _habit("a1", "alice", 3), _habit("a2", "alice", 8),
+            _habit("b1", "bob", 5),
+            _habit("c1", "carol", 12, last="2025-01-10"),  # missed days: no live streak
+            _habit("d1", "dave", 1, last="2025-01-14"),
+        ], today=TODAY)
+
+    def _ranking(self, **kwargs):
+        return [(e["uid"], e["streak"]) for e in self.board.top(today=TODAY, **kwargs)["entries"]]
+
+    def test_global_top_k_with_pagination(self):
+        self.assertEqual(self._ranking(limit=2), [("alice", 8), ("bob", 5)])
+        page = self.board.top(limit=2, offset=2, today=TODAY)
+        self.assertEqual([(e["uid"], e["rank"]) for e in page["entries"]], [("dave", 3)])
+        self.assertEqual(page["total"], 3)
+
+    def test_friends_scope_includes_zero_streaks(self):
+        self.assertEqual(self._ranking(user_ids=["carol", "bob", "alice"]),
+                         [("alice", 8), ("bob", 5), ("carol", 0)])
+
+    def test_updates_move_users(self):
+        self.board.update_habit("bob", "b1", {"currentStreak": 9, "lastCompletedDay": "2025-01-15"}, today=TODAY)
+        self.assertEqual(self._ranking(limit=1), [("bob", 9)])
+
+        self.board.update_habit("alice", "a2", {"currentStreak": 0, "lastCompletedDay": None}, today=TODAY)
+        self.assertEqual(self.board.score("alice", TODAY), 3)
+
+        self.board.remove_habit("bob", "b1", today=TODAY)
+        self.assertEqual(self.board.score("bob", TODAY), 0)
+
+    def test_streaks_expire_without_writes(self):
+        tomorrow = date(2025, 1, 16)
+        # dave completed on the 14th only: gone on the 16th; the others are still live
+        ranking = [(e["uid"], e["streak"]) for e in self.board.top(today=tomorrow)["entries"]]
+        self.assertEqual(ranking, [("alice", 8), ("bob", 5)])
+
+    def test_updates_are_ignored_until_built(self):
+        board = StreakLeaderboard()
+        board.update_habit("x", "h", {"currentStreak": 4})
+        self.assertFalse(board.is_built())
+        self.assertEqual(board.score("x"), 0)
+
+
+class LeaderboardEndpointTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = web_app.app
+        self.app.config["TESTING"] = True
+        self.client = self.app.test_client()
+        with self.client.session_transaction() as sess:
+            sess["user_email"] = "alice@example.com"
+            sess["user_uid"] = "alice"
+
+    @patch("web_app.leaderboard", new_callable=StreakLeaderboard)
+    @patch("web_app.db")
+    def test_friends_board_builds_once(self, mock_db, board):
+        today = date.today().isoformat()
+        habits = []
+        for hid, data in [("a1", _habit("a1", "alice", 2, today)), ("b1", _habit("b1", "bob", 6, today)),
+                          ("z1", _habit("z1", "zed", 40, today))]:
+            doc = MagicMock()
+            doc.id = hid
+            doc.to_dict.return_value = data
+            habits.append(doc)
+        mock_db.collection.return_value.select.return_value.stream.return_value = habits
+
+        friend = MagicMock()
+        friend.id = "bob"
+        friends = mock_db.collection.return_value.document.return_value.collection.return_value
+        friends.select.return_value.stream.return_value = [friend]
+
+        def profile(uid, data):
+            snap = MagicMock()
+            snap.id, snap.exists = uid, True
+            snap.to_dict.return_value = data
+            return snap
+        mock_db.get_all.return_value = [profile("bob", {"displayName": "Bob"}),
+                                        profile("alice", {"email": "alice@example.com"})]
+
+        data = self.client.get("/api/leaderboard").get_json()
+        self.assertEqual([(e["uid"], e["streak"]) for e in data["entries"]], [("bob", 6), ("alice", 2)])
+        self.assertEqual(data["entries"][0]["displayName"], "Bob")
+        self.assertTrue(data["entries"][1]["isYou"])
+
+        data = self.client.get("/api/leaderboard?scope=global&limit=1").get_json()
+        self.assertEqual(data["entries"][0]["uid"], "zed")
+        self.assertEqual(data["total"], 3)
+        self.assertEqual(mock_db.collection.return_value.select.return_value.stream.call_count, 1)
+
+    def test_rejects_unknown_scope(self):
+        self.assertEqual(self.client.get("/api/leaderboard?scope=everyone").status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
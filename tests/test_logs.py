@@ -0,0 +1,96 @@
+import io
+import json
+import logging
+import os
+import tempfile
+import unittest
+
+from flask import Flask
+
+import logs
+
+
+class LogsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.stream = io.StringIO()
+        self.log = logs.get_logger("tests.logs")
+
+    def tearDown(self):
+        logs.configure()  # back to the defaults on stdout
+
+    def _lines(self):
+        logs.flush()  # the listener thread drains the queue before stopping
+        return [json.loads(line) for line in self.stream.getvalue().splitlines()]
+
+    def test_json_lines_with_extra_and_request_fields(self):
+        logs.configure("INFO", stream=self.stream)
+        app = Flask(__name__)
+        with app.test_request_context("/api/friends", method="GET"):
+            self.log.info("fetched %d friends", 3, extra={"uid": "alice"})
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            self.log.exception("failed")
+
+        first, second = self._lines()
+        self.assertEqual(first["msg"], "fetched 3 friends")
+        self.assertEqual(first["level"], "INFO")
+        self.assertEqual(first["logger"], "habithive.tests.logs")
+        self.assertEqual((first["uid"], first["path"], first["method"]), ("alice", "/api/friends", "GET"))
+        self.assertIn("ValueError: boom", second["exc"])
+
+    def test_disabled_debug_is_never_formatted(self):
+        logs.configure("INFO", stream=self.stream)
+
+        class Loud:
+            def __str__(self):
+                raise AssertionError("formatted a disabled debug record")
+        self.log.debug("%s", Loud())
+        self.assertEqual(self._lines(), [])
+
+    def test_routes_are_sampled_but_warnings_kept(self):
+        logs.configure("DEBUG", stream=self.stream, sample_rates={"quiet": 0.0})
+        app = Flask(__name__)
+        app.add_url_rule("/quiet", "quiet", lambda: "")
+        with app.test_request_context("/quiet"):
+            self.log.info("dropped")
+            self.log.warning("kept")
+        with app.test_request_context("/other"):
+            self.log.debug("kept too")
+        self.assertEqual([line["msg"] for line in self._lines()], ["kept", "kept too"])
+
+    @unittest.skipUnless(hasattr(os, "fork"), "needs fork()")
+    def test_forked_worker_gets_its_own_listener(self):
+        with tempfile.TemporaryFile("w+") as out:
+            logs.configure("INFO", stream=out)
+            pid = os.fork()
+            if pid == 0:  # pre-forked worker
+                try:
+                    self.log.warning("from the worker")
+                    logs.flush()
+                finally:
+                    os._exit(0)
+            os.waitpid(pid, 0)
+            self.log.warning("from the parent")
+            logs.flush()
+            out.seek(0)
+            self.assertEqual(sorted(json.loads(line)["msg"] for line in out),
+                             ["from the parent", "from the worker"])
+
+    def test_parse_sample_rates(self):
+        self.assertEqual(logs.parse_sample_rates("get_friends=0.1, search_friend = 2,bad"),
+                         {"get_friends": 0.1, "search_friend": 1.0})
+
+    def test_sampling_is_decided_once_per_request(self):
+        sampler = logs.RouteSampler({"r": 0.5}, rand=iter([0.1, 0.9]).__next__)
+        app = Flask(__name__)
+        app.add_url_rule("/r", "r", lambda: "")
+        record = logging.LogRecord("x", logging.INFO, "", 0, "m", (), None)
+        with app.test_request_context("/r"):
+            self.assertEqual([sampler.filter(record) for _ in range(3)], [True, True, True])
+        with app.test_request_context("/r"):
+            self.assertFalse(sampler.filter(record))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import gzip
+import json
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+import web_app
+from meal_catalog import MealCatalog
+
+PLANS = {
+    "vegan": {"name": "Vegan", "description": "Plants", "meals": {"monday": {"lunch": "Salad"}}},
+    "keto": {"name": "Keto", "description": "Low carb", "meals": {}},
+}
+
+
+class MealCatalogTestCase(unittest.TestCase):
+    def setUp(self):
+        self.catalog = MealCatalog(PLANS)
+
+    def test_catalog_is_frozen(self):
+        with self.assertRaises(TypeError):
+            self.catalog["vegan"]["meals"]["monday"]["lunch"] = "Steak"
+        meals = self.catalog.meals("vegan")
+        meals["monday"]["lunch"] = "Soup"  # a thawed copy
+        self.assertEqual(self.catalog["vegan"]["meals"]["monday"]["lunch"], "Salad")
+
+    def test_list_body_is_prerendered_and_compressed(self):
+        body = self.catalog.list_body
+        data = json.loads(body.identity)
+        self.assertEqual([p["type"] for p in data["plans"]], ["vegan", "keto"])
+        self.assertNotIn("meals", data["plans"][0])
+        self.assertEqual(gzip.decompress(body.encoded["gzip"]), body.identity)
+        self.assertEqual(MealCatalog(PLANS).list_body.etag, body.etag)  # stable across restarts
+
+    def test_current_plan_body_splices_user_fields(self):
+        raw = self.catalog.current_plan_body("vegan", {"status": "active", "startDate": None})
+        data = json.loads(raw)
+        self.assertTrue(data["success"] and data["hasPlan"])
+        self.assertEqual(data["plan"]["meals"], PLANS["vegan"]["meals"])
+        self.assertEqual(data["plan"]["status"], "active")
+
+
+class MealCatalogEndpointTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = web_app.app
+        self.app.config["TESTING"] = True
+        self.client = self.app.test_client()
+        with self.client.session_transaction() as sess:
+            sess["user_email"] = "alice@example.com"
+            sess["user_uid"] = "alice"
+
+    def test_meal_plans_served_from_cache(self):
+        response = self.client.get("/api/meal-plans", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertIn("max-age", response.headers["Cache-Control"])
+        self.assertEqual(response.data, web_app.catalog.list_body.encoded["gzip"])
+
+        again = self.client.get("/api/meal-plans", headers={"Accept-Encoding": "gzip",
+                                                            "If-None-Match": response.headers["ETag"]})
+        self.assertEqual(again.status_code, 304)
+
+        plain = self.client.get("/api/meal-plans", headers={"Accept-Encoding": "identity"})
+        self.assertNotIn("Content-Encoding", plain.headers)
+        self.assertTrue(plain.get_json()["success"])
+
+    @patch("web_app.db")
+    def test_current_meal_plan(self, mock_db):
+        user = MagicMock(exists=True)
+        user.to_dict.return_value = {"currentMealPlan": "vegan", "mealPlanStartDate": datetime(2025, 1, 6)}
+        mock_db.collection.return_value.document.return_value.get.return_value = user
+
+        data = self.client.get("/api/current-meal-plan").get_json()
+        self.assertEqual(data["plan"]["name"], web_app.catalog["vegan"]["name"])
+        self.assertEqual(data["plan"]["status"], "active")
+        self.assertIn("2025", data["plan"]["startDate"])
+
+
+if __name__ == "__main__":
+    unittest.main()
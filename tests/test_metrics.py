@@ -0,0 +1,99 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from flask import Flask
+
+import metrics
+import web_app
+
+
+class _Api:
+    """Stands in for the GAPIC Firestore API object of a client."""
+
+    def batch_get_documents(self, request=None, **kwargs):
+        return iter([{"found": d} for d in request["documents"]])
+
+    def commit(self, request=None, **kwargs):
+        return {"write_results": request["writes"]}
+
+    def run_query(self, request=None, **kwargs):
+        return iter([{"document": "a"}, {"document": "b"}, {"read_time": 1}])
+
+
+class HistogramTestCase(unittest.TestCase):
+    def test_buckets_and_text_format(self):
+        h = metrics.Histogram("t_seconds", "help", ("endpoint",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.7, 5.0):
+            h.observe(value, "home")
+        text = "\n".join(h.samples())
+        self.assertIn('t_seconds_bucket{endpoint="home",le="0.1"} 1', text)
+        self.assertIn('t_seconds_bucket{endpoint="home",le="1.0"} 3', text)
+        self.assertIn('t_seconds_bucket{endpoint="home",le="+Inf"} 4', text)
+        self.assertIn('t_seconds_count{endpoint="home"} 4', text)
+        self.assertEqual(h.quantile(0.5, "home"), 1.0)
+
+
+class FirestoreCountingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.add_url_rule("/n", "n_plus_one", lambda: "")
+        self.client = MagicMock()
+        self.client._firestore_api = _Api()
+        metrics.count_firestore(self.client)
+
+    def test_counts_reads_writes_deletes_and_queries_per_request(self):
+        api = self.client._firestore_api
+        with self.app.test_request_context("/n"):
+            list(api.batch_get_documents(request={"documents": ["users/a", "users/b"]}))
+            api.commit(request={"writes": [{"update": "x"}, {"delete": "users/a/friends/b"}]})
+            list(api.run_query(request={}))
+            ops = metrics.request_operations()
+        self.assertEqual(ops, {"rpc": 3, "read": 4, "write": 1, "delete": 1, "query": 1})
+        self.assertGreaterEqual(metrics.firestore_ops.value("n_plus_one", "read"), 4)
+
+    def test_operations_outside_requests_are_background(self):
+        before = metrics.firestore_ops.value(metrics.BACKGROUND, "rpc")
+        self.client._firestore_api.commit(request={"writes": []})
+        self.assertEqual(metrics.firestore_ops.value(metrics.BACKGROUND, "rpc"), before + 1)
+
+
+class MetricsEndpointTestCase(unittest.TestCase):
+    AUTH = {"Authorization": "Bearer scrape-token"}
+
+    def setUp(self):
+        self.client = web_app.app.test_client()
+        with self.client.session_transaction() as sess:
+            sess["user_email"] = "alice@example.com"
+            sess["user_uid"] = "alice"
+        patcher = patch.dict(web_app.app.config, METRICS_TOKEN="scrape-token")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_requests_are_timed_and_exposed(self):
+        self.client.get("/api/meal-plans")
+        text = self.client.get("/metrics", headers=self.AUTH).get_data(as_text=True)
+        self.assertIn("# TYPE habithive_request_duration_seconds histogram", text)
+        self.assertIn('habithive_requests_total{endpoint="get_meal_plans",method="GET",status="200"}', text)
+        self.assertIn('habithive_firestore_operations_per_request_count{endpoint="get_meal_plans",op="read"}', text)
+
+    def test_metrics_need_the_token(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 404)  # loopback is not enough
+        self.assertEqual(self.client.get("/metrics", headers={"Authorization": "Bearer nope"}).status_code, 404)
+        with patch.dict(web_app.app.config, METRICS_TOKEN=""):
+            self.assertEqual(self.client.get("/metrics", headers={"Authorization": "Bearer "}).status_code, 404)
+
+    def test_debug_routes_hides_metrics_without_the_token(self):
+        data = self.client.get("/_debug/routes").get_json()
+        self.assertIn("metrics_endpoint", data["endpoints"])
+        self.assertNotIn("metrics", data)
+
+    def test_debug_routes_lists_metrics(self):
+        self.client.get("/api/meal-plans")
+        data = self.client.get("/_debug/routes", headers=self.AUTH).get_json()
+        self.assertIn("metrics_endpoint", data["endpoints"])
+        self.assertEqual(data["metrics"]["url"], "/metrics")
+        self.assertIn("GET 200", data["metrics"]["routes"]["get_meal_plans"]["requests"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from flask import Flask
+
+import metrics
+import query_trace
+from query_trace import QueryBudgetExceeded, QueryTracer
+
+DOCS = "projects/p/databases/(default)/documents"
+
+
+class _Api:
+    def batch_get_documents(self, request=None, **kwargs):
+        return iter([])
+
+    def run_query(self, request=None, **kwargs):
+        return iter([{"document": "d"}])
+
+    def commit(self, request=None, **kwargs):
+        return {}
+
+
+def _query(uid):
+    return {"parent": f"{DOCS}/users/{uid}", "structured_query": {
+        "from": [{"collection_id": "habits"}],
+        "where": {"field_filter": {"field": {"field_path": "userID"}, "op": "EQUAL",
+                                   "value": {"string_value": uid}}}}}
+
+
+class ShapeTestCase(unittest.TestCase):
+    def test_values_and_ids_do_not_change_the_shape(self):
+        self.assertEqual(query_trace.shape("run_query", _query("a")), query_trace.shape("run_query", _query("b")))
+        self.assertEqual(query_trace.path_shape(f"{DOCS}/users/abc/friends/x"), "users/*/friends/*")
+        self.assertEqual(query_trace.shape("batch_get_documents", {"documents": [f"{DOCS}/users/a"]}), "get users/*")
+
+    def test_fields_change_the_shape(self):
+        other = _query("a")
+        other["structured_query"]["where"]["field_filter"]["field"]["field_path"] = "email"
+        self.assertNotEqual(query_trace.shape("run_query", _query("a")), query_trace.shape("run_query", other))
+
+
+class QueryTracerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config.update(QUERY_TRACE=True, QUERY_REPEAT_LIMIT=3)
+        self.app.add_url_rule("/friends", "friends", lambda: "")
+        client = MagicMock()
+        client._firestore_api = _Api()
+        metrics.count_firestore(client)
+        self.api = client._firestore_api
+        self.tracer = QueryTracer()
+        self.observers = list(metrics.observers)
+        metrics.observers[:] = [self.tracer.observe]
+
+    def tearDown(self):
+        metrics.observers[:] = self.observers
+
+    def _loop(self, n):
+        for i in range(n):
+            list(self.api.run_query(request=_query(f"friend{i}")))
+
+    def test_repeated_shape_is_flagged_with_call_site(self):
+        with self.app.test_request_context("/friends"), patch.object(query_trace.log, "warning") as warning:
+            self._loop(4)
+            trace = query_trace.request_trace()
+        self.assertEqual(len(trace), 4)
+        self.assertIn("test_query_trace.py", trace[0]["site"])
+        warning.assert_called_once()
+        self.assertIn("N+1", warning.call_args[0][0])
+
+    def test_raise_mode_stops_the_loop(self):
+        self.app.config["QUERY_TRACE_ACTION"] = "raise"
+        with self.app.test_request_context("/friends"):
+            with self.assertRaises(QueryBudgetExceeded):
+                self._loop(5)
+            self.assertEqual(len(query_trace.request_trace()), 3)
+
+    def test_budgets_per_endpoint(self):
+        self.app.config.update(QUERY_TRACE_ACTION="raise", QUERY_REPEAT_LIMIT=100,
+                               QUERY_BUDGETS={"friends": {"write": 1}, "*": {"write": 100}})
+        writes = {"writes": [{"update": {"name": f"{DOCS}/users/a"}}, {"delete": f"{DOCS}/users/b"}]}
+        with self.app.test_request_context("/friends"):
+            self.api.commit(request=writes)
+            with self.assertRaises(QueryBudgetExceeded):
+                self.api.commit(request=writes)
+
+    def test_off_by_default(self):
+        self.app.config["QUERY_TRACE"] = False
+        with self.app.test_request_context("/friends"):
+            self._loop(5)
+            self.assertEqual(query_trace.request_trace(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from flask import Flask
+
+import metrics
+from request_profiler import RequestProfiler, StackSampler
+
+SECRET = "s3cret"
+
+
+class _Api:
+    def run_query(self, request=None, **kwargs):
+        time.sleep(0.02)
+        return iter([{"document": "d"}])
+
+
+def _busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class RequestProfilerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.app = Flask(__name__)
+        self.app.config.update(PROFILER_ENABLED=True, PROFILER_SECRET=SECRET, PROFILER_INTERVAL=0.001,
+                               PROFILER_TOP=10, PROFILER_DIR=self.dir)
+        client = MagicMock()
+        client._firestore_api = _Api()
+        metrics.count_firestore(client)
+        api = client._firestore_api
+
+        def slow_view():
+            _busy(0.05)
+            list(api.run_query(request={"parent": "users"}))
+            return "done"
+
+        self.app.add_url_rule("/slow", "slow_view", slow_view)
+        RequestProfiler().install(self.app)
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_requests_are_not_profiled_without_the_secret(self):
+        self.assertEqual(self.client.get("/slow").data, b"done")
+        self.assertEqual(self.client.get("/slow", headers={"X-Profile": "wrong"}).data, b"done")
+
+    def test_profiling_requires_debug_or_enabled(self):
+        self.app.config["PROFILER_ENABLED"] = False
+        self.assertEqual(self.client.get("/slow", headers={"X-Profile": SECRET}).data, b"done")
+        self.app.debug = True
+        self.assertEqual(self.client.get("/slow", headers={"X-Profile": SECRET}).json["status"], 200)
+
+    def test_empty_secret_disables_profiling(self):
+        self.app.config["PROFILER_SECRET"] = ""
+        self.assertEqual(self.client.get("/slow", headers={"X-Profile": ""}).data, b"done")
+
+    def test_inline_report(self):
+        report = self.client.get("/slow", headers={"X-Profile": SECRET}).json
+        self.assertEqual((report["endpoint"], report["status"], report["mode"]), ("slow_view", 200, "sample"))
+        self.assertGreater(report["samples"], 0)
+        self.assertIn("_busy (tests/test_request_profiler.py:", report["collapsed"])
+        line = report["collapsed"].splitlines()[0]
+        stack, count = line.rsplit(" ", 1)
+        self.assertGreater(int(count), 0)
+        self.assertTrue(stack.startswith("slow_view "))  # cut at the view, no Flask frames above it
+        self.assertTrue(report["top"][0]["function"].startswith("slow_view "))
+        self.assertLessEqual(len(report["top"]), 10)
+        self.assertGreaterEqual(report["sample_ms"], report["interval_ms"])
+
+    def test_top_scales_samples_by_measured_time(self):
+        sampler = StackSampler(0, interval=0.001)
+        sampler.stacks.update({("view", "a"): 3, ("view", "b"): 1})
+        sampler.samples, sampler.elapsed = 4, 0.040  # starved: 10ms per sample, not 1ms
+        rows = {row["function"]: row for row in sampler.top(10)}
+        self.assertEqual((rows["view"]["total_ms"], rows["view"]["self_ms"], rows["view"]["percent"]), (40.0, 0, 100.0))
+        self.assertEqual((rows["a"]["total_ms"], rows["a"]["percent"]), (30.0, 75.0))
+
+    def test_firestore_wait_is_reported(self):
+        report = self.client.get("/slow", headers={"X-Profile": SECRET}).json
+        self.assertGreaterEqual(report["firestore"]["wait_ms"], 20)
+        self.assertEqual(report["firestore"]["operations"], {"rpc": 1, "query": 1, "read": 1})
+
+    def test_cprofile_mode(self):
+        report = self.client.get("/slow", headers={"X-Profile": SECRET, "X-Profile-Mode": "cprofile"}).json
+        self.assertEqual(report["mode"], "cprofile")
+        busy = [row for row in report["top"] if row["function"].startswith("_busy ")]
+        self.assertEqual(busy[0]["calls"], 1)
+        self.assertGreaterEqual(busy[0]["total_ms"], 50)
+
+    def test_store_keeps_the_response_and_writes_the_profile(self):
+        response = self.client.get("/slow", headers={"X-Profile": SECRET, "X-Profile-Output": "store"})
+        self.assertEqual(response.data, b"done")
+        profile_id = response.headers["X-Profile-Id"]
+        with open(os.path.join(self.dir, profile_id + ".json")) as f:
+            self.assertEqual(json.load(f)["endpoint"], "slow_view")
+        with open(os.path.join(self.dir, profile_id + ".collapsed")) as f:
+            self.assertIn("slow_view", f.read())
+
+    def test_a_failing_view_stops_the_sampler(self):
+        def broken():
+            raise ValueError("boom")
+        self.app.add_url_rule("/broken", "broken", broken)
+        with self.assertLogs(self.app.logger, "ERROR"):
+            self.client.get("/broken", headers={"X-Profile": SECRET})
+        time.sleep(0.01)
+        self.assertFalse([t for t in threading.enumerate() if t.name == "request-profiler"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+import unittest
+from datetime import date
+from unittest.mock import MagicMock, patch
+
+import completions
+import rollups
+import web_app
+from firestore_batch import BatchWriter
+
+
+def _snap(doc_id, data):
+    snap = MagicMock()
+    snap.id = doc_id
+    snap.exists = data is not None
+    snap.to_dict.return_value = data
+    return snap
+
+
+def _db():
+    db = MagicMock()
+    db.collection.side_effect = lambda name: _collection(name)
+    return db
+
+
+def _collection(name):
+    col = MagicMock()
+    col.document.side_effect = lambda doc_id: f"{name}/{doc_id}"
+    return col
+
+
+class RollupWritesTestCase(unittest.TestCase):
+    def test_increments_fan_out_to_day_week_and_month(self):
+        writes = dict(rollups.increments(_db(), "u1", {
+            ("h1", "2025-01-06"): 1, ("h2", "2025-01-06"): 1, ("h1", "2025-01-07"): 1,
+        }))
+        self.assertEqual(sorted(writes), [
+            "user_daily_stats/u1_2025-01-06", "user_daily_stats/u1_2025-01-07",
+            "user_monthly_stats/u1_2025-01", "user_weekly_stats/u1_2025-01-06",
+        ])
+        week = writes["user_weekly_stats/u1_2025-01-06"]
+        self.assertEqual(week["total"].value, 3)
+        self.assertEqual(week["habits"]["h1"].value, 2)
+        self.assertEqual(week["week"], "2025-01-06")
+
+    def test_clear_completions_decrements_rollups(self):
+        db = MagicMock()
+        db.collection.return_value.where.return_value.stream.return_value = [
+            _snap("h1_2025-01-06", {"habitID": "h1", "userID": "u1", "day": "2025-01-06"}),
+            _snap("h1_2025-01-07", {"habitID": "h1", "userID": "u1", "day": "2025-01-07"}),
+        ]
+        writer = BatchWriter(db)
+        self.assertEqual(completions.clear_completions(db, ["h1"], writer), 2)
+        writer.commit()
+
+        batch = db.batch.return_value
+        self.assertEqual(batch.delete.call_count, 2)
+        totals = sorted(c.args[1]["total"].value for c in batch.set.call_args_list)
+        self.assertEqual(totals, [-2, -2, -1, -1])  # month, week, two days
+
+    def test_clear_commits_each_chunk_with_its_own_decrements(self):
+        db = MagicMock()
+        db.collection.return_value.where.return_value.stream.return_value = [
+            _snap(f"h1_2025-01-{d:02d}", {"habitID": "h1", "userID": "u1", "day": f"2025-01-{d:02d}"})
+            for d in range(1, 11)
+        ]
+        batches = []
+        db.batch.side_effect = lambda: batches.append(MagicMock()) or batches[-1]
+        writer = BatchWriter(db, limit=20)
+
+        self.assertEqual(completions.clear_completions(db, ["h1"], writer), 10)
+        self.assertGreater(len(batches), 1)
+        for batch in batches:
+            batch.commit.assert_called_once()
+            self.assertLessEqual(len(batch.method_calls) - 1, 20)
+            days = [c for c in batch.set.call_args_list if "day" in c.args[1]]
+            self.assertEqual(len(days), batch.delete.call_count)  # one day decrement per deleted day
+
+
+class RollupReadsTestCase(unittest.TestCase):
+    def test_cover_prefers_months_then_weeks(self):
+        self.assertEqual(rollups._cover(date(2025, 1, 1), date(2025, 3, 31)), [
+            (rollups.MONTHLY, "2025-01"), (rollups.MONTHLY, "2025-02"), (rollups.MONTHLY, "2025-03"),
+        ])
+        parts = rollups._cover(date(2025, 1, 27), date(2025, 3, 9))
+        self.assertEqual([c for c, _ in parts].count(rollups.DAILY), 7)
+        self.assertIn((rollups.MONTHLY, "2025-02"), parts)
+        self.assertIn((rollups.WEEKLY, "2025-03-03"), parts)
+        self.assertEqual(len(parts), 9)
+
+    def test_range_totals_sums_one_batched_read(self):
+        db = _db()
+        db.get_all.return_value = [
+            _snap("a", {"total": 10, "habits": {"h1": 6, "h2": 4}}),
+            _snap("b", None),
+            _snap("c", {"total": 1, "habits": {"h1": 1}}),
+        ]
+        totals = rollups.range_totals(db, "u1", date(2025, 1, 1), date(2025, 12, 31))
+        self.assertEqual(totals["total"], 11)
+        self.assertEqual(totals["habits"], {"h1": 7, "h2": 4})
+        self.assertEqual(totals["reads"], 12)
+        db.get_all.assert_called_once()
+
+
+class AnalyticsSummaryEndpointTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = web_app.app
+        self.app.config["TESTING"] = True
+        self.client = self.app.test_client()
+        with self.client.session_transaction() as sess:
+            sess["user_email"] = "test@example.com"
+            sess["user_uid"] = "u1"
+
+    @patch("web_app.db")
+    def test_summary_from_rollups(self, mock_db):
+        mock_db.get_all.return_value = [_snap("m", {"total": 5, "habits": {"h1": 5}})]
+        resp = self.client.get("/api/analytics/summary?start=2025-02-01&end=2025-02-28")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.get_json()["habits"], {"h1": 5})
+        self.assertEqual(len(mock_db.get_all.call_args.args[0]), 1)
+
+    def test_rejects_bad_ranges(self):
+        self.assertEqual(self.client.get("/api/analytics/summary?start=nope").status_code, 400)
+        resp = self.client.get("/api/analytics/summary?start=2025-03-01&end=2025-02-01")
+        self.assertEqual(resp.status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
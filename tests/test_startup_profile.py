@@ -0,0 +1,78 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+from flask import Flask
+
+import startup_profile
+from firebase_client import LazyClient
+
+
+class StartupProfilerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        sys.path.insert(0, self.tmp.name)
+        for name, body in (("sp_outer", "import sp_inner\n"), ("sp_inner", "X = 1\n")):
+            with open(os.path.join(self.tmp.name, name + ".py"), "w") as f:
+                f.write(body)
+
+    def tearDown(self):
+        sys.path.remove(self.tmp.name)
+        for name in ("sp_outer", "sp_inner"):
+            sys.modules.pop(name, None)
+        self.tmp.cleanup()
+
+    def test_records_cumulative_and_self_import_time(self):
+        profiler = startup_profile.StartupProfiler()
+        profiler.start()
+        try:
+            import sp_outer  # noqa: F401
+        finally:
+            profiler.stop()
+        outer, inner = profiler.imports["sp_outer"], profiler.imports["sp_inner"]
+        self.assertGreaterEqual(outer[0], inner[0])
+        self.assertAlmostEqual(outer[1], outer[0] - inner[0], places=6)
+
+    def test_report_covers_phases_and_routes(self):
+        profiler = startup_profile.StartupProfiler()
+        app = Flask(__name__)
+        profiler.time_routes(app)
+        app.add_url_rule("/a", "a", lambda: "a")
+        app.route("/b")(lambda: "b")
+        with profiler.phase("firebase_app"):
+            pass
+
+        path = os.path.join(self.tmp.name, "boot.jsonl")
+        profiler.write(path)
+        profiler.write(path)
+        with open(path) as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual(len(lines), 2)  # appended, one line per boot
+        self.assertEqual(lines[0]["routes"]["count"], 2)
+        self.assertIn("firebase_app", lines[0]["phases_ms"])
+        self.assertIn("total_ms", lines[0])
+
+    def test_finish_initializes_clients_and_writes(self):
+        path = os.path.join(self.tmp.name, "boot.jsonl")
+        app = Flask(__name__)
+        failing = LazyClient(lambda: 1 / 0, "Firestore")
+        os.environ[startup_profile.ENV_VAR] = path
+        try:
+            startup_profile.start()
+            startup_profile.time_routes(app)
+            data = startup_profile.finish(app, clients=[("firestore_client", failing)])
+        finally:
+            del os.environ[startup_profile.ENV_VAR]
+            startup_profile.profiler = None
+        self.assertEqual(data["ready"], {"firestore_client": False})
+        self.assertNotIn("add_url_rule", app.__dict__)
+        self.assertTrue(os.path.exists(path))
+
+    def test_disabled_by_default(self):
+        self.assertIsNone(startup_profile.finish(Flask(__name__)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,165 @@
+import unittest
+from datetime import date
+from unittest.mock import MagicMock, patch
+
+import completions
+import streaks
+import web_app
+
+TODAY = date(2025, 1, 15)
+
+
+class StreakMathTestCase(unittest.TestCase):
+    def test_advance_extends_and_resets(self):
+        habit = {"lastCompletedDay": "2025-01-14", "currentStreak": 4, "longestStreak": 9}
+        self.assertEqual(streaks.advance(habit, TODAY),
+                         {"lastCompletedDay": "2025-01-15", "currentStreak": 5, "longestStreak": 9})
+        self.assertEqual(streaks.advance(habit, date(2025, 1, 20))["currentStreak"], 1)
+        self.assertEqual(streaks.advance(habit, date(2025, 1, 14)), {})  # already the latest day
+        self.assertTrue(streaks.backdated(habit, date(2025, 1, 10)))  # goes through rebuild instead
+        self.assertFalse(streaks.backdated(habit, date(2025, 1, 14)))
+
+        fresh = streaks.advance({}, TODAY)
+        self.assertEqual((fresh["currentStreak"], fresh["longestStreak"]), (1, 1))
+
+    def test_retreat_only_undoes_the_latest_day(self):
+        habit = {"lastCompletedDay": "2025-01-15", "currentStreak": 3, "longestStreak": 3}
+        self.assertEqual(streaks.retreat(habit, TODAY),
+                         {"lastCompletedDay": "2025-01-14", "currentStreak": 2})
+        self.assertEqual(streaks.retreat(habit, date(2025, 1, 13)), {})
+        single = {"lastCompletedDay": "2025-01-15", "currentStreak": 1}
+        self.assertEqual(streaks.retreat(single, TODAY), {"lastCompletedDay": None, "currentStreak": 0})
+
+    def test_current_expires_after_a_missed_day(self):
+        habit = {"lastCompletedDay": "2025-01-14", "currentStreak": 4}
+        self.assertEqual(streaks.current(habit, TODAY), 4)
+        self.assertEqual(streaks.current(habit, date(2025, 1, 16)), 0)
+        self.assertEqual(streaks.current({"currentStreak": 2}, TODAY), 2)  # not backfilled yet
+
+    def test_backdated_mark_joins_runs(self):
+        habit = {"lastCompletedDay": "2025-01-15", "currentStreak": 1, "longestStreak": 2}
+        self.assertEqual(streaks.rebuild(habit, ["2025-01-15"], date(2025, 1, 14), True),
+                         {"lastCompletedDay": "2025-01-15", "currentStreak": 2, "longestStreak": 2})
+        days = ["2025-01-12", "2025-01-13", "2025-01-15"]
+        self.assertEqual(streaks.rebuild(habit, days, date(2025, 1, 14), True)["currentStreak"], 4)
+        self.assertEqual(streaks.rebuild(habit, days, date(2025, 1, 14), True)["longestStreak"], 4)
+
+    def test_middle_day_unmark_splits_the_run(self):
+        days = [f"2025-01-{d}" for d in range(11, 16)]
+        habit = {"lastCompletedDay": "2025-01-15", "currentStreak": 5, "longestStreak": 5}
+        self.assertEqual(streaks.rebuild(habit, days, date(2025, 1, 13), False),
+                         {"lastCompletedDay": "2025-01-15", "currentStreak": 2, "longestStreak": 2})
+        habit["longestStreak"] = 9  # set by an older run: splitting this one keeps it
+        self.assertEqual(streaks.rebuild(habit, days, date(2025, 1, 13), False)["longestStreak"], 9)
+
+    def test_from_days(self):
+        days = ["2025-01-01", "2025-01-02", "2025-01-03", "2025-01-10", "2025-01-11"]
+        self.assertEqual(streaks.from_days(reversed(days)),
+                         {"lastCompletedDay": "2025-01-11", "currentStreak": 2, "longestStreak": 3})
+        self.assertEqual(streaks.from_days([])["currentStreak"], 0)
+
+
+class ServerOwnedStreakTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = web_app.app
+        self.app.config["TESTING"] = True
+        self.client = self.app.test_client()
+        with self.client.session_transaction() as sess:
+            sess["user_email"] = "test@example.com"
+            sess["user_uid"] = "u1"
+
+    def _habit(self, mock_db, data):
+        snap = MagicMock()
+        snap.exists = True
+        snap.to_dict.return_value = data
+        mock_db.collection.return_value.document.return_value.get.return_value = snap
+
+    @patch("web_app.db")
+    def test_completion_advances_streak_in_transaction(self, mock_db):
+        yesterday = date.fromordinal(date.today().toordinal() - 1).isoformat()
+        self._habit(mock_db, {"userID": "u1", "lastCompletedDay": yesterday,
+                              "currentStreak": 2, "longestStreak": 2})
+
+        resp = self.client.post("/habit/h1/complete")
+        self.assertEqual(resp.get_json()["newStreak"], 3)
+
+        habit_update = mock_db.transaction.return_value.update.call_args.args[1]
+        self.assertEqual(habit_update["currentStreak"], 3)
+        self.assertEqual(habit_update["longestStreak"], 3)
+        self.assertEqual(habit_update["status"], "Completed")
+
+    @patch("web_app.db")
+    def test_client_streak_values_are_ignored(self, mock_db):
+        self._habit(mock_db, {"userID": "u1", "currentStreak": 0})
+        with patch.object(completions, "completion_days",
+                          return_value={"h1": {date.today().isoformat()}}):
+            resp = self.client.put("/update-habit-streak/h1", json={"currentStreak": 500})
+
+        self.assertEqual(resp.get_json()["currentStreak"], 1)
+        written = mock_db.collection.return_value.document.return_value.update.call_args.args[0]
+        self.assertEqual(written["currentStreak"], 1)
+
+    @patch("web_app.db")
+    def test_other_users_habit_is_rejected(self, mock_db):
+        self._habit(mock_db, {"userID": "someone-else"})
+        resp = self.client.put("/update-habit-streak/h1", json={})
+        self.assertEqual(resp.status_code, 403)
+
+    @patch("web_app.db")
+    def test_day_completion_goes_through_the_completions_api(self, mock_db):
+        self._habit(mock_db, {"userID": "u1"})
+        yesterday = date.fromordinal(date.today().toordinal() - 1)
+        url = f"/api/habits/h1/completions/{yesterday.isoformat()}"
+        with patch.object(completions, "record_completion", return_value={"currentStreak": 1}) as record, \
+                patch.object(completions, "remove_completion", return_value={"currentStreak": 0}) as remove:
+            self.assertEqual(self.client.put(url).get_json()["newStreak"], 1)
+            self.assertEqual(self.client.delete(url).get_json()["completed"], False)
+        self.assertEqual(record.call_args.args[1:4], ("u1", "h1", yesterday))
+        self.assertEqual(remove.call_args.args[1:3], ("h1", yesterday))
+
+    def _db(self, habit, days):
+        db, collections = MagicMock(), {}
+        db.collection.side_effect = lambda name: collections.setdefault(name, MagicMock())
+        habit_snap = db.collection("habits").document.return_value.get.return_value
+        habit_snap.exists, habit_snap.to_dict.return_value = True, habit
+        done = db.collection(completions.COLLECTION)
+        done.document.return_value.get.return_value.exists = False
+        docs = [MagicMock(**{"to_dict.return_value": {"habitID": "h1", "day": d}}) for d in days]
+        done.where.return_value.where.return_value.stream.return_value = docs
+        return db
+
+    def test_backdated_completion_recomputes_from_recent_days(self):
+        today, yesterday = date.today(), date.fromordinal(date.today().toordinal() - 1)
+        db = self._db({"userID": "u1", "lastCompletedDay": today.isoformat(),
+                       "currentStreak": 1, "longestStreak": 1}, [today.isoformat()])
+        with patch.object(completions, "_monthly", return_value=False):
+            result = completions.record_completion(db, "u1", "h1", yesterday)
+        self.assertEqual((result["currentStreak"], result["longestStreak"]), (2, 2))
+        transaction = db.transaction.return_value
+        stream = db.collection(completions.COLLECTION).where.return_value.where.return_value.stream
+        self.assertIs(stream.call_args.kwargs["transaction"], transaction)  # read inside the transaction
+        habit_update = transaction.update.call_args.args[1]
+        self.assertEqual((habit_update["currentStreak"], habit_update["longestStreak"]), (2, 2))
+
+    def test_clearing_a_middle_day_shortens_the_streak(self):
+        today = date.today()
+        days = [date.fromordinal(today.toordinal() - i).isoformat() for i in range(4, -1, -1)]
+        db = self._db({"userID": "u1", "lastCompletedDay": days[-1],
+                       "currentStreak": 5, "longestStreak": 5}, days)
+        db.collection(completions.COLLECTION).document.return_value.get.return_value.exists = True
+        with patch.object(completions, "_monthly", return_value=False):
+            result = completions.remove_completion(db, "h1", days[2])
+        self.assertEqual((result["currentStreak"], result["longestStreak"]), (2, 2))
+
+    @patch("web_app.db")
+    def test_day_completion_is_limited_to_the_last_week(self, mock_db):
+        self._habit(mock_db, {"userID": "u1"})
+        old = date.fromordinal(date.today().toordinal() - 30).isoformat()
+        self.assertEqual(self.client.put(f"/api/habits/h1/completions/{old}").status_code, 400)
+        self.assertEqual(self.client.put("/api/habits/h1/completions/yesterday").status_code, 400)
+        self._habit(mock_db, {"userID": "someone-else"})
+        self.assertEqual(self.client.put(f"/api/habits/h1/completions/{date.today()}").status_code, 403)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+import user_directory
+import web_app
+from user_directory import UserDirectory
+
+
+def _user(uid, name, email):
+    return {"uid": uid, "displayName": name, "email": email}
+
+
+class UserDirectoryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = UserDirectory()
+        self.directory.build([
+            _user("u1", "Alice Smith", "alice@example.com"),
+            _user("u2", "Alan Turing", "Turing@Example.com"),
+            _user("u3", "Bob", "bob@example.com"),
+        ])
+
+    def _uids(self, prefix, **kwargs):
+        return [u["uid"] for u in self.directory.search(prefix, **kwargs)]
+
+    def test_prefix_matches_names_and_name_words(self):
+        self.assertEqual(self._uids("al"), ["u2", "u1"])
+        self.assertEqual(self._uids("smi"), ["u1"])
+        self.assertEqual(self._uids("zz"), [])
+
+    def test_emails_match_only_whole_addresses(self):
+        self.assertEqual(self._uids("turi"), ["u2"])  # the name word, not the address
+        self.assertEqual(self._uids("TURING@"), [])
+        self.assertEqual(self._uids("turing@example.co"), [])
+        self.assertEqual(self._uids(" Turing@Example.com "), ["u2"])
+        self.assertEqual(self._uids("turing@example.com", exclude=["u2"]), [])
+
+    def test_results_never_carry_emails(self):
+        for query in ("al", "bob@example.com"):
+            for user in self.directory.search(query):
+                self.assertEqual(sorted(user), ["avatar", "displayName", "uid"])
+                self.assertNotIn("@", user["avatar"])
+
+    def test_results_are_bounded_and_exclude(self):
+        self.assertEqual(len(self._uids("a", limit=1)), 1)
+        self.assertEqual(self._uids("al", exclude=["u2"]), ["u1"])
+        self.assertNotIn("keys", self.directory.search("bob")[0])
+
+    def test_upsert_replaces_old_keys(self):
+        self.directory.upsert(_user("u3", "Robert", "bob@example.com"))
+        self.assertEqual(self._uids("rob"), ["u3"])
+        self.assertEqual(self._uids("bob"), [])
+        self.assertEqual(self._uids("bob@example.com"), ["u3"])
+        self.directory.remove("u3")
+        self.assertEqual(self._uids("rob"), [])
+        self.assertEqual(self._uids("bob@example.com"), [])
+        self.assertEqual(self.directory._root.children.get("r"), None)  # branch pruned
+
+    def test_upsert_is_ignored_until_built(self):
+        directory = UserDirectory()
+        directory.upsert(_user("u1", "Alice", "alice@example.com"))
+        self.assertEqual(directory.search("al"), [])
+
+
+class EmailIndexTestCase(unittest.TestCase):
+    def test_normalize_and_index_id(self):
+        self.assertEqual(user_directory.normalize_email("  Alice@Example.COM "), "alice@example.com")
+        self.assertEqual(user_directory.index_id("a/b@x.com"), "a%2Fb@x.com")
+
+    def test_index_email_moves_entry_on_change(self):
+        db = MagicMock()
+        db.collection.return_value.document.side_effect = lambda doc_id: doc_id
+        user_directory.index_email(db, "u1", "New@x.com", previous="old@x.com")
+        batch = db.batch.return_value
+        batch.set.assert_called_once_with("new@x.com", {"uid": "u1", "email": "new@x.com"})
+        batch.delete.assert_called_once_with("old@x.com")
+        batch.commit.assert_called_once()
+
+
+class FriendSearchTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = web_app.app
+        self.app.config["TESTING"] = True
+        self.client = self.app.test_client()
+        with self.client.session_transaction() as sess:
+            sess["user_email"] = "alice@example.com"
+            sess["user_uid"] = "alice"
+
+    @patch("web_app.db")
+    def test_search_uses_email_index(self, mock_db):
+        index = MagicMock(exists=True)
+        index.to_dict.return_value = {"uid": "bob"}
+        bob = MagicMock(exists=True)
+        bob.to_dict.return_value = {"uid": "bob", "email": "Bob@Example.com", "displayName": "Bob"}
+        not_friends = MagicMock(exists=False)
+        docs = {"bob@example.com": index, "bob": bob}
+
+        def document(doc_id):
+            ref = MagicMock(get=MagicMock(return_value=docs.get(doc_id)))
+            ref.collection.return_value.document.return_value.get.return_value = not_friends
+            return ref
+        mock_db.collection.return_value.document.side_effect = document
+
+        response = self.client.post("/api/friends/search", json={"email": " BOB@example.com"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["user"]["uid"], "bob")
+        mock_db.collection.return_value.where.assert_not_called()
+
+    @patch("web_app.directory", new_callable=UserDirectory)
+    @patch("web_app.db")
+    def test_autocomplete_builds_once_and_excludes_self(self, mock_db, directory):
+        docs = []
+        for uid, data in [("alice", {"displayName": "Alice", "email": "alice@example.com"}),
+                          ("alan", {"displayName": "Alan", "email": "alan@example.com"})]:
+            doc = MagicMock(id=uid)
+            doc.to_dict.return_value = data
+            docs.append(doc)
+        mock_db.collection.return_value.select.return_value.stream.return_value = docs
+
+        data = self.client.get("/api/users/autocomplete?q=al&limit=500").get_json()
+        self.assertEqual([u["uid"] for u in data["users"]], ["alan"])
+        self.assertNotIn("email", data["users"][0])
+        self.client.get("/api/users/autocomplete?q=ala")
+        self.assertEqual(mock_db.collection.return_value.select.return_value.stream.call_count, 1)
+
+    def test_autocomplete_needs_two_characters(self):
+        data = self.client.get("/api/users/autocomplete?q=a").get_json()
+        self.assertEqual(data["users"], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+
+import web_app
+
+
+def _snap(doc_id, data):
+    snap = MagicMock()
+    snap.id = doc_id
+    snap.exists = data is not None
+    snap.to_dict.return_value = data
+    return snap
+
+
+def _doc(doc_id, data):
+    doc = MagicMock()
+    doc.id = doc_id
+    doc.to_dict.return_value = data
+    return doc
+
+
+class WeeklyProgressBatchTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = web_app.app
+        self.app.config["TESTING"] = True
+        self.client = self.app.test_client()
+        with self.client.session_transaction() as sess:
+            sess["user_email"] = "test@example.com"
+            sess["user_uid"] = "batch-user"
+
+    @patch("web_app.db")
+    def test_batch_progress_with_ownership_and_range_query(self, mock_db):
+        now = datetime.now()
+        mock_db.get_all.return_value = [
+            _snap("h1", {"userID": "batch-user", "name": "Read"}),
+            _snap("h2", {"userID": "someone-else", "name": "Run"}),
+            _snap("h3", None),
+        ]
+        completions = mock_db.collection.return_value.where.return_value.where.return_value
+        completions.stream.return_value = [
+            # aware UTC timestamps, as Firestore returns them
+            _doc("c1", {"habitID": "h1", "completedDate": now.astimezone(timezone.utc)}),
+            _doc("c2", {"habitID": "h1", "completedDate": now - timedelta(days=1)}),
+        ]
+
+        resp = self.client.get("/api/habits/weekly-progress?ids=h1,h2,h3,h1")
+        self.assertEqual(resp.status_code, 200)
+        data = resp.get_json()
+
+        self.assertEqual(list(data["progress"]), ["h1"])
+        self.assertEqual(data["progress"]["h1"]["weekly_count"], 2)
+        self.assertEqual(data["notFound"], ["h2", "h3"])
+        self.assertEqual(len(mock_db.get_all.call_args.args[0]), 3)
+
+        first = mock_db.collection.return_value.where
+        first.assert_called_once_with("habitID", "in", ["h1"])
+        field, op, since = first.return_value.where.call_args.args
+        self.assertEqual((field, op), ("completedDate", ">="))
+        self.assertLess(now - since, timedelta(days=7))
+
+    def test_rejects_missing_and_oversized_id_lists(self):
+        self.assertEqual(self.client.get("/api/habits/weekly-progress").status_code, 400)
+        ids = ",".join(f"h{i}" for i in range(web_app.WEEKLY_PROGRESS_BATCH_LIMIT + 1))
+        resp = self.client.get(f"/api/habits/weekly-progress?ids={ids}")
+        self.assertEqual(resp.status_code, 400)
+
+    def test_requires_login(self):
+        with self.client.session_transaction() as sess:
+            sess.clear()
+        resp = self.client.get("/api/habits/weekly-progress?ids=h1")
+        self.assertEqual(resp.status_code, 401)
+
+
+if __name__ == "__main__":
+    unittest.main()
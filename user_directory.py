@@ -0,0 +1,195 @@
+"""
+User lookup by email and by name prefix.
+
+    email_index/{normalized email}   {uid, email}
+
+`normalize_email` is the single definition of "the same address" (trimmed,
+lower-cased); `verify_token` keeps the index current on every login, so an
+exact friend search is one point get instead of a query over `users`.
+
+`UserDirectory` is an in-process prefix trie over lower-cased display
+names and their words, built once from the users collection and updated
+by `verify_token`. A lookup walks len(prefix) nodes and then collects at
+most `limit` users, however many accounts exist. Email addresses are not
+in the trie - walking prefixes would enumerate every address - and only
+match when the query is a whole address. Results carry uid, display name
+and avatar, never the email (as on the leaderboard, emails are only shown
+among friends).
+"""
+import threading
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Set
+from urllib.parse import quote, urlencode
+
+INDEX_COLLECTION = 'email_index'
+
+
+def normalize_email(email: Optional[str]) -> str:
+    return (email or '').strip().lower()
+
+
+def index_id(email: str) -> str:
+    """Document id for an address ('/' is not allowed in Firestore ids)."""
+    return quote(normalize_email(email), safe='@')
+
+
+def index_ref(db, email: str):
+    return db.collection(INDEX_COLLECTION).document(index_id(email))
+
+
+def lookup_uid(db, email: str) -> Optional[str]:
+    """uid registered for `email`, or None. One point read."""
+    if not normalize_email(email):
+        return None
+    snap = index_ref(db, email).get()
+    return (snap.to_dict() or {}).get('uid') if snap.exists else None
+
+
+def index_email(db, uid: str, email: str, previous: Optional[str] = None):
+    """Point `email` at `uid`, dropping the entry for `previous` if the address changed."""
+    if not normalize_email(email):
+        return
+    batch = db.batch()
+    batch.set(index_ref(db, email), {'uid': uid, 'email': normalize_email(email)})
+    if previous and normalize_email(previous) != normalize_email(email):
+        batch.delete(index_ref(db, previous))
+    batch.commit()
+
+
+def avatar_url(user: Mapping[str, Any]) -> str:
+    """Initials avatar for the display name (seeded by name, not email, so it reveals nothing more)."""
+    return 'https://api.dicebear.com/7.x/initials/svg?' + urlencode({'seed': user.get('displayName') or 'User'})
+
+
+class _Node:
+    __slots__ = ('children', 'uids')
+
+    def __init__(self):
+        self.children: Dict[str, '_Node'] = {}
+        self.uids: Set[str] = set()
+
+
+class UserDirectory:
+    """Prefix trie of user names -> uid, plus exact email lookups, with bounded results."""
+
+    def __init__(self):
+        self._root = _Node()
+        self._users: Dict[str, Dict[str, Any]] = {}   # uid -> {uid, displayName, avatar, keys, email}
+        self._by_email: Dict[str, str] = {}           # normalized email -> uid
+        self._built = False
+        self._lock = threading.RLock()
+
+    # ---------- maintenance ---------- #
+    def is_built(self) -> bool:
+        return self._built
+
+    def build(self, users: Iterable[Mapping[str, Any]]):
+        """(Re)build from user dicts carrying `uid`, `email` and `displayName`."""
+        with self._lock:
+            self._root, self._users, self._by_email = _Node(), {}, {}
+            for user in users:
+                self._put(user)
+            self._built = True
+
+    def upsert(self, user: Mapping[str, Any]):
+        """Add or refresh one user. No-op until the directory has been built."""
+        with self._lock:
+            if self._built:
+                self._put(user)
+
+    def remove(self, uid: str):
+        with self._lock:
+            entry = self._users.pop(uid, None)
+            for key in entry['keys'] if entry else ():
+                self._unlink(key, uid)
+            if entry and self._by_email.get(entry['email']) == uid:
+                del self._by_email[entry['email']]
+
+    def _put(self, user: Mapping[str, Any]):
+        uid = user.get('uid')
+        if not uid:
+            return
+        self.remove(uid)
+        keys = _keys(user)
+        for key in keys:
+            node = self._root
+            for ch in key:
+                node = node.children.setdefault(ch, _Node())
+            node.uids.add(uid)
+        email = normalize_email(user.get('email'))
+        if email:
+            self._by_email[email] = uid
+        self._users[uid] = {
+            'uid': uid,
+            'displayName': user.get('displayName') or 'User',
+            'avatar': avatar_url(user),
+            'keys': keys,
+            'email': email,
+        }
+
+    def _unlink(self, key: str, uid: str):
+        path = [self._root]
+        for ch in key:
+            node = path[-1].children.get(ch)
+            if node is None:
+                return
+            path.append(node)
+        path[-1].uids.discard(uid)
+        # prune the branch back up to the first node still in use
+        for depth in range(len(key), 0, -1):
+            node = path[depth]
+            if node.uids or node.children:
+                break
+            del path[depth - 1].children[key[depth - 1]]
+
+    # ---------- queries ---------- #
+    def search(self, prefix: str, limit: int = 10, exclude: Iterable[str] = ()) -> List[Dict[str, Any]]:
+        """
+        Up to `limit` users whose name or a name word starts with `prefix`,
+        or the one user registered under `prefix` when it is a whole email
+        address. Each result is {uid, displayName, avatar}.
+        """
+        prefix = (prefix or '').strip().lower()
+        if not prefix or limit <= 0:
+            return []
+        skip = set(exclude)
+        with self._lock:
+            if '@' in prefix:
+                uid = self._by_email.get(prefix)
+                return [self._public(uid)] if uid and uid not in skip else []
+
+            node = self._root
+            for ch in prefix:
+                node = node.children.get(ch)
+                if node is None:
+                    return []
+
+            found = []
+            stack = [node]
+            while stack and len(found) < limit:
+                node = stack.pop()
+                for uid in sorted(node.uids):
+                    if uid not in skip:
+                        skip.add(uid)
+                        found.append(uid)
+                        if len(found) == limit:
+                            break
+                # reverse so that children are visited in key order
+                stack.extend(node.children[ch] for ch in sorted(node.children, reverse=True))
+            return [self._public(uid) for uid in found]
+
+    def _public(self, uid: str) -> Dict[str, Any]:
+        entry = self._users[uid]
+        return {'uid': uid, 'displayName': entry['displayName'], 'avatar': entry['avatar']}
+
+
+def _keys(user: Mapping[str, Any]) -> Set[str]:
+    keys = set()
+    name = (user.get('displayName') or '').strip().lower()
+    if name:
+        keys.add(name)
+        keys.update(name.split())
+    return keys
+
+
+# Global instance
+user_directory = UserDirectory()
@@ -0,0 +1,40 @@
+"""
+Per-user version stamps for conditional GETs (Firestore).
+
+    user_versions/{uid}   {habits: n, goals: n, meals: n, friends: n}
+
+Write routes `bump` the scopes whose JSON they change. Read routes compare
+the client's If-None-Match with an ETag derived from the stamp - one point
+read - and answer 304 before querying or serializing anything else (see
+`conditional_get` in web_app.py).
+"""
+import hashlib
+
+from firebase_client import firestore
+
+COLLECTION = 'user_versions'
+SCOPES = ('habits', 'goals', 'meals', 'friends')
+
+
+def _ref(db, user_id: str):
+    return db.collection(COLLECTION).document(user_id)
+
+
+def bump(db, user_id: str, *scopes: str, writer=None):
+    """Advance `scopes` for one user (through `writer` if given, else directly)."""
+    data = {scope: firestore.Increment(1) for scope in scopes}
+    if writer is not None:
+        writer.set(_ref(db, user_id), data, merge=True)
+    else:
+        _ref(db, user_id).set(data, merge=True)
+
+
+def stamp(db, user_id: str, scope: str) -> int:
+    snap = _ref(db, user_id).get()
+    return int((snap.to_dict() or {}).get(scope, 0)) if snap.exists else 0
+
+
+def etag(user_id: str, scope: str, version, *salt) -> str:
+    """Opaque (unquoted) entity tag for one user's view of `scope` at `version`."""
+    raw = '|'.join(str(part) for part in (user_id, scope, version) + salt)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:24]
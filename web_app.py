@@ -1,42 +1,229 @@
 # web_app.py
-import os, json, uuid, threading, requests, firebase_admin
-from datetime import datetime, timedelta
+import startup_profile
+startup_profile.start()  # HABITHIVE_PROFILE_STARTUP=<report.jsonl> to measure boot time
+
+import os, json, uuid, threading
+import hmac
+from datetime import date, datetime, timedelta, timezone
 from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
 from werkzeug.utils import secure_filename
 
-# ---------------- Flask ---------------- #
-app = Flask(__name__)
-app.secret_key = os.environ.get('SECRET_KEY', 'your-secret-key-change-this-in-production')
+# ---------------- Configuration ---------------- #
+def default_config():
+    """Settings read from the environment; create_app(config) overrides them."""
+    return dict(
+        SECRET_KEY=os.environ.get('SECRET_KEY', 'your-secret-key-change-this-in-production'),
+        SESSION_COOKIE_NAME='habit_session',
+        SESSION_COOKIE_HTTPONLY=True,
+        SESSION_COOKIE_SAMESITE='Lax',
+        SESSION_COOKIE_SECURE=False,  # set True if you serve over HTTPS
+        COMPRESS_LEVEL=int(os.environ.get('COMPRESS_LEVEL', 6)),  # gzip 1-9
+        COMPRESS_MIN_SIZE=int(os.environ.get('COMPRESS_MIN_SIZE', 500)),  # bytes; smaller bodies go out as-is
+        LOG_LEVEL=os.environ.get('LOG_LEVEL', 'INFO'),
+        LOG_FORMAT=os.environ.get('LOG_FORMAT', 'json'),  # or 'text'
+        LOG_SAMPLE_RATES=os.environ.get('LOG_SAMPLE_RATES', ''),  # e.g. "get_friends=0.1,search_friend=0.5"
+        METRICS_TOKEN=os.environ.get('METRICS_TOKEN', ''),  # /metrics needs "Authorization: Bearer <token>"; off when unset
+        # development: trace Firestore calls per request, flag N+1 shapes and budget overruns
+        QUERY_TRACE=os.environ.get('QUERY_TRACE', os.environ.get('FLASK_DEBUG', '0')) == '1',
+        QUERY_TRACE_ACTION=os.environ.get('QUERY_TRACE_ACTION', 'log'),  # or 'raise'
+        QUERY_REPEAT_LIMIT=int(os.environ.get('QUERY_REPEAT_LIMIT', 3)),
+        QUERY_BUDGETS=json.loads(os.environ.get('QUERY_BUDGETS') or 'null'),  # {"get_friends": {"read": 60}, "*": {...}}
+        # per-request profiling (debug mode or PROFILER_ENABLED, plus an X-Profile header matching PROFILER_SECRET)
+        PROFILER_ENABLED=os.environ.get('PROFILER_ENABLED') == '1',
+        PROFILER_SECRET=os.environ.get('PROFILER_SECRET', ''),
+        PROFILER_INTERVAL=float(os.environ.get('PROFILER_INTERVAL', 0.002)),  # seconds between stack samples
+        PROFILER_TOP=int(os.environ.get('PROFILER_TOP', 30)),
+        PROFILER_DIR=os.environ.get('PROFILER_DIR', 'profiles'),  # for X-Profile-Output: store
+        FIREBASE_CREDENTIALS=os.environ.get('FIREBASE_CREDENTIALS', 'firebase-credentials.json'),  # project root
+        FIREBASE_STORAGE_BUCKET='kappa-36c9a.firebasestorage.app',
+    )
 
-app.config.update(
-    SESSION_COOKIE_NAME='habit_session',
-    SESSION_COOKIE_HTTPONLY=True,
-    SESSION_COOKIE_SAMESITE='Lax',
-    SESSION_COOKIE_SECURE=False  # set True if you serve over HTTPS
-)
+# ---------------- Routes ---------------- #
+# Collected at import and registered on every app create_app() builds, under
+# their plain endpoint names (templates, metrics labels, LOG_SAMPLE_RATES and
+# QUERY_BUDGETS all refer to those).
+ROUTES = []
+
+def route(rule, **options):
+    """Like @app.route, for the apps create_app() builds."""
+    def decorator(view):
+        ROUTES.append((rule, options.pop('endpoint', view.__name__), view, options))
+        return view
+    return decorator
+
+# ---------------- Logging ---------------- #
+# JSON lines through a background queue listener; see logs.py
+import logs
+log = logs.get_logger(__name__)
+
+import metrics
+from query_trace import query_tracer
+from request_profiler import request_profiler
+from compression import CompressionMiddleware
+
+# ---------------- Static assets ---------------- #
+# Content-hashed asset names; templates link them through static_url()
+import assets
+from flask import abort, current_app, has_app_context, send_from_directory
+
+ASSET_PATTERNS = ('js/*.js', 'css/style.css')
+ASSET_MAX_AGE = 31536000  # one year: a hashed URL never changes content
+STATIC_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+asset_manifest = assets.AssetManifest(STATIC_FOLDER, ASSET_PATTERNS,
+                                      auto_reload=os.environ.get('FLASK_DEBUG') == '1')
+
+
+def static_url(filename):
+    hashed = asset_manifest.url_name(filename)
+    if hashed is None:
+        return url_for('static', filename=filename)
+    return url_for('hashed_asset', filename=hashed)
+
+
+@route('/assets/<path:filename>')
+def hashed_asset(filename):
+    name = asset_manifest.resolve(filename)
+    if name is not None:
+        response = send_from_directory(STATIC_FOLDER, name, max_age=ASSET_MAX_AGE)
+        response.headers['Cache-Control'] = f'public, max-age={ASSET_MAX_AGE}, immutable'
+        return response
+    # an outdated hash (page rendered before a deploy) or a relative module
+    # import such as "./dashboard-data.js": serve the current file, revalidated
+    name = assets.logical_name(filename) or filename
+    if asset_manifest.url_name(name) is None:
+        abort(404)
+    return send_from_directory(STATIC_FOLDER, name)
 
 # ---------------- Firebase Admin ---------------- #
-from firebase_admin import auth, credentials, firestore, storage
+# Process-wide, created on first use (thread-safe, retried after a failure),
+# not at import: firebase_admin and google.cloud.firestore are only imported
+# by the factories below and the call sites that need them.
+from firebase_client import LazyClient, firestore, init_firebase_app
+
+def _firebase_config(key):
+    """A FIREBASE_* setting of the app being served (the module-level app outside requests)."""
+    return (current_app if has_app_context() else app).config[key]
+
+def _firestore_client():
+    from firebase_admin import firestore as admin_firestore
+    return metrics.count_firestore(admin_firestore.client(firebase_app.get()))
+
+firebase_app = LazyClient(lambda: init_firebase_app(_firebase_config('FIREBASE_CREDENTIALS'), {
+    "storageBucket": _firebase_config('FIREBASE_STORAGE_BUCKET')
+}), 'Firebase Admin SDK')
+db = LazyClient(_firestore_client, 'Firestore client')
+
 
-try:
+def create_app(config=None):
+    """
+    A new Flask app with every HabitHive route, configured from the
+    environment (default_config) and then `config`. Firebase and Firestore
+    are shared by all apps and only initialized by the first request that
+    needs them.
+    """
+    with startup_profile.phase('flask_app'):
+        app = Flask(__name__)
+    startup_profile.time_routes(app)
+    app.config.update(default_config())
+    app.config.update(config or {})
+
+    logs.configure(app.config['LOG_LEVEL'], app.config['LOG_FORMAT'],
+                   logs.parse_sample_rates(app.config['LOG_SAMPLE_RATES']))
+    # Per-endpoint latency/status and per-request Firestore operation counts; see metrics.py
+    metrics.instrument(app)
+    query_tracer.install(app)
+    request_profiler.install(app)
+    # gzip / Brotli for HTML and JSON responses
+    app.wsgi_app = CompressionMiddleware(app.wsgi_app, level=app.config['COMPRESS_LEVEL'],
+                                         min_size=app.config['COMPRESS_MIN_SIZE'])
+
+    app.add_template_global(static_url)
+    for rule, endpoint, view, options in ROUTES:
+        app.add_url_rule(rule, endpoint, view, **options)
+    return app
+
+# Canonical habit completion records: habit_completions/{habitID}_{YYYY-MM-DD}
+import completions
+import rollups
+from firestore_batch import BatchWriter
+import streaks
+from leaderboard import leaderboard
+import friend_graph
+import user_directory
+from user_directory import user_directory as directory
+import versions
+
+# ---------------- Conditional GET ---------------- #
+from functools import wraps
+
+def conditional_get(scope, daily=False, salt=None):
+    """
+    Answer GETs carrying a current If-None-Match with 304 before the view runs.
+    The ETag comes from the user's `scope` version stamp (one point read);
+    `daily` folds in today's date for payloads with live streaks, and
+    `salt(user_id, stamp)` folds in state the stamp does not cover.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            user_id = session.get('user_uid', session.get('user_email'))
+            if request.method != 'GET' or not user_id or not db:
+                return view(*args, **kwargs)
+            parts = (request.query_string.decode('utf-8'),) + ((date.today().isoformat(),) if daily else ())
+            try:
+                stamp = versions.stamp(db, user_id, scope)
+                if salt:
+                    parts += (salt(user_id, stamp),)
+            except Exception:
+                log.warning("version check failed for %s", scope, exc_info=True)
+                return view(*args, **kwargs)
+
+            tag = versions.etag(user_id, scope, stamp, *parts)
+            # weak comparison: the compression middleware marks ETags of encoded bodies weak
+            if request.if_none_match.contains_weak(tag):
+                response = current_app.response_class(status=304)
+            else:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(tag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapper
+    return decorator
+
+def touch(user_id, *scopes):
+    """Bump the user's version stamps after a write; never fails the write."""
+    if not db or not user_id:
+        return
     try:
-        firebase_admin.get_app()
-        print("Firebase Admin SDK already initialized")
-    except ValueError:
-        cred = credentials.Certificate('firebase-credentials.json')  # keep this file in project root
-        firebase_admin.initialize_app(cred, {
-            "storageBucket": "kappa-36c9a.firebasestorage.app"
-        })
-        print("Firebase Admin SDK initialized successfully")
-except Exception as e:
-    print(f"Firebase Admin SDK initialization failed: {e}")
+        versions.bump(db, user_id, *scopes)
+    except Exception:
+        log.warning("could not bump %s for %s", scopes, user_id, exc_info=True)
 
-try:
-    db = firestore.client()
-    print("Firestore client initialized successfully")
-except Exception as e:
-    print(f"Firestore initialization failed: {e}")
-    db = None
+FRIEND_IDS_CACHE_SIZE = 2048
+_friend_ids = {}  # uid -> (friends stamp, friend uids)
+_friend_ids_lock = threading.Lock()
+
+def friend_streaks(user_id, stamp):
+    """
+    ETag salt for the friends page: the friends' live streaks, read on the
+    viewer's side so a completion never writes to anyone else's stamp. Friend
+    uids are cached per `friends` stamp (every edge change bumps it) and the
+    scores come from the in-process leaderboard the view itself reads.
+    """
+    with _friend_ids_lock:
+        cached = _friend_ids.get(user_id)
+    if cached and cached[0] == stamp:
+        uids = cached[1]
+    else:
+        uids = friend_graph.friend_ids(db, user_id)
+        with _friend_ids_lock:
+            if len(_friend_ids) >= FRIEND_IDS_CACHE_SIZE:
+                _friend_ids.pop(next(iter(_friend_ids)))
+            _friend_ids[user_id] = (stamp, uids)
+    _ensure_leaderboard()
+    return ','.join(f"{uid}:{leaderboard.score(uid)}" for uid in uids)
 
 # ---------------- Helpers ---------------- #
 def require_auth():
@@ -57,7 +244,7 @@ def firestore_rest_create(collection, data):
     Returns the created doc id or None.
     """
     try:
-        with open('firebase-credentials.json', 'r') as f:
+        with open(current_app.config['FIREBASE_CREDENTIALS'], 'r') as f:
             project_id = json.load(f)['project_id']
         doc_id = str(uuid.uuid4())
         url = f"https://firestore.googleapis.com/v1/projects/{project_id}/databases/(default)/documents/{collection}/{doc_id}"
@@ -70,13 +257,14 @@ def firestore_rest_create(collection, data):
             return {'stringValue': str(v)}
 
         payload = {'fields': {k: fval(v) for k, v in data.items()}}
+        import requests
         r = requests.post(url, json=payload, timeout=5)
         if r.status_code in (200, 201):
             return doc_id
-        print("[REST create] error:", r.status_code, r.text)
+        log.warning("REST create failed: HTTP %s", r.status_code, extra={'body': r.text[:500]})
         return None
-    except Exception as e:
-        print("[REST create] exception:", e)
+    except Exception:
+        log.exception("REST create failed")
         return None
 from datetime import datetime  # you already have this, it's fine if it repeats
 
@@ -92,22 +280,22 @@ def _ts_to_iso(v):
     return str(v) if v is not None else None
 
 # ---------------- Auth pages ---------------- #
-@app.route('/login')
+@route('/login')
 def login():  # the frontend (Firebase Web) handles sign-in; we only render the page
     return render_template('login.html')
 
-@app.route('/signup')
+@route('/signup')
 def signup():  # optional
     return render_template('signup.html')
 
-@app.route('/verify-token', methods=['POST'])
+@route('/verify-token', methods=['POST'])
 def verify_token():
     """
     Called from frontend with Firebase ID token.
     On success: store user_email and user_uid in session.
     Also auto-create Firestore profile if it doesn't exist.
     """
-    print("🔐 /verify-token called")
+    from firebase_admin import auth
     try:
         data = request.get_json(silent=True) or {}
         id_token = data.get('idToken')
@@ -117,14 +305,14 @@ def verify_token():
 
         # Verify token with clock skew tolerance (10 seconds)
         # This helps with minor clock synchronization issues
-        decoded = auth.verify_id_token(id_token, clock_skew_seconds=10)
+        decoded = auth.verify_id_token(id_token, app=firebase_app.get(), clock_skew_seconds=10)
         user_email = decoded['email']
         user_uid = decoded['uid']
         
         # Store in session
         session['user_email'] = user_email
         session['user_uid'] = user_uid
-        print(f"✅ Token verified for {user_email} ({user_uid})")
+        log.info("token verified", extra={'uid': user_uid})
         
         # Create/Update Firestore user document if it doesn't exist
         try:
@@ -132,7 +320,7 @@ def verify_token():
             user_doc = user_ref.get()
             
             if not user_doc.exists:
-                print(f"📝 Creating new user document for {user_email}")
+                log.info("creating user document", extra={'uid': user_uid})
                 from datetime import datetime
                 
                 # Try to get display name from multiple sources
@@ -141,40 +329,40 @@ def verify_token():
                 # First try: from the explicit request data (most reliable)
                 if explicit_display_name and explicit_display_name.strip():
                     display_name = explicit_display_name.strip()
-                    print(f"📛 Got display name from request: {display_name}")
+                    log.debug("display name from request")
                 
                 # Second try: from the token
                 elif decoded.get('name'):
                     display_name = decoded.get('name')
-                    print(f"📛 Got display name from token: {display_name}")
+                    log.debug("display name from token")
                 
                 # Third try: get from Firebase Auth user record
                 elif not display_name:
                     try:
-                        user_record = auth.get_user(user_uid)
+                        user_record = auth.get_user(user_uid, app=firebase_app.get())
                         if user_record.display_name:
                             display_name = user_record.display_name
-                            print(f"📛 Got display name from Firebase Auth: {display_name}")
+                            log.debug("display name from Firebase Auth")
                     except Exception as e:
-                        print(f"⚠️ Could not get user record: {e}")
+                        log.warning("could not get auth user record for %s: %s", user_uid, e)
                 
                 # Fallback: use email prefix
                 if not display_name:
                     display_name = user_email.split('@')[0].title()
-                    print(f"📛 Using email prefix as display name: {display_name}")
+                    log.debug("display name from email prefix")
                 
                 user_data = {
                     'uid': user_uid,
                     'email': user_email,
                     'displayName': display_name,
-                    'friends': [],
-                    'friendRequests': {'incoming': [], 'outgoing': []},
                     'stats': {'currentStreak': 0, 'longestStreak': 0, 'totalHabitsCompleted': 0},
                     'createdAt': datetime.now(),
                     'lastLoginAt': datetime.now()
                 }
                 user_ref.set(user_data)
-                print(f"✅ Created user document for {user_email} with display name: {display_name}")
+                user_directory.index_email(db, user_uid, user_email)
+                directory.upsert(user_data)
+                log.info("created user document", extra={'uid': user_uid})
             else:
                 # Update last login time for existing users and check display name
                 from datetime import datetime
@@ -195,47 +383,59 @@ def verify_token():
                     # First try: from explicit request
                     if explicit_display_name and explicit_display_name.strip():
                         better_display_name = explicit_display_name.strip()
-                        print(f"📛 Updating display name from request: {better_display_name}")
+                        log.debug("updating display name from request")
                     
                     # Second try: from Firebase Auth user record
                     elif not better_display_name:
                         try:
-                            user_record = auth.get_user(user_uid)
+                            user_record = auth.get_user(user_uid, app=firebase_app.get())
                             if user_record.display_name and user_record.display_name != current_display_name:
                                 better_display_name = user_record.display_name
-                                print(f"📛 Updating display name from Firebase Auth: {better_display_name}")
+                                log.debug("updating display name from Firebase Auth")
                         except Exception as e:
-                            print(f"⚠️ Could not get user record for update: {e}")
+                            log.warning("could not get auth user record for %s: %s", user_uid, e)
                     
                     if better_display_name:
                         updates['displayName'] = better_display_name
                 
+                if existing_data.get('email') != user_email:
+                    updates['email'] = user_email
                 user_ref.update(updates)
-                print(f"🔄 Updated user data for {user_email}")
+                user_directory.index_email(db, user_uid, user_email, previous=existing_data.get('email'))
+                directory.upsert({**existing_data, **updates, 'uid': user_uid})
+                
+                # Friend edges carry a copy of the name and email: move legacy arrays, refresh copies
+                profile = {**existing_data, **updates}
+                _migrate_friend_graph(user_uid, profile)
+                if 'displayName' in updates or 'email' in updates:
+                    writer = BatchWriter(db)
+                    friend_graph.refresh_cards(writer, db, user_uid, profile)
+                    writer.commit()
+                log.debug("updated user document", extra={'uid': user_uid})
                 
-        except Exception as firestore_error:
-            print(f"⚠️ Could not create/update user document: {firestore_error}")
+        except Exception:
+            log.exception("could not create/update user document")
             # Don't fail the login if Firestore fails
         
         return jsonify({'success': True}), 200
 
     except Exception as e:
-        print("💥 Token verification error:", e)
+        log.warning("token verification failed: %s", e)
         return jsonify({'error': 'Invalid token'}), 401
 
 
-@app.route('/logout')
+@route('/logout')
 def logout():
     session.clear()
     flash('You have been logged out successfully', 'success')
     return redirect(url_for('login'))
 
 # ---------------- Index / Dashboard shell ---------------- #
-@app.route('/')
+@route('/')
 def index():
     return redirect(url_for('dashboard') if 'user_email' in session else url_for('login'))
 
-@app.route('/dashboard', endpoint='dashboard')
+@route('/dashboard', endpoint='dashboard')
 def dashboard():
     auth_result = require_auth()
     if not isinstance(auth_result, tuple):
@@ -247,7 +447,7 @@ def dashboard():
                            active_tab='home')
 
 # ---------------- Top Nav Pages ---------------- #
-@app.route('/create', endpoint='create_page')
+@route('/create', endpoint='create_page')
 def create_page():
     auth_result = require_auth()
     if not isinstance(auth_result, tuple):
@@ -260,7 +460,7 @@ def create_page():
 
 from datetime import date, timedelta
 
-@app.route('/analytics', endpoint='analytics_page')
+@route('/analytics', endpoint='analytics_page')
 def analytics_page():
     auth_result = require_auth()
     if not isinstance(auth_result, tuple):
@@ -285,44 +485,41 @@ def analytics_page():
             h["id"] = d.id
             habits.append(h)
 
-        # FETCH COMPLETIONS PER HABIT
+        # 30 days of per-user rollups (user_daily_stats): one query, at most
+        # 30 small documents, no matter how many habits or completions
+        daily = rollups.daily_stats(db, user_uid, today - timedelta(days=29), today)
+        last30 = list(daily)
+        week = last30[-7:]
+
         for h in habits:
             habit_id = h["id"]
-
-            completion_docs = db.collection("habit_completions") \
-                 .where("userID", "==", user_uid) \
-                 .where("habitID", "==", habit_id) \
-                 .stream()
-
-            completed_dates = {doc.to_dict().get("date") for doc in completion_docs}
+            # completed days within the 30-day window only (full history is no
+            # longer read here); analytics.html loads its calendar via /api/habits
+            completed_dates = [d for d in last30 if daily[d]["habits"].get(habit_id)]
 
             # Add to combined calendar
             all_completed_dates.update(completed_dates)
 
-            # Weekly + streak stats
-            week_data, weekly_count, streak_current, streak_longest = compute_weekly_stats(completed_dates)
-
-            # last 30 days for mini calendar (today)
-            last30 = [(today - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(29, -1, -1)]
+            # Weekly stats from the rollups; streaks are kept on the habit document
+            week_data = [{"date": d, "done": bool(daily[d]["habits"].get(habit_id))} for d in week]
 
             habit_stats[habit_id] = {
-                "completed_dates": list(completed_dates),
+                "completed_dates": completed_dates,
                 "week_data": week_data,
-                "weekly_count": weekly_count,
-                "current": streak_current,
-                "longest": streak_longest,
+                "weekly_count": sum(1 for w in week_data if w["done"]),
+                "current": streaks.current(h, today),
+                "longest": streaks.longest(h),
                 "last30": last30,
             }
 
         # Build 30-day calendar for page
-        last_30 = [(today - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(29, -1, -1)]
         last_30_days = [
-            {"date": d, "done": d in all_completed_dates}
-            for d in last_30
+            {"date": d, "done": daily[d]["total"] > 0, "count": daily[d]["total"]}
+            for d in last30
         ]
 
-    except Exception as e:
-        print("[Analytics Error]", e)
+    except Exception:
+        log.exception("analytics failed")
         # last_30_days 
 
     return render_template(
@@ -335,13 +532,49 @@ def analytics_page():
         active_tab="analytics",
     )
 
+ANALYTICS_MAX_RANGE_DAYS = 3660
+
+@route('/api/analytics/summary', methods=['GET'])
+def analytics_summary():
+    """
+    Completion totals for ?start=YYYY-MM-DD&end=YYYY-MM-DD (default: last 30 days),
+    overall and per habit, served from the monthly/weekly/daily rollups.
+    """
+    if 'user_email' not in session:
+        return jsonify({'error': 'Authentication required'}), 401
+
+    user_id = session.get('user_uid', session['user_email'])
+    try:
+        end = date.fromisoformat(request.args['end']) if request.args.get('end') else date.today()
+        start = date.fromisoformat(request.args['start']) if request.args.get('start') \
+            else end - timedelta(days=29)
+    except ValueError:
+        return jsonify({'error': 'start and end must be YYYY-MM-DD'}), 400
+    if start > end or (end - start).days > ANALYTICS_MAX_RANGE_DAYS:
+        return jsonify({'error': 'Invalid date range'}), 400
+
+    try:
+        if not db:
+            return jsonify({'error': 'Database unavailable'}), 500
+        totals = rollups.range_totals(db, user_id, start, end)
+        return jsonify({
+            'success': True,
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'total': totals['total'],
+            'habits': totals['habits'],
+        }), 200
+    except Exception:
+        log.exception("analytics summary failed")
+        return jsonify({'error': 'Failed to load analytics'}), 500
+
 
 
 # ============================================================================
 # FRIENDS FEATURE - PAGE ROUTE
 # Renders the friends management page with authentication
 # ============================================================================
-@app.route('/friends', endpoint='friends_page')
+@route('/friends', endpoint='friends_page')
 def friends_page():
     """Render the friends page - main entry point for friends feature"""
     auth_result = require_auth()
@@ -353,276 +586,129 @@ def friends_page():
                            user_uid=user_uid,
                            active_tab='friends')
 
-# -------------------------------------------------------
-# Helper Functions
-# -------------------------------------------------------
-
-def calculate_max_habit_streak(user_uid):
-    """Calculate the maximum current streak from all habits of a user"""
-    try:
-        print(f"🔥 Calculating max streak for user: {user_uid}")
-        
-        if not db:
-            print("❌ Database not initialized")
-            return 0
-        
-        # Get all habits for this user
-        habits_docs = db.collection('habits').where('userID', '==', user_uid).stream()
-        habits = []
-        for doc in habits_docs:
-            habit_data = doc.to_dict()
-            if habit_data:  # Check if data exists
-                habit_data['id'] = doc.id
-                habits.append(habit_data)
-        
-        print(f"📊 Found {len(habits)} habits for user {user_uid}")
-        
-        if not habits:
-            print(f"📭 No habits found for user {user_uid}")
-            return 0
-        
-        max_streak = 0
-        
-        for habit in habits:
-            try:
-                # Get current streak directly from habit document
-                current_streak = habit.get('currentStreak', 0)
-                habit_name = habit.get('name', 'Unknown')
-                print(f"🎯 Habit '{habit_name}': {current_streak} day streak")
-                
-                max_streak = max(max_streak, current_streak)
-                
-            except Exception as habit_error:
-                print(f"⚠️ Error processing habit {habit.get('name', 'Unknown')}: {habit_error}")
-                continue
-        
-        print(f"🏆 Max streak for user {user_uid}: {max_streak}")
-        return max_streak
-        
-    except Exception as e:
-        print(f"❌ Error calculating max streak for user {user_uid}: {e}")
-        import traceback
-        print(f"❌ Traceback: {traceback.format_exc()}")
-        return 0
-
-def calculate_current_streak(completed_dates):
-    """Calculate current streak from a list of completion dates"""
-    if not completed_dates:
-        return 0
-    
-    from datetime import datetime, timedelta
-    
-    # Sort dates in descending order (most recent first)
-    sorted_dates = sorted(set(completed_dates), reverse=True)
-    
-    today = datetime.now().date()
-    current_streak = 0
-    
-    # Check if completed today or yesterday to start counting
-    if sorted_dates[0] == today or sorted_dates[0] == (today - timedelta(days=1)):
-        current_streak = 1
-        last_date = sorted_dates[0]
-        
-        # Count consecutive days backwards
-        for i in range(1, len(sorted_dates)):
-            expected_date = last_date - timedelta(days=1)
-            if sorted_dates[i] == expected_date:
-                current_streak += 1
-                last_date = sorted_dates[i]
-            else:
-                break
-    
-    return current_streak
-
 # ============================================================================
 # FRIENDS FEATURE - API ENDPOINTS
 # Complete friends management system with streak tracking
 # ============================================================================
 
-@app.route('/api/friends', methods=['GET'])
+FRIENDS_PAGE_LIMIT = 50
+
+def _migrate_friend_graph(user_uid, user_data):
+    """Move a user's legacy friend arrays into the friend_graph subcollections."""
+    if not friend_graph.has_legacy(user_data):
+        return
+    writer = BatchWriter(db)
+    edges = friend_graph.migrate_user(writer, db, user_uid, user_data)
+    writer.commit()
+    log.info("moved %d friend edges of %s into subcollections", edges, user_uid)
+
+@route('/api/friends', methods=['GET'])
+@conditional_get('friends', daily=True, salt=friend_streaks)
 def get_friends():
-    """Get user's friends list with their stats"""
-    print("📊 GET-FRIENDS ENDPOINT CALLED")
-    print(f"📍 Session data: {dict(session)}")
+    """
+    Get user's friends list with their stats, one page at a time
+    (?limit=50&after=<cursor>). The first page also carries the pending
+    requests and the total friend count.
+    """
     
     if 'user_uid' not in session:
-        print("❌ Not authenticated - no user_uid in session")
         return jsonify({'error': 'Authentication required'}), 401
     
+    try:
+        limit = max(1, min(int(request.args.get('limit', FRIENDS_PAGE_LIMIT)), FRIENDS_PAGE_LIMIT))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    after = request.args.get('after') or None
+    
     try:
         user_uid = session['user_uid']
-        print(f"✅ User authenticated: {user_uid}")
-        
-        # Get current user's data
-        user_ref = db.collection('users').document(user_uid)
-        user_doc = user_ref.get()
-        
-        if not user_doc.exists:
-            print(f"❌ User document not found for uid: {user_uid}")
-            return jsonify({'error': 'User not found'}), 404
-        
-        user_data = user_doc.to_dict()
-        friends_list = user_data.get('friends', [])
-        print(f"📋 Friends list: {friends_list}")
-        
-        # Get friend requests data ALWAYS (even if no friends)
-        friend_requests = user_data.get('friendRequests', {})
-        incoming_requests = friend_requests.get('incoming', [])
-        outgoing_requests = friend_requests.get('outgoing', [])
         
-        print(f"📥 Incoming requests: {incoming_requests}")
-        print(f"📤 Outgoing requests: {outgoing_requests}")
-        
-        # Get friends data
-        friends_data = []
-        if friends_list:
-            print(f"👥 Processing {len(friends_list)} friends")
-        else:
-            print("📭 No friends yet")
-        
-        # Get friends' data
-        friends_data = []
-        for friend_uid in friends_list:
-            friend_ref = db.collection('users').document(friend_uid)
-            friend_doc = friend_ref.get()
+        response = {'success': True}
+        if after is None:
+            user_doc = db.collection('users').document(user_uid).get()
+            if not user_doc.exists:
+                log.warning("user document not found", extra={'uid': user_uid})
+                return jsonify({'error': 'User not found'}), 404
+            _migrate_friend_graph(user_uid, user_doc.to_dict())
             
-            if friend_doc.exists:
-                friend_info = friend_doc.to_dict()
-                
-                # Calculate friend's maximum habit streak
-                max_streak = calculate_max_habit_streak(friend_uid)
-                
-                friends_data.append({
-                    'uid': friend_uid,
-                    'email': friend_info.get('email'),
-                    'displayName': friend_info.get('displayName'),
-                    'maxStreak': max_streak,
-                    'stats': friend_info.get('stats', {
-                        'currentStreak': 0,
-                        'longestStreak': 0,
-                        'totalHabitsCompleted': 0
-                    })
-                })
-        
-        # Get incoming requests details from Firestore
-        incoming_data = []
-        for requester_uid in incoming_requests:
-            try:
-                # Get from Firestore users collection
-                requester_doc = db.collection('users').document(requester_uid).get()
-                if requester_doc.exists:
-                    requester_data = requester_doc.to_dict()
-                    requester_info = {
-                        'uid': requester_uid,
-                        'email': requester_data.get('email'),
-                        'displayName': requester_data.get('displayName', 'User'),
-                        'stats': requester_data.get('stats', {}),
-                        'type': 'incoming'
-                    }
-                    incoming_data.append(requester_info)
-                    print(f"📋 Added incoming request: {requester_info['displayName']}")
-            except Exception as e:
-                print(f"⚠️ Could not get requester data for {requester_uid}: {e}")
-                continue
-
-        # Get outgoing requests details from Firestore
-        outgoing_data = []
-        for target_uid in outgoing_requests:
-            try:
-                # Get from Firestore users collection
-                target_doc = db.collection('users').document(target_uid).get()
-                if target_doc.exists:
-                    target_data = target_doc.to_dict()
-                    target_info = {
-                        'uid': target_uid,
-                        'email': target_data.get('email'),
-                        'displayName': target_data.get('displayName', 'User'),
-                        'stats': target_data.get('stats', {}),
-                        'type': 'outgoing'
-                    }
-                    outgoing_data.append(target_info)
-                    print(f"📤 Added outgoing request: {target_info['displayName']}")
-            except Exception as e:
-                print(f"⚠️ Could not get target user data for {target_uid}: {e}")
-                continue
-
-        print(f"✅ Successfully fetched {len(friends_data)} friends, {len(incoming_data)} incoming requests, and {len(outgoing_data)} outgoing requests")
-        return jsonify({
-            'success': True, 
-            'friends': friends_data,
-            'incomingRequests': incoming_data,
-            'outgoingRequests': outgoing_data,
-            'outgoingRequestCount': len(outgoing_requests)
-        })
+            pending = friend_graph.list_requests(db, user_uid)
+            response['incomingRequests'] = [{**r, 'type': 'incoming'} for r in pending[friend_graph.INCOMING]]
+            response['outgoingRequests'] = [{**r, 'type': 'outgoing'} for r in pending[friend_graph.OUTGOING]]
+            response['outgoingRequestCount'] = len(pending[friend_graph.OUTGOING])
+            response['friendCount'] = friend_graph.count_friends(db, user_uid)
+        
+        # One page of denormalized friend cards: no per-friend profile reads
+        friends_data, next_cursor = friend_graph.list_friends(db, user_uid, limit, after)
+        _ensure_leaderboard()  # one projected habits read per process, never one query per friend
+        for friend in friends_data:
+            friend['maxStreak'] = leaderboard.score(friend['uid'])
+            friend.pop('since', None)
+        
+        log.debug("fetched %d friends", len(friends_data))
+        response.update({'friends': friends_data, 'nextCursor': next_cursor})
+        return jsonify(response)
         
-    except Exception as e:
-        print(f"💥 Error getting friends: {e}")
-        import traceback
-        print(f"💥 Full traceback: {traceback.format_exc()}")
+    except Exception:
+        log.exception("error getting friends")
         return jsonify({'error': 'Failed to load friends'}), 500
 
-@app.route('/api/friends/search', methods=['POST'])
+@route('/api/friends/search', methods=['POST'])
 def search_friend():
     """Search for a user by email"""
-    print(f"\n🔍 ===== SEARCH FRIEND REQUEST =====")
     
     # Check authentication
     if 'user_uid' not in session:
-        print(f"❌ User not authenticated - no user_uid in session")
         return jsonify({'error': 'Authentication required'}), 401
     
     current_user_uid = session['user_uid']
-    print(f"✅ Authenticated user: {current_user_uid}")
     
     # Get email from request
     data = request.get_json()
-    print(f"📦 Request data: {data}")
     
     if not data or 'email' not in data:
-        print(f"❌ No email provided in request")
         return jsonify({'error': 'Email is required'}), 400
     
-    search_email = data['email'].strip().lower()
-    print(f"📧 Searching for email: {search_email}")
+    search_email = user_directory.normalize_email(data['email'])
     
     try:
-        # Search Firestore users collection for user with this email
-        print(f"🔍 Searching Firestore users collection for email: {search_email}")
-        users_ref = db.collection('users')
-        query = users_ref.where('email', '==', search_email).limit(1)
-        results = query.get()
-        
-        print(f"📊 Query results count: {len(results)}")
-        
-        if not results:
-            print(f"❌ No user found with email: {search_email}")
+        # Point lookup in email_index, then one read of the user document
+        user_doc = None
+        indexed_uid = user_directory.lookup_uid(db, search_email)
+        if indexed_uid:
+            user_doc = db.collection('users').document(indexed_uid).get()
+            if not user_doc.exists:
+                user_doc = None
+        
+        if user_doc is None:
+            # Not indexed yet (user has not logged in since the index was added)
+            log.debug("email not indexed, falling back to users query")
+            users_ref = db.collection('users')
+            results = users_ref.where('email', '==', search_email).limit(1).get()
+            if not results and data['email'].strip() != search_email:
+                results = users_ref.where('email', '==', data['email'].strip()).limit(1).get()
+            if results:
+                user_doc = results[0]
+                user_directory.index_email(db, user_doc.id, search_email)
+        
+        if user_doc is None:
+            log.debug("no user found for searched email")
             return jsonify({'success': False, 'error': 'User not found'}), 404
         
         # Get the user document
-        user_doc = results[0]
         user_data = user_doc.to_dict()
         user_uid = user_data.get('uid')
         user_email = user_data.get('email')
         user_display_name = user_data.get('displayName', 'User')
         user_stats = user_data.get('stats', {'currentStreak': 0, 'longestStreak': 0, 'totalHabitsCompleted': 0})
         
-        print(f"✅ Found user: {user_uid}")
-        print(f"📋 User data: displayName={user_display_name}, email={user_email}")
+        log.debug("found user %s", user_uid)
         
         # Check if searching for yourself
         if user_uid == current_user_uid:
-            print(f"❌ User trying to add themselves")
             return jsonify({'success': False, 'error': 'You cannot add yourself as a friend'}), 400
         
         # Check if already friends
-        current_user_doc = db.collection('users').document(current_user_uid).get()
-        current_user_data = current_user_doc.to_dict()
-        friends_list = current_user_data.get('friends', [])
-        
-        print(f"👥 Current user's friends: {friends_list}")
-        
-        if user_uid in friends_list:
-            print(f"⚠️ Already friends with this user")
+        if friend_graph.friend_ref(db, current_user_uid, user_uid).get().exists:
             return jsonify({'success': False, 'error': 'You are already friends with this user'}), 400
         
         # Return user data
@@ -633,118 +719,102 @@ def search_friend():
             'stats': user_stats
         }
         
-        print(f"✅ Returning user data: {user_response}")
         return jsonify({'success': True, 'user': user_response}), 200
         
-    except Exception as e:
-        print(f"💥 Error searching for user: {e}")
-        import traceback
-        print(f"💥 Full traceback: {traceback.format_exc()}")
+    except Exception:
+        log.exception("error searching for user")
         return jsonify({'success': False, 'error': 'An error occurred while searching'}), 500
 
-@app.route('/api/friends/add', methods=['POST'])
+AUTOCOMPLETE_MIN_CHARS = 2
+AUTOCOMPLETE_MAX_LIMIT = 10
+
+def _ensure_user_directory():
+    """Build the in-process user directory from the users collection on first use."""
+    if directory.is_built():
+        return
+    users = ({**(d.to_dict() or {}), 'uid': d.id}
+             for d in db.collection('users').select(['email', 'displayName']).stream())
+    directory.build(users)
+
+@route('/api/users/autocomplete', methods=['GET'])
+def autocomplete_users():
+    """Users whose name starts with ?q=, or who registered ?q= as their whole email (at most ?limit=, capped)."""
+    if 'user_uid' not in session:
+        return jsonify({'error': 'Authentication required'}), 401
+
+    query = (request.args.get('q') or '').strip()
+    if len(query) < AUTOCOMPLETE_MIN_CHARS:
+        return jsonify({'success': True, 'users': []}), 200
+    try:
+        limit = max(1, min(int(request.args.get('limit', AUTOCOMPLETE_MAX_LIMIT)), AUTOCOMPLETE_MAX_LIMIT))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+
+    try:
+        if not db:
+            return jsonify({'error': 'Database unavailable'}), 500
+        _ensure_user_directory()
+        users = directory.search(query, limit, exclude=[session['user_uid']])
+        return jsonify({'success': True, 'users': users}), 200
+    except Exception:
+        log.exception("autocomplete failed")
+        return jsonify({'error': 'Failed to search users'}), 500
+
+@route('/api/friends/add', methods=['POST'])
 def add_friend():
     """Add friend directly by UID"""
-    print(f"\n➕ ===== ADD FRIEND REQUEST =====")
     
     # Check authentication
     if 'user_uid' not in session:
-        print(f"❌ User not authenticated")
         return jsonify({'error': 'Authentication required'}), 401
     
     current_user_uid = session['user_uid']
-    print(f"✅ Authenticated user: {current_user_uid}")
     
     try:
         data = request.get_json()
-        print(f"📦 Request data: {data}")
         
         friend_uid = data.get('friendUid')
         
         if not friend_uid:
-            print(f"❌ No friendUid provided")
             return jsonify({'error': 'Friend UID is required'}), 400
         
-        print(f"👤 Friend UID to add: {friend_uid}")
         
         # Cannot add yourself
         if friend_uid == current_user_uid:
-            print(f"❌ User trying to add themselves")
             return jsonify({'error': 'Cannot add yourself as a friend'}), 400
         
-        # Verify friend exists in Firestore
-        print(f"🔍 Verifying friend exists in Firestore: {friend_uid}")
-        friend_ref = db.collection('users').document(friend_uid)
-        friend_doc = friend_ref.get()
+        # One transaction: a single batched read of both users and the edge between them,
+        # then one commit of both request documents (or of the friendship if they already asked us)
+        log.debug("friend request %s -> %s", current_user_uid, friend_uid)
+        outcome, friend_card = friend_graph.request_friend(db, current_user_uid, friend_uid)
+        log.info("friend request", extra={'outcome': outcome})
         
-        if not friend_doc.exists:
-            print(f"❌ Friend user not found in Firestore")
+        if outcome == friend_graph.NOT_FOUND:
             return jsonify({'error': 'Friend user not found'}), 404
-        
-        friend_data = friend_doc.to_dict()
-        print(f"✅ Friend found: {friend_data.get('email')}")
-        
-        # Get current user's Firestore document
-        print(f"🔍 Getting current user Firestore data: {current_user_uid}")
-        user_ref = db.collection('users').document(current_user_uid)
-        user_doc = user_ref.get()
-        
-        if not user_doc.exists:
-            print(f"❌ Current user document not found")
+        if outcome == friend_graph.USER_MISSING:
             return jsonify({'error': 'User document not found. Please log out and log back in.'}), 404
-            
-        user_data = user_doc.to_dict()
-        print(f"✅ Current user data ready")
-        
-        # Check if already friends
-        current_friends = user_data.get('friends', [])
-        print(f"👥 Current friends list: {current_friends}")
-        
-        if friend_uid in current_friends:
-            print(f"⚠️ Already friends")
+        if outcome == friend_graph.ALREADY_FRIENDS:
             return jsonify({'error': 'Already friends with this user'}), 400
-        
-        print(f"✅ Friend data ready: {friend_data.get('displayName')}")
-        
-        # Check if request already sent
-        current_outgoing = user_data.get('friendRequests', {}).get('outgoing', [])
-        friend_incoming = friend_data.get('friendRequests', {}).get('incoming', [])
-        
-        if friend_uid in current_outgoing:
-            print(f"⚠️ Friend request already sent")
+        if outcome == friend_graph.ALREADY_SENT:
             return jsonify({'error': 'Friend request already sent'}), 400
         
-        # Send friend request
-        print(f"📤 Sending friend request from {current_user_uid} to {friend_uid}")
-        
-        # Add to current user's outgoing requests
-        user_ref.update({
-            'friendRequests.outgoing': firestore.ArrayUnion([friend_uid])
-        })
-        print(f"✅ Added to outgoing requests")
-        
-        # Add to friend's incoming requests
-        friend_ref.update({
-            'friendRequests.incoming': firestore.ArrayUnion([current_user_uid])
-        })
-        print(f"✅ Added to incoming requests")
-        
-        response_message = f'Friend request sent to {friend_data.get("displayName", friend_data.get("email"))}!'
-        print(f"🎉 Success: {response_message}")
+        if outcome == friend_graph.ACCEPTED:
+            response_message = f'You are now friends with {friend_card["displayName"]}!'
+        else:
+            response_message = f'Friend request sent to {friend_card["displayName"]}!'
         
         return jsonify({
             'success': True,
             'message': response_message
         })
     
-    except Exception as e:
-        print(f"Error adding friend: {e}")
+    except Exception:
+        log.exception("error adding friend")
         return jsonify({'error': 'Failed to add friend'}), 500
 
-@app.route('/api/friends/accept', methods=['POST'])
+@route('/api/friends/accept', methods=['POST'])
 def accept_friend_request():
     """Accept a friend request"""
-    print(f"\n✅ ===== ACCEPT FRIEND REQUEST =====")
     
     if 'user_uid' not in session:
         return jsonify({'error': 'Authentication required'}), 401
@@ -758,34 +828,22 @@ def accept_friend_request():
         if not requester_uid:
             return jsonify({'error': 'Requester UID is required'}), 400
         
-        print(f"👥 Accepting friend request from {requester_uid} to {current_user_uid}")
+        log.debug("accepting friend request %s -> %s", requester_uid, current_user_uid)
         
-        # Update both users
-        user_ref = db.collection('users').document(current_user_uid)
-        requester_ref = db.collection('users').document(requester_uid)
-        
-        # Remove from incoming/outgoing requests and add to friends
-        user_ref.update({
-            'friendRequests.incoming': firestore.ArrayRemove([requester_uid]),
-            'friends': firestore.ArrayUnion([requester_uid])
-        })
+        # One transaction: check the request still exists, then swap it for the friendship
+        if friend_graph.accept_request(db, current_user_uid, requester_uid) == friend_graph.NOT_FOUND:
+            return jsonify({'error': 'Friend request not found'}), 404
         
-        requester_ref.update({
-            'friendRequests.outgoing': firestore.ArrayRemove([current_user_uid]),
-            'friends': firestore.ArrayUnion([current_user_uid])
-        })
-        
-        print(f"🎉 Friend request accepted!")
+        log.info("friend request accepted")
         return jsonify({'success': True, 'message': 'Friend request accepted!'})
         
-    except Exception as e:
-        print(f"Error accepting friend request: {e}")
+    except Exception:
+        log.exception("error accepting friend request")
         return jsonify({'error': 'Failed to accept friend request'}), 500
 
-@app.route('/api/friends/decline', methods=['POST'])
+@route('/api/friends/decline', methods=['POST'])
 def decline_friend_request():
     """Decline a friend request"""
-    print(f"\n❌ ===== DECLINE FRIEND REQUEST =====")
     
     if 'user_uid' not in session:
         return jsonify({'error': 'Authentication required'}), 401
@@ -799,31 +857,25 @@ def decline_friend_request():
         if not requester_uid:
             return jsonify({'error': 'Requester UID is required'}), 400
         
-        print(f"👎 Declining friend request from {requester_uid}")
-        
-        # Remove from incoming/outgoing requests
-        user_ref = db.collection('users').document(current_user_uid)
-        requester_ref = db.collection('users').document(requester_uid)
-        
-        user_ref.update({
-            'friendRequests.incoming': firestore.ArrayRemove([requester_uid])
-        })
+        log.debug("declining friend request from %s", requester_uid)
         
-        requester_ref.update({
-            'friendRequests.outgoing': firestore.ArrayRemove([current_user_uid])
-        })
+        # Only a request we received can be declined; both sides go in one transaction
+        outcome = friend_graph.decline_request(db, current_user_uid, requester_uid)
+        if outcome == friend_graph.NOT_FOUND:
+            return jsonify({'error': 'Friend request not found'}), 404
+        if outcome == friend_graph.WRONG_DIRECTION:
+            return jsonify({'error': 'You sent this request; cancel it instead'}), 409
         
-        print(f"✅ Friend request declined")
+        log.info("friend request declined")
         return jsonify({'success': True, 'message': 'Friend request declined'})
         
-    except Exception as e:
-        print(f"Error declining friend request: {e}")
+    except Exception:
+        log.exception("error declining friend request")
         return jsonify({'error': 'Failed to decline friend request'}), 500
 
-@app.route('/api/friends/cancel', methods=['POST'])
+@route('/api/friends/cancel', methods=['POST'])
 def cancel_friend_request():
     """Cancel an outgoing friend request"""
-    print(f"\n🚫 ===== CANCEL FRIEND REQUEST =====")
     
     if 'user_uid' not in session:
         return jsonify({'error': 'Authentication required'}), 401
@@ -837,28 +889,23 @@ def cancel_friend_request():
         if not target_uid:
             return jsonify({'error': 'Target UID is required'}), 400
         
-        print(f"🚫 Canceling friend request to {target_uid}")
-        
-        # Remove from outgoing/incoming requests
-        user_ref = db.collection('users').document(current_user_uid)
-        target_ref = db.collection('users').document(target_uid)
+        log.debug("canceling friend request to %s", target_uid)
         
-        user_ref.update({
-            'friendRequests.outgoing': firestore.ArrayRemove([target_uid])
-        })
+        # Only a request we sent can be canceled; both sides go in one transaction
+        outcome = friend_graph.cancel_request(db, current_user_uid, target_uid)
+        if outcome == friend_graph.NOT_FOUND:
+            return jsonify({'error': 'Friend request not found'}), 404
+        if outcome == friend_graph.WRONG_DIRECTION:
+            return jsonify({'error': 'This request was sent to you; decline it instead'}), 409
         
-        target_ref.update({
-            'friendRequests.incoming': firestore.ArrayRemove([current_user_uid])
-        })
-        
-        print(f"✅ Friend request canceled")
+        log.info("friend request canceled")
         return jsonify({'success': True, 'message': 'Friend request canceled'})
         
-    except Exception as e:
-        print(f"Error canceling friend request: {e}")
+    except Exception:
+        log.exception("error canceling friend request")
         return jsonify({'error': 'Failed to cancel friend request'}), 500
 
-@app.route('/api/friends/<friend_uid>', methods=['DELETE'])
+@route('/api/friends/<friend_uid>', methods=['DELETE'])
 def remove_friend(friend_uid):
     """Remove a friend"""
     if 'user_uid' not in session:
@@ -867,30 +914,23 @@ def remove_friend(friend_uid):
     try:
         user_uid = session['user_uid']
         
-        # Remove from current user's friends list
-        user_ref = db.collection('users').document(user_uid)
-        user_ref.update({
-            'friends': firestore.ArrayRemove([friend_uid])
-        })
-        
-        # Remove current user from friend's friends list
-        friend_ref = db.collection('users').document(friend_uid)
-        friend_ref.update({
-            'friends': firestore.ArrayRemove([user_uid])
-        })
+        # Remove both friend documents in one batch
+        batch = db.batch()
+        friend_graph.unfriend(batch, db, user_uid, friend_uid)
+        batch.commit()
         
         return jsonify({
             'success': True,
             'message': 'Friend removed successfully'
         })
     
-    except Exception as e:
-        print(f"Error removing friend: {e}")
+    except Exception:
+        log.exception("error removing friend")
         return jsonify({'error': 'Failed to remove friend'}), 500
 
 # -------------------------------------------------------
 
-@app.route('/explore', endpoint='explore_page')
+@route('/explore', endpoint='explore_page')
 def explore_page():
     auth_result = require_auth()
     if not isinstance(auth_result, tuple):
@@ -901,7 +941,7 @@ def explore_page():
                            user_uid=user_uid,
                            active_tab='explore')
 
-@app.route('/meals', endpoint='meals_page')
+@route('/meals', endpoint='meals_page')
 def meals_page():
     auth_result = require_auth()
     if not isinstance(auth_result, tuple):
@@ -917,8 +957,8 @@ def meals_page():
             if user_doc.exists:
                 user_data = user_doc.to_dict()
                 user_meal_plan = user_data.get('currentMealPlan')
-        except Exception as e:
-            print(f"Error fetching meal plan: {e}")
+        except Exception:
+            log.exception("error fetching meal plan")
     
     return render_template('meals.html',
                          user_email=user_email,
@@ -1138,23 +1178,36 @@ MEAL_PLANS = {
     }
 }
 
-@app.route('/api/meal-plans', methods=['GET'])
+# Frozen once at startup; the catalog endpoint serves pre-rendered, pre-compressed bytes
+import meal_catalog
+catalog = meal_catalog.MealCatalog(MEAL_PLANS)
+MEAL_PLANS = catalog.plans
+CATALOG_MAX_AGE = 86400  # the catalog only changes with a deploy, and then its ETag changes too
+
+def _catalog_response(body):
+    """A meal_catalog.Body as a response: 304 on a matching ETag, else the best encoding."""
+    data, encoding = body.negotiate(request.accept_encodings)
+    etag = body.etag_for(encoding)
+    if request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = current_app.response_class(data, mimetype='application/json')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f'private, max-age={CATALOG_MAX_AGE}'
+    response.vary.add('Accept-Encoding')
+    return response
+
+@route('/api/meal-plans', methods=['GET'])
 def get_meal_plans():
     """Get all available meal plans"""
     if 'user_email' not in session:
         return jsonify({'error': 'Authentication required'}), 401
     
-    plans = []
-    for plan_type, plan_data in MEAL_PLANS.items():
-        plans.append({
-            'type': plan_type,
-            'name': plan_data['name'],
-            'description': plan_data['description']
-        })
-    
-    return jsonify({'success': True, 'plans': plans}), 200
+    return _catalog_response(catalog.list_body)
 
-@app.route('/api/enroll-meal-plan', methods=['POST'])
+@route('/api/enroll-meal-plan', methods=['POST'])
 def enroll_meal_plan():
     if 'user_email' not in session:
         return jsonify({'error': 'Authentication required'}), 401
@@ -1163,7 +1216,7 @@ def enroll_meal_plan():
     data = request.get_json() or {}
     plan_type = data.get('planType')
 
-    if not plan_type or plan_type not in MEAL_PLANS:
+    if not plan_type or plan_type not in catalog:
         return jsonify({'error': 'Invalid meal plan type'}), 400
 
     try:
@@ -1187,12 +1240,12 @@ def enroll_meal_plan():
             plan.reference.update({'status': 'cancelled', 'updatedAt': datetime.now()})
 
         # 3 Create new active plan document in meal_plans
-        plan_data = MEAL_PLANS[plan_type]
+        plan_data = catalog[plan_type]
         meal_plan_doc = {
             'userID': user_uid,
             'planType': plan_type,
             'planName': plan_data['name'],
-            'meals': plan_data['meals'],
+            'meals': catalog.meals(plan_type),
             'weekStart': datetime.now(),
             'enrolledAt': datetime.now(),
             'status': 'active',
@@ -1200,15 +1253,17 @@ def enroll_meal_plan():
             'updatedAt': datetime.now()
         }
         db.collection('meal_plans').add(meal_plan_doc)
+        touch(user_uid, 'meals')
 
         return jsonify({'success': True,
                         'message': f"Enrolled in {plan_data['name']} successfully!"}), 200
-    except Exception as e:
-        print("Error enrolling in meal plan", e)
+    except Exception:
+        log.exception("error enrolling in meal plan")
         return jsonify({'error': 'Failed to enroll in meal plan'}), 500
 
 
-@app.route('/api/current-meal-plan', methods=['GET'])
+@route('/api/current-meal-plan', methods=['GET'])
+@conditional_get('meals')
 def get_current_meal_plan():
     """Get user's current meal plan with meals"""
     if 'user_email' not in session:
@@ -1231,29 +1286,21 @@ def get_current_meal_plan():
         if not plan_type:
             return jsonify({'success': True, 'hasPlan': False}), 200
         
-        if plan_type not in MEAL_PLANS:
+        if plan_type not in catalog:
             return jsonify({'error': 'Invalid meal plan'}), 400
         
-        plan_data = MEAL_PLANS[plan_type]
-        
-        return jsonify({
-            'success': True,
-            'hasPlan': True,
-            'plan': {
-                'type': plan_type,
-                'name': plan_data['name'],
-                'description': plan_data['description'],
-                'meals': plan_data['meals'],
-                'startDate': user_data.get('mealPlanStartDate'),
-                'status': user_data.get('mealPlanStatus', 'active')
-            }
-        }), 200
+        # The plan itself is pre-serialized; only the user's own fields are encoded here
+        body = catalog.current_plan_body(plan_type, {
+            'startDate': user_data.get('mealPlanStartDate'),
+            'status': user_data.get('mealPlanStatus', 'active')
+        }, encode=lambda value: current_app.json.dumps(value).encode('utf-8'))
+        return current_app.response_class(body, mimetype='application/json'), 200
         
-    except Exception as e:
-        print(f"Error fetching meal plan: {e}")
+    except Exception:
+        log.exception("error fetching meal plan")
         return jsonify({'error': 'Failed to fetch meal plan'}), 500
 
-@app.route('/api/cancel-meal-plan', methods=['POST'])
+@route('/api/cancel-meal-plan', methods=['POST'])
 def cancel_meal_plan():
     """Cancel user's current meal plan"""
     if 'user_email' not in session:
@@ -1280,17 +1327,18 @@ def cancel_meal_plan():
         
         for plan in meal_plans:
             plan.reference.update({'status': 'cancelled', 'updatedAt': datetime.now()})
+        touch(user_uid, 'meals')
         
         return jsonify({
             'success': True,
             'message': 'Meal plan cancelled successfully'
         }), 200
         
-    except Exception as e:
-        print(f"Error cancelling meal plan: {e}")
+    except Exception:
+        log.exception("error cancelling meal plan")
         return jsonify({'error': 'Failed to cancel meal plan'}), 500
 
-@app.route('/api/delete-meal-day', methods=['POST'])
+@route('/api/delete-meal-day', methods=['POST'])
 def delete_meal_day():
     """Delete a specific day from the meal plan"""
     if 'user_uid' not in session:
@@ -1328,18 +1376,19 @@ def delete_meal_day():
             f'meals.{day}': firestore.DELETE_FIELD,
             'updatedAt': datetime.now()
         })
+        touch(user_uid, 'meals')
         
         return jsonify({
             'success': True,
             'message': f'{day.capitalize()} meals deleted successfully'
         }), 200
         
-    except Exception as e:
-        print(f"Error deleting meal day: {e}")
+    except Exception:
+        log.exception("error deleting meal day")
         return jsonify({'error': 'Failed to delete meal day'}), 500
 
 # ---------------- Profile ---------------- #
-@app.route('/profile', endpoint='profile_page')
+@route('/profile', endpoint='profile_page')
 def profile_page():
     auth_result = require_auth()
     if not isinstance(auth_result, tuple):
@@ -1370,8 +1419,8 @@ def profile_page():
                     "avatar": data.get("avatar_url", profile["avatar"]),
                     "username": data.get("username", profile["username"])
                 })
-        except Exception as e:
-            print("[profile_page] Firestore read error:", e)
+        except Exception:
+            log.exception("profile read failed")
 
     # ------------------ Stats (Habits + Journal) ------------------ #
     stats = {"active_habits": 0, "journal_entries": 0}
@@ -1387,8 +1436,8 @@ def profile_page():
                              .where('userID', '==', user_uid)
                              .stream()
             )
-    except Exception as e:
-        print("[profile_page] stats error:", e)
+    except Exception:
+        log.exception("profile stats failed")
 
     # ------------------ Recent Habits ------------------ #
     recent_habits = []
@@ -1401,8 +1450,8 @@ def profile_page():
                     "name": h.get('name') or "Habit",
                     "frequency": h.get('frequency', '').title()
                 })
-    except Exception as e:
-        print("[profile_page] recent habits error:", e)
+    except Exception:
+        log.exception("profile recent habits failed")
 
     return render_template(
         'profile.html',
@@ -1414,7 +1463,7 @@ def profile_page():
 
 
 
-@app.route('/edit-profile', methods=['GET', 'POST'], endpoint='edit_profile')
+@route('/edit-profile', methods=['GET', 'POST'], endpoint='edit_profile')
 def edit_profile():
     auth_result = require_auth()
     if not isinstance(auth_result, tuple):
@@ -1436,8 +1485,8 @@ def edit_profile():
         doc = db.collection("profiles").document(email).get()
         if doc.exists:
             profile_data.update(doc.to_dict() or {})
-    except Exception as e:
-        print("[edit_profile GET] Firestore error:", e)
+    except Exception:
+        log.exception("edit profile read failed")
 
     # POST – Save changes
     if request.method == 'POST':
@@ -1453,7 +1502,8 @@ def edit_profile():
         # Avatar upload
         try:
             if avatar_file and avatar_file.filename:
-                bucket = storage.bucket()
+                from firebase_admin import storage
+                bucket = storage.bucket(app=firebase_app.get())
                 key = f"avatars/{uid}/{secure_filename(f'{uid}_{int(datetime.now().timestamp())}.png')}"
                 blob = bucket.blob(key)
 
@@ -1468,17 +1518,17 @@ def edit_profile():
                 update_fields["avatar_url"] = avatar_url
                 update_fields["avatar_path"] = key
 
-                print("[Avatar Uploaded]", avatar_url)
+                log.info("avatar uploaded", extra={'uid': uid})
 
-        except Exception as e:
-            print("[edit_profile POST] Avatar upload error:", e)
+        except Exception:
+            log.exception("avatar upload failed")
 
         # Save to Firestore
         try:
             db.collection("profiles").document(email).set(update_fields, merge=True)
             flash("Profile updated successfully!", "success")
-        except Exception as e:
-            print("[edit_profile POST] Firestore saving error:", e)
+        except Exception:
+            log.exception("edit profile save failed")
             flash("Could not update profile", "error")
 
         return redirect(url_for('profile_page'))
@@ -1494,7 +1544,7 @@ def edit_profile():
 
 from local_storage import local_storage
 
-@app.route('/create-goal', methods=['POST'])
+@route('/create-goal', methods=['POST'])
 def create_goal():
     if 'user_email' not in session:
         return jsonify({'error': 'Authentication required'}), 401
@@ -1540,21 +1590,22 @@ def create_goal():
                 doc_ref.set(payload)
                 goal_id = doc_ref.id
             except Exception as err:
-                print("[Firestore Admin error]", err)
+                log.warning("Firestore Admin create failed: %s", err)
                 goal_id = None
 
         # 3 If Firestore fully failed → use LOCAL STORAGE
         if not goal_id:
-            print("[DEBUG] Firestore REST returned:", goal_id, "| db =", db)
-            print("[DEBUG] Saving goal locally instead")
+            log.warning("Firestore unavailable, saving goal locally")
             goal_id = local_storage.add_goal(user_id, payload)
+            touch(user_id, 'goals')
             return jsonify({'success': True, 'goalId': goal_id}), 200
 
         # 4 If Firestore worked
+        touch(user_id, 'goals')
         return jsonify({'success': True, 'goalId': goal_id}), 200
 
-    except Exception as e:
-        print("[create-goal] Exception:", e)
+    except Exception:
+        log.exception("create goal failed")
         return jsonify({'error': 'Failed to create goal'}), 500
 
                 
@@ -1562,13 +1613,18 @@ def create_goal():
 
 
 # ---------------- GOALS SUMMARY (fixed) ---------------- #
-@app.route('/get-goals', methods=['GET'])
+@route('/get-goals', methods=['GET'])
+@conditional_get('goals')
 def get_goals():
     """API endpoint to get user's goals"""
     user_id = session.get("user_uid", session.get("user_email"))
     if not user_id:
         return jsonify({'error': 'Authentication required'}), 401
 
+    return jsonify({'success': True, 'goals': _load_goals_json(user_id)}), 200
+
+def _load_goals_json(user_id):
+    """User's goals from Firestore (local storage as fallback), JSON-safe."""
     goals = []
 
     # 1 Try Firestore
@@ -1586,17 +1642,17 @@ def get_goals():
                 if 'endDate' in g and isinstance(g['endDate'], datetime):
                     g['endDate'] = g['endDate'].isoformat()
                 goals.append(g)
-        except Exception as e:
-            print(f"[get-goals] Firestore error: {e}")
+        except Exception:
+            log.exception("get goals from Firestore failed")
             goals = []
 
     # 2 If Firestore is empty → load local storage
     if not goals:
         goals = local_storage.get_goals(user_id)
 
-    return jsonify({'success': True, 'goals': goals}), 200
+    return goals
 
-@app.route('/update-goal/<goal_id>', methods=['PUT'])
+@route('/update-goal/<goal_id>', methods=['PUT'])
 def update_goal(goal_id):
     """Update goal progress or status"""
     if 'user_email' not in session:
@@ -1645,14 +1701,15 @@ def update_goal(goal_id):
         
         # Update the goal
         goal_ref.update(update_fields)
+        touch(user_id, 'goals')
         
         return jsonify({'success': True, 'message': 'Goal updated successfully'}), 200
         
-    except Exception as e:
-        print(f"[update-goal] Error: {e}")
+    except Exception:
+        log.exception("update goal failed")
         return jsonify({'error': 'Failed to update goal'}), 500
 
-@app.route('/reopen-goal/<goal_id>', methods=['POST'])
+@route('/reopen-goal/<goal_id>', methods=['POST'])
 def reopen_goal(goal_id):
     """Reopen a completed goal"""
     if 'user_email' not in session:
@@ -1681,14 +1738,15 @@ def reopen_goal(goal_id):
             'currentValue': 0,
             'updatedAt': datetime.now()
         })
+        touch(user_id, 'goals')
         
         return jsonify({'success': True, 'message': 'Goal reopened successfully'}), 200
         
-    except Exception as e:
-        print(f"[reopen-goal] Error: {e}")
+    except Exception:
+        log.exception("reopen goal failed")
         return jsonify({'error': 'Failed to reopen goal'}), 500
 
-@app.route('/delete-goal/<goal_id>', methods=['DELETE'])
+@route('/delete-goal/<goal_id>', methods=['DELETE'])
 def delete_goal(goal_id):
     """Delete a goal"""
     if 'user_email' not in session:
@@ -1713,14 +1771,15 @@ def delete_goal(goal_id):
         
         # Delete the goal
         goal_ref.delete()
+        touch(user_id, 'goals')
         
         return jsonify({'success': True, 'message': 'Goal deleted successfully'}), 200
         
-    except Exception as e:
-        print(f"[delete-goal] Error: {e}")
+    except Exception:
+        log.exception("delete goal failed")
         return jsonify({'error': 'Failed to delete goal'}), 500
 
-@app.route("/goals-summary")
+@route("/goals-summary")
 def goals_summary():
     user_id = session.get("user_uid", session.get("user_email"))
     if not user_id:
@@ -1745,7 +1804,27 @@ def goals_summary():
 
     return render_template("goals_summary.html", goals=goals)
 # ---------------- Habits API ---------------- #
-@app.route('/api/habits', methods=['GET', 'POST'])
+def _habit_to_json(doc):
+    """Habit document -> JSON-safe dict with its id."""
+    h = doc.to_dict() or {}
+    h['id'] = doc.id
+
+    # Make createdAt safe for JSON / JS
+    if 'createdAt' in h:
+        try:
+            v = h['createdAt']
+            if hasattr(v, 'isoformat'):
+                h['createdAt'] = v.isoformat()
+            elif hasattr(v, 'to_datetime'):
+                h['createdAt'] = v.to_datetime().isoformat()
+            else:
+                h['createdAt'] = str(v)
+        except Exception:
+            h['createdAt'] = str(h['createdAt'])
+    return h
+
+@route('/api/habits', methods=['GET', 'POST'])
+@conditional_get('habits')
 def habits_api():
     # Must be logged in
     if 'user_email' not in session:
@@ -1756,40 +1835,20 @@ def habits_api():
 
     # ---------- GET: fetch habits for dashboard ---------- #
     if request.method == 'GET':
-        print(f"[habits_api GET] user_id={user_id}, email={user_email}")
 
         if not db:
-            print("[habits_api GET] db is None")
+            log.debug("db unavailable, returning no habits")
             return jsonify({'success': True, 'habits': []}), 200
 
         try:
             docs = db.collection('habits').where('userID', '==', user_id).stream()
-            habits = []
+            habits = [_habit_to_json(d) for d in docs]
 
-            for d in docs:
-                h = d.to_dict() or {}
-                h['id'] = d.id
-
-                # Make createdAt safe for JSON / JS
-                if 'createdAt' in h:
-                    try:
-                        v = h['createdAt']
-                        if hasattr(v, 'isoformat'):
-                            h['createdAt'] = v.isoformat()
-                        elif hasattr(v, 'to_datetime'):
-                            h['createdAt'] = v.to_datetime().isoformat()
-                        else:
-                            h['createdAt'] = str(v)
-                    except Exception:
-                        h['createdAt'] = str(h['createdAt'])
-
-                habits.append(h)
-
-            print(f"[habits_api GET] found {len(habits)} habits for user {user_id}")
+            log.debug("found %d habits for user %s", len(habits), user_id)
             return jsonify({'success': True, 'habits': habits}), 200
 
-        except Exception as e:
-            print("[habits_api GET] error:", e)
+        except Exception:
+            log.exception("fetch habits failed")
             return jsonify({'success': False, 'error': 'Failed to fetch habits'}), 500
 
     # ---------- POST: create a new habit ---------- #
@@ -1816,31 +1875,31 @@ def habits_api():
             'isCompletedToday': False,
             'lastCompletedAt': None,
             'isPrivate': bool(data.get('isPrivate', False)),
+            'lastCompletedDay': None,
             'currentStreak': 0,
             'longestStreak': 0,
-            'completed_dates': [],
         }
 
-        print(f"[habits_api POST] creating habit for user_id={user_id} -> {habit}")
 
         doc = db.collection('habits').document()
         doc.set(habit)
+        touch(user_id, 'habits')
 
 
-        print(f"[habits_api POST] created habit with id={doc.id}")
+        log.debug("created habit %s for user %s", doc.id, user_id)
         return jsonify({'success': True,
                         'message': 'Habit created successfully!',
                         'habitId': doc.id}), 200
 
-    except Exception as e:
-        print("[habits_api POST] error:", e)
+    except Exception:
+        log.exception("create habit failed")
         return jsonify({'error': 'Failed to create habit'}), 500
 
 # ---------------- Update Habit API ---------------- #
-@app.route('/api/habits/<habit_id>', methods=['PUT'])
+@route('/api/habits/<habit_id>', methods=['PUT'])
 def update_habit(habit_id):
     """Update an existing habit"""
-    print(f"[update_habit] Updating habit {habit_id}")
+    log.debug("updating habit %s", habit_id)
     
     # Must be logged in
     if 'user_email' not in session:
@@ -1905,22 +1964,21 @@ def update_habit(habit_id):
             update_data['customFrequencyUnit'] = None
         
         habit_ref.update(update_data)
+        touch(user_id, 'habits')
         
-        print(f"[update_habit] Successfully updated habit {habit_id}")
+        log.debug("updated habit %s", habit_id)
         return jsonify({'success': True, 'message': 'Habit updated successfully!'}), 200
         
-    except Exception as e:
-        print(f"[update_habit] Error updating habit {habit_id}: {e}")
-        import traceback
-        print(f"[update_habit] Traceback: {traceback.format_exc()}")
+    except Exception:
+        log.exception("error updating habit %s", habit_id)
         return jsonify({'error': 'Failed to update habit'}), 500
 
 
 # ---------------- Delete Habit API ---------------- #
-@app.route('/api/habits/<habit_id>', methods=['DELETE'])
+@route('/api/habits/<habit_id>', methods=['DELETE'])
 def delete_habit(habit_id):
     """Delete a habit and all its completions"""
-    print(f"[delete_habit] Deleting habit {habit_id}")
+    log.debug("deleting habit %s", habit_id)
     
     # Must be logged in
     if 'user_email' not in session:
@@ -1943,68 +2001,130 @@ def delete_habit(habit_id):
         if habit_data.get('userID') != user_id:
             return jsonify({'error': 'Not authorized to delete this habit'}), 403
         
-        # Delete all habit completions first
-        completions_query = db.collection('habit_completions').where('habitID', '==', habit_id)
-        completions_docs = completions_query.stream()
-        
-        for completion_doc in completions_docs:
-            completion_doc.reference.delete()
-            print(f"[delete_habit] Deleted completion {completion_doc.id}")
-        
-        # Delete the habit itself
-        habit_ref.delete()
+        # Delete all habit completions and the habit itself in batched writes
+        writer = BatchWriter(db)
+        deleted_count = completions.clear_completions(db, [habit_id], writer)
+        writer.delete(habit_ref)
+        writer.commit()
+        leaderboard.remove_habit(user_id, habit_id)
+        touch(user_id, 'habits')
+        log.debug("deleted %d completion documents", deleted_count)
         
-        print(f"[delete_habit] Successfully deleted habit {habit_id}")
+        log.debug("deleted habit %s", habit_id)
         return jsonify({'success': True, 'message': 'Habit deleted successfully!'}), 200
         
-    except Exception as e:
-        print(f"[delete_habit] Error deleting habit {habit_id}: {e}")
-        import traceback
-        print(f"[delete_habit] Traceback: {traceback.format_exc()}")
+    except Exception:
+        log.exception("error deleting habit %s", habit_id)
         return jsonify({'error': 'Failed to delete habit'}), 500
 
 # ---------------- Update Habit Streak API ---------------- #
-@app.route('/update-habit-streak/<habit_id>', methods=['PUT'])
+@route('/update-habit-streak/<habit_id>', methods=['PUT'])
 def update_habit_streak(habit_id):
-    """Update a habit's current streak"""
+    """
+    Recalculate a habit's streak from its completion history. Streaks are
+    owned by the server: any value sent by the client is ignored.
+    """
     if 'user_email' not in session:
         return jsonify({'error': 'Authentication required'}), 401
+
+    user_id = session.get('user_uid', session['user_email'])
     
     try:
-        data = request.get_json()
-        if not data:
-            return jsonify({'error': 'No data provided'}), 400
-        
-        current_streak = data.get('currentStreak')
-        if current_streak is None:
-            return jsonify({'error': 'currentStreak is required'}), 400
-        
-        # Automatically mark as completed if streak is 7 or more
-        update_data = {
-            'currentStreak': current_streak,
-            'updatedAt': datetime.now()
-        }
-        
-        # If streak reaches 7 or more, mark as completed
-        if current_streak >= 7:
-            update_data['status'] = 'Completed'
-            update_data['lastCompleted'] = datetime.now()
-        else:
-            # If reducing streak below 7, mark as in progress
-            update_data['status'] = 'In Progress'
-        
-        db.collection('habits').document(habit_id).update(update_data)
-        return jsonify({'success': True}), 200
+        if not db:
+            return jsonify({'error': 'Database unavailable'}), 500
+
+        habit_ref = db.collection('habits').document(habit_id)
+        habit_doc = habit_ref.get()
+        if not habit_doc.exists:
+            return jsonify({'error': 'Habit not found'}), 404
+        if (habit_doc.to_dict() or {}).get('userID') != user_id:
+            return jsonify({'error': 'Not authorized to update this habit'}), 403
+
+        days = completions.completion_days(db, [habit_id])[habit_id]
+        fields = streaks.from_days(days)
+        habit_ref.update({**fields, 'updatedAt': datetime.now()})
+        leaderboard.update_habit(user_id, habit_id, fields)
+        touch(user_id, 'habits')
+        return jsonify({
+            'success': True,
+            'currentStreak': streaks.current(fields),
+            'longestStreak': fields['longestStreak'],
+        }), 200
         
-    except Exception as e:
-        print("[update-habit-streak] error:", e)
+    except Exception:
+        log.exception("update habit streak failed")
         return jsonify({'error': 'Failed to update habit streak'}), 500
 
 # ---------------- Habit Weekly Progress API ---------------- #
-@app.route('/habit/<habit_id>/weekly-progress', methods=['GET'])
+def _completion_datetime(value):
+    """
+    completedDate (datetime / Firestore Timestamp) -> naive datetime, or None.
+    Completions are written with naive datetime.now(), which Firestore stores
+    as UTC, so the UTC wall-clock time is the time that was written.
+    """
+    if value is not None and not isinstance(value, datetime) and hasattr(value, 'to_datetime'):
+        value = value.to_datetime()
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def _recent_completion_times(habit_ids, since):
+    """
+    habit_id -> completion datetimes at or after `since`.
+    One range query per 30 habits, so the cost depends on the window, not on
+    how old the habits are (see completions.completion_times for indexes).
+    """
+    return {habit_id: [_completion_datetime(t) for t in times]
+            for habit_id, times in completions.completion_times(db, habit_ids, since).items()}
+
+def _weekly_progress(habit_data, completion_times, now=None):
+    """
+    Weekly progress (last 7 days incl. today) for one habit, from its document
+    and its completion datetimes. Shape matches /habit/<id>/weekly-progress.
+    """
+    now = now or datetime.now()
+    start_date = now - timedelta(days=6)
+    today = now.date()
+
+    weekly_count = 0
+    completed_today = False
+    for completed_at in completion_times:
+        if completed_at is None:
+            continue
+        if start_date <= completed_at <= now:
+            weekly_count += 1
+        if completed_at.date() == today:
+            completed_today = True
+
+    # Server-maintained streak fields on the habit document (see streaks.py)
+    current_streak = streaks.current(habit_data, today)
+
+    # For testing: if no completions, use current_streak as test data
+    if weekly_count == 0 and current_streak > 0:
+        weekly_count = min(current_streak, 7)  # Show some progress based on streak
+
+    longest_streak = streaks.longest(habit_data)
+
+    # Check if habit is marked as completed (like goals)
+    habit_status = habit_data.get('status', 'In Progress')
+
+    # If status is Completed, show 7/7 progress (100%)
+    if habit_status == 'Completed':
+        weekly_count = 7
+
+    return {
+        'weekly_count': weekly_count,
+        'streak_current': current_streak,
+        'streak_longest': longest_streak,
+        'completed_today': habit_status == 'Completed' or completed_today,  # overall completion state
+        'status': habit_status,
+    }
+
+@route('/habit/<habit_id>/weekly-progress', methods=['GET'])
 def get_habit_weekly_progress(habit_id):
     """Get weekly progress and streak data for a specific habit"""
-    print(f"[get_habit_weekly_progress] Getting weekly progress for habit {habit_id}")
     
     # Must be logged in
     if 'user_email' not in session:
@@ -2027,84 +2147,105 @@ def get_habit_weekly_progress(habit_id):
         if habit_data.get('userID') != user_id:
             return jsonify({'error': 'Not authorized to view this habit'}), 403
         
-        # Get current streak from habit document
-        current_streak = habit_data.get('currentStreak', 0)
-        
-        # Calculate weekly progress (last 7 days)
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=6)  # Last 7 days including today
-        today = datetime.now().date()
-        
-        # Query habit completions for this week - get all and filter manually to avoid date comparison issues
-        completions_query = db.collection('habit_completions').where('habitID', '==', habit_id)
-        all_completions = list(completions_query.stream())
-        
-        # Filter for this week manually and check for today's completion
-        weekly_count = 0
-        completed_today = False
-        for completion in all_completions:
-            completion_data = completion.to_dict()
-            if 'completedDate' in completion_data:
-                completion_date = completion_data['completedDate']
-                try:
-                    # Handle Firestore Timestamp objects
-                    if hasattr(completion_date, 'date'):
-                        completion_date_obj = completion_date  # Already datetime
-                    else:
-                        # Convert timestamp to datetime if needed
-                        completion_date_obj = completion_date.to_datetime() if hasattr(completion_date, 'to_datetime') else completion_date
-                    
-                    # Check if in this week
-                    if start_date <= completion_date_obj <= end_date:
-                        weekly_count += 1
-                    
-                    # Check if completed today
-                    if hasattr(completion_date_obj, 'date'):
-                        if completion_date_obj.date() == today:
-                            completed_today = True
-                except Exception as date_error:
-                    print(f"[get_habit_weekly_progress] Date processing error: {date_error}")
-                    # Skip this completion if we can't process the date
-                    continue
-        
-        # For testing: if no completions, use current_streak as test data
-        if weekly_count == 0 and current_streak > 0:
-            weekly_count = min(current_streak, 7)  # Show some progress based on streak
-        
-        # For now, use current streak as longest streak to avoid complexity
-        # TODO: Implement proper longest streak calculation later
-        longest_streak = current_streak
-        
-        # Check if habit is marked as completed (like goals)
-        habit_status = habit_data.get('status', 'In Progress')
-        is_completed = habit_status == 'Completed' or completed_today
+        now = datetime.now()
+        times = _recent_completion_times([habit_id], now - timedelta(days=6))
+        progress = _weekly_progress(habit_data, times[habit_id], now)
+        log.debug("weekly progress of habit %s: %s", habit_id, progress)
         
-        # If status is Completed, show 7/7 progress (100%)
-        if habit_status == 'Completed':
-            weekly_count = 7
-        
-        print(f"[get_habit_weekly_progress] Habit {habit_id}: weekly_count={weekly_count}, current_streak={current_streak}, longest_streak={longest_streak}, completed_today={completed_today}, status={habit_status}, is_completed={is_completed}")
+        return jsonify({'success': True, **progress}), 200
         
+    except Exception:
+        log.exception("error getting weekly progress for habit %s", habit_id)
+        return jsonify({'error': 'Failed to get habit weekly progress'}), 500
+
+# ---------------- Batch Weekly Progress API ---------------- #
+WEEKLY_PROGRESS_BATCH_LIMIT = 100
+
+@route('/api/habits/weekly-progress', methods=['GET'])
+def get_habits_weekly_progress():
+    """Weekly progress for many habits at once: ?ids=<habitId>,<habitId>,..."""
+    if 'user_email' not in session:
+        return jsonify({'error': 'Authentication required'}), 401
+
+    user_id = session.get('user_uid', session['user_email'])
+    habit_ids = list(dict.fromkeys(i for i in (request.args.get('ids') or '').split(',') if i))
+
+    if not habit_ids:
+        return jsonify({'error': 'ids is required'}), 400
+    if len(habit_ids) > WEEKLY_PROGRESS_BATCH_LIMIT:
+        return jsonify({'error': f'At most {WEEKLY_PROGRESS_BATCH_LIMIT} habits per request'}), 400
+
+    try:
+        if not db:
+            return jsonify({'error': 'Database unavailable'}), 500
+
+        # One batched read for all habit documents (ownership + streak/status)
+        refs = [db.collection('habits').document(i) for i in habit_ids]
+        habits = {}
+        for snap in db.get_all(refs):
+            data = snap.to_dict() if snap.exists else None
+            if data and data.get('userID') == user_id:
+                habits[snap.id] = data
+
+        now = datetime.now()
+        times = _recent_completion_times(list(habits), now - timedelta(days=6))
+        progress = {hid: _weekly_progress(habits[hid], times[hid], now) for hid in habits}
+
         return jsonify({
             'success': True,
-            'weekly_count': weekly_count,
-            'streak_current': current_streak,
-            'streak_longest': longest_streak,
-            'completed_today': is_completed,  # Send overall completion state
-            'status': habit_status
+            'progress': progress,
+            'notFound': [i for i in habit_ids if i not in habits],
         }), 200
-        
-    except Exception as e:
-        print(f"[get_habit_weekly_progress] Error getting weekly progress for habit {habit_id}: {e}")
-        import traceback
-        print(f"[get_habit_weekly_progress] Traceback: {traceback.format_exc()}")
-        return jsonify({'error': 'Failed to get habit weekly progress'}), 500
+
+    except Exception:
+        log.exception("weekly progress failed")
+        return jsonify({'error': 'Failed to get weekly progress'}), 500
+
+# ---------------- Dashboard Bootstrap API ---------------- #
+@route('/api/dashboard', methods=['GET'])
+def dashboard_data():
+    """
+    Everything the dashboard needs on load in one response: habits, weekly
+    progress and today's status for every habit, and goals. Replaces the
+    /api/habits + /get-goals + N x /habit/<id>/weekly-progress waterfall.
+    """
+    if 'user_email' not in session:
+        return jsonify({'error': 'Authentication required'}), 401
+
+    user_id = session.get('user_uid', session['user_email'])
+    habits, progress = [], {}
+
+    try:
+        if db:
+            habits = [_habit_to_json(d) for d in
+                      db.collection('habits').where('userID', '==', user_id).stream()]
+
+            # Completions for all habits: one range query per 30 habits, not one per habit
+            now = datetime.now()
+            completion_times = _recent_completion_times([h['id'] for h in habits], now - timedelta(days=6))
+            progress = {h['id']: _weekly_progress(h, completion_times[h['id']], now) for h in habits}
+
+        goals = _load_goals_json(user_id)
+    except Exception:
+        log.exception("dashboard data failed")
+        return jsonify({'success': False, 'error': 'Failed to load dashboard'}), 500
+
+    return jsonify({
+        'success': True,
+        'habits': habits,
+        'progress': progress,
+        'summary': {
+            'total': len(habits),
+            'completed_today': sum(1 for p in progress.values() if p['completed_today']),
+        },
+        'goals': goals,
+    }), 200
 
 # ---------------- Mark Habit Complete API ---------------- #
-@app.route('/habit/<habit_id>/complete', methods=['POST'])
+@route('/habit/<habit_id>/complete', methods=['POST'])
 def mark_habit_complete(habit_id):
     """Mark a habit as complete for today"""
-    print(f"[mark_habit_complete] Marking habit {habit_id} as complete")
+    log.debug("marking habit %s complete", habit_id)
     
     # Must be logged in
     if 'user_email' not in session:
@@ -2130,46 +2271,95 @@ def mark_habit_complete(habit_id):
         # Check if already completed (check status field like goals)
         habit_status = habit_data.get('status', 'In Progress')
         if habit_status == 'Completed':
-            print(f"[mark_habit_complete] Habit {habit_id} already marked as complete")
+            log.debug("habit %s already complete", habit_id)
             return jsonify({'success': True, 'message': 'Already completed'}), 200
         
-        # Mark habit as complete - just update the status field like goals
-        # No need to create multiple completion records
+        # Mark habit as complete - update the status field like goals and
+        # record today's completion under its deterministic id (idempotent).
+        # The streak is advanced by the server in the same transaction.
         from datetime import datetime
         
-        # Get or maintain current streak
-        current_streak = habit_data.get('currentStreak', 0)
-        # When marking complete, ensure minimum streak of 7 days
-        if current_streak < 7:
-            current_streak = 7
-            
-        # Single write operation to mark as completed
-        habit_ref.update({
-            'currentStreak': current_streak,
-            'lastCompleted': datetime.now(),
-            'updatedAt': datetime.now(),
+        now = datetime.now()
+        result = completions.record_completion(db, user_id, habit_id, now, now, habit_fields={
+            'lastCompleted': now,
+            'updatedAt': now,
             'status': 'Completed'  # Mark as completed like goals
         })
+        current_streak = result['currentStreak']
+        leaderboard.update_habit(user_id, habit_id, result)
+        touch(user_id, 'habits')
         
-        print(f"[mark_habit_complete] Successfully marked habit {habit_id} as complete with status=Completed, streak: {current_streak}")
+        log.debug("habit %s complete, streak %d", habit_id, current_streak)
         return jsonify({
             'success': True, 
             'message': 'Habit marked as complete!',
             'newStreak': current_streak
         }), 200
         
-    except Exception as e:
-        print(f'[mark_habit_complete] error: {e}')
-        import traceback
-        print(f"[mark_habit_complete] Traceback: {traceback.format_exc()}")
+    except Exception:
+        log.exception("error marking habit %s complete", habit_id)
         return jsonify(success=False, error="Failed to mark habit complete"), 500
 
 
+# ---------------- Set / Clear One Day's Completion API ---------------- #
+COMPLETION_EDIT_DAYS = 7  # the dashboard's 7-day bar; one day ahead is allowed for client time zones
+
+@route('/api/habits/<habit_id>/completions/<day>', methods=['PUT', 'DELETE'])
+def set_habit_completion(habit_id, day):
+    """Mark (PUT) or unmark (DELETE) one recent day, keeping streaks and rollups in step."""
+    if 'user_email' not in session:
+        return jsonify({'error': 'Authentication required'}), 401
+
+    user_id = session.get('user_uid', session['user_email'])
+
+    try:
+        day_value = date.fromisoformat(day)
+    except ValueError:
+        return jsonify({'error': 'Day must be YYYY-MM-DD'}), 400
+    today = date.today()
+    if not today - timedelta(days=COMPLETION_EDIT_DAYS - 1) <= day_value <= today + timedelta(days=1):
+        return jsonify({'error': f'Only the last {COMPLETION_EDIT_DAYS} days can be changed'}), 400
+
+    try:
+        if not db:
+            return jsonify({'error': 'Database unavailable'}), 500
+
+        habit_doc = db.collection('habits').document(habit_id).get()
+        if not habit_doc.exists:
+            return jsonify({'error': 'Habit not found'}), 404
+        if (habit_doc.to_dict() or {}).get('userID') != user_id:
+            return jsonify({'error': 'Not authorized to change this habit'}), 403
+
+        now = datetime.now()
+        fields = {'updatedAt': now}
+        if request.method == 'PUT':
+            if day_value == today:
+                fields.update(lastCompleted=now, status='Completed')
+            result = completions.record_completion(db, user_id, habit_id, day_value, now, habit_fields=fields)
+        else:
+            if day_value == today:
+                fields['status'] = 'In Progress'
+            result = completions.remove_completion(db, habit_id, day_value, habit_fields=fields)
+        leaderboard.update_habit(user_id, habit_id, result)
+        touch(user_id, 'habits')
+
+        return jsonify({
+            'success': True,
+            'day': day_value.isoformat(),
+            'completed': request.method == 'PUT',
+            'newStreak': result.get('currentStreak', 0),
+        }), 200
+
+    except Exception:
+        log.exception("error setting completion of habit %s", habit_id)
+        return jsonify({'error': 'Failed to update completion'}), 500
+
+
 # ---------------- Reopen Habit API ---------------- #
-@app.route('/habit/<habit_id>/reopen', methods=['POST'])
+@route('/habit/<habit_id>/reopen', methods=['POST'])
 def reopen_habit(habit_id):
     """Reopen a habit by removing today's completion"""
-    print(f"[reopen_habit] Reopening habit {habit_id}")
+    log.debug("reopening habit %s", habit_id)
     
     # Must be logged in
     if 'user_email' not in session:
@@ -2196,42 +2386,38 @@ def reopen_habit(habit_id):
         # This makes reopen work like goals - reopen = reset to zero
         from datetime import datetime, date
         
-        # Query for all completions for this habit
-        all_completions = db.collection('habit_completions').where('habitID', '==', habit_id).where('userID', '==', user_id).stream()
-        
-        deleted_count = 0
-        for completion in all_completions:
-            completion.reference.delete()
-            deleted_count += 1
+        # Delete all completion documents (days, or months in monthly storage)
+        writer = BatchWriter(db)
+        deleted_count = completions.clear_completions(db, [habit_id], writer)
         
-        print(f"[reopen_habit] Deleted {deleted_count} completions for habit {habit_id}")
+        log.debug("deleting %d completion documents of habit %s", deleted_count, habit_id)
         
         # Reset habit's current streak to 0
         current_streak = 0
-        habit_ref.update({
-            'currentStreak': current_streak,
+        writer.update(habit_ref, {
+            **streaks.reset(),
             'updatedAt': datetime.now(),
             'status': 'In Progress'  # Reset status like goals
         })
+        writer.commit()
+        leaderboard.update_habit(user_id, habit_id, streaks.reset())
+        touch(user_id, 'habits')
         
-        print(f"[reopen_habit] Successfully reopened habit {habit_id}, new streak: {current_streak}")
+        log.debug("reopened habit %s, streak %d", habit_id, current_streak)
         return jsonify({
             'success': True, 
             'message': 'Habit reopened successfully!',
             'newStreak': current_streak
         }), 200
         
-    except Exception as e:
-        print(f"[reopen_habit] Error reopening habit {habit_id}: {e}")
-        import traceback
-        print(f"[reopen_habit] Traceback: {traceback.format_exc()}")
+    except Exception:
+        log.exception("error reopening habit %s", habit_id)
         return jsonify({'error': 'Failed to reopen habit'}), 500
 
 # ---------------- Reset All Habits Today API ---------------- #
-@app.route('/reset-habits-today', methods=['PUT'])
+@route('/reset-habits-today', methods=['PUT'])
 def reset_habits_today():
     """Reset all user's habits by deleting all completions and resetting streaks to 0"""
-    print("[reset_habits_today] Resetting all habits for today")
     
     # Must be logged in
     if 'user_email' not in session:
@@ -2247,40 +2433,98 @@ def reset_habits_today():
         habits_query = db.collection('habits').where('userID', '==', user_id)
         user_habits = list(habits_query.stream())
         
+        # Delete ALL completions for these habits (one query per 30 habits),
+        # queued on the same batch as the habit updates
+        writer = BatchWriter(db)
+        completions.clear_completions(db, [h.id for h in user_habits], writer)
+        
         reset_count = 0
         for habit_doc in user_habits:
-            habit_id = habit_doc.id
-            
-            # Delete ALL completions for this habit
-            all_completions = db.collection('habit_completions').where('habitID', '==', habit_id).where('userID', '==', user_id).stream()
-            
-            for completion in all_completions:
-                completion.reference.delete()
-            
             # Reset habit's current streak to 0 and set status to In Progress
-            habit_doc.reference.update({
-                'currentStreak': 0,
+            writer.update(habit_doc.reference, {
+                **streaks.reset(),
                 'updatedAt': datetime.now(),
                 'status': 'In Progress'
             })
             
             reset_count += 1
+        writer.commit()
+        for habit_doc in user_habits:
+            leaderboard.update_habit(user_id, habit_doc.id, streaks.reset())
+        touch(user_id, 'habits')
         
-        print(f"[reset_habits_today] Successfully reset {reset_count} habits")
+        log.debug("reset %d habits", reset_count)
         return jsonify({
             'success': True, 
             'message': f'Reset {reset_count} habits successfully!',
             'reset_count': reset_count
         }), 200
         
-    except Exception as e:
-        print(f"[reset_habits_today] Error resetting habits: {e}")
-        import traceback
-        print(f"[reset_habits_today] Traceback: {traceback.format_exc()}")
+    except Exception:
+        log.exception("error resetting habits")
         return jsonify({'success': False, 'error': 'Failed to reset habits'}), 500
 
+# ---------------- Streak Leaderboard API ---------------- #
+LEADERBOARD_MAX_LIMIT = 50
+
+def _ensure_leaderboard():
+    """Build the in-process leaderboard from the habits collection on first use."""
+    if leaderboard.is_built():
+        return
+    fields = ['userID', 'currentStreak', 'lastCompletedDay']
+    habits = ({**(d.to_dict() or {}), 'id': d.id}
+              for d in db.collection('habits').select(fields).stream())
+    leaderboard.build(habits)
+
+@route('/api/leaderboard', methods=['GET'])
+def get_leaderboard():
+    """
+    Users ranked by their best live habit streak.
+    ?scope=friends (default; you and your friends) or global, &limit=10&offset=0
+    """
+    if 'user_email' not in session:
+        return jsonify({'error': 'Authentication required'}), 401
+
+    user_id = session.get('user_uid', session['user_email'])
+    scope = request.args.get('scope', 'friends')
+    if scope not in ('friends', 'global'):
+        return jsonify({'error': 'scope must be friends or global'}), 400
+    try:
+        limit = max(1, min(int(request.args.get('limit', 10)), LEADERBOARD_MAX_LIMIT))
+        offset = max(0, int(request.args.get('offset', 0)))
+    except ValueError:
+        return jsonify({'error': 'limit and offset must be integers'}), 400
+
+    try:
+        if not db:
+            return jsonify({'error': 'Database unavailable'}), 500
+        _ensure_leaderboard()
+
+        user_ids = None
+        if scope == 'friends':
+            user_ids = [user_id] + friend_graph.friend_ids(db, user_id)
+        board = leaderboard.top(limit, offset, user_ids)
+
+        # Names for this page only: one batched read of K user documents
+        refs = [db.collection('users').document(e['uid']) for e in board['entries']]
+        profiles = {snap.id: snap.to_dict() or {} for snap in db.get_all(refs) if snap.exists} if refs else {}
+        for entry in board['entries']:
+            profile = profiles.get(entry['uid'], {})
+            # emails are only shown among friends, never on the global board
+            entry['displayName'] = profile.get('displayName') \
+                or (profile.get('email') if scope == 'friends' else None) or 'User'
+            entry['isYou'] = entry['uid'] == user_id
+
+        return jsonify({'success': True, 'scope': scope, 'limit': limit, 'offset': offset, **board}), 200
+
+    except Exception:
+        log.exception("leaderboard failed")
+        return jsonify({'error': 'Failed to load leaderboard'}), 500
+
 # ---------------- Journal page ---------------- #
-@app.route('/journal', methods=['GET', 'POST'], endpoint='journal_page')
+from journal_index import journal_index
+
+@route('/journal', methods=['GET', 'POST'], endpoint='journal_page')
 def journal_page():
     auth_result = require_auth()
     if not isinstance(auth_result, tuple):
@@ -2299,15 +2543,17 @@ def journal_page():
 
         try:
             doc_ref = db.collection('journal_entries').document()
+            created_at = datetime.now()
             doc_ref.set({
                 'userID': user_uid,
                 'email': user_email,
                 'content': content,
-                'createdAt': datetime.now(),
+                'createdAt': created_at,
             })
+            journal_index.upsert(user_uid, doc_ref.id, content, created_at)
             return jsonify({'success': True, 'id': doc_ref.id}), 200
-        except Exception as e:
-            print('[journal_page POST] Firestore error:', e)
+        except Exception:
+            log.exception("journal save failed")
             return jsonify({'error': 'Failed to save entry'}), 500
 
     # GET: fetch recent entries WITHOUT Firestore order_by (no index required)
@@ -2326,8 +2572,8 @@ def journal_page():
                 key=lambda x: x.get('createdAt') or datetime.min,
                 reverse=True
             )[:10]
-        except Exception as e:
-            print('[journal_page GET] Firestore read error:', e)
+        except Exception:
+            log.exception("journal read failed")
 
     return render_template(
         'journal.html',
@@ -2337,14 +2583,13 @@ def journal_page():
         user_uid=user_uid
     )
 # ---------------- Journal History ---------------- #
-@app.route('/journal/history', endpoint='journal_history')
+@route('/journal/history', endpoint='journal_history')
 def journal_history():
     auth_result = require_auth()
     if not isinstance(auth_result, tuple):
         return auth_result
     user_email, user_uid = auth_result
 
-    print("[journal_history] user_email =", user_email, "user_uid =", user_uid)
 
     entries = []
     if db:
@@ -2365,7 +2610,7 @@ def journal_history():
                 }
                 temp.append(item)
 
-            print(f"[journal_history] Firestore docs for this user: {raw_count}")
+            log.debug("%d journal entries for user %s", raw_count, user_uid)
 
             # Sort newest → oldest
             from datetime import datetime as _dt
@@ -2380,8 +2625,8 @@ def journal_history():
                 e["createdAt"] = _ts_to_iso(e["createdAt"])
                 e["updatedAt"] = _ts_to_iso(e["updatedAt"])
 
-        except Exception as e:
-            print("[journal_history] Firestore read error:", e)
+        except Exception:
+            log.exception("journal history read failed")
 
     return render_template(
         'journal_history.html',
@@ -2391,8 +2636,62 @@ def journal_history():
         user_uid=user_uid
     )
 
+# ---------------- Journal Search ---------------- #
+@route('/journal/search', endpoint='journal_search')
+def journal_search():
+    """Ranked, paginated full-text search over the user's journal entries."""
+    if 'user_email' not in session:
+        return jsonify({'error': 'Authentication required'}), 401
+
+    user_uid = session.get('user_uid', session['user_email'])
+    query = (request.args.get('q') or '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 10, type=int), 1), 50)
+
+    if not query:
+        return jsonify({'error': 'Search query is required'}), 400
+
+    # in-memory index over the user's Firestore entries, built from one read on first search
+    if not db and not journal_index.has_user(user_uid):
+        return jsonify({'error': 'Journal search unavailable'}), 503
+    if not journal_index.has_user(user_uid):
+        journal_index.start_build(user_uid)  # entries saved during the read are replayed by build()
+        try:
+            docs = db.collection('journal_entries').where('userID', '==', user_uid).stream()
+            entries = []
+            for d in docs:
+                data = d.to_dict() or {}
+                entries.append({
+                    'id': d.id,
+                    'content': data.get('content', ''),
+                    'createdAt': data.get('createdAt'),
+                })
+            journal_index.build(user_uid, entries)
+        except Exception:
+            journal_index.cancel_build(user_uid)
+            log.exception("journal search read failed")
+            return jsonify({'error': 'Failed to search journal'}), 500
+
+    found = journal_index.search(
+        user_uid, query, limit=per_page, offset=(page - 1) * per_page
+    ) or {'total': 0, 'results': []}
+    results = [{
+        'id': r['id'],
+        'snippet': r['snippet'],
+        'createdAt': _ts_to_iso(r['createdAt']),
+    } for r in found['results']]
+
+    return jsonify({
+        'success': True,
+        'query': query,
+        'page': page,
+        'per_page': per_page,
+        'total': found['total'],
+        'results': results,
+    }), 200
+
 # ---------------- Edit Journal Entry (simplified) ---------------- #
-@app.route('/journal/<entry_id>/edit', methods=['GET', 'POST'], endpoint='edit_journal')
+@route('/journal/<entry_id>/edit', methods=['GET', 'POST'], endpoint='edit_journal')
 def edit_journal(entry_id):
     auth_result = require_auth()
     if not isinstance(auth_result, tuple):
@@ -2409,12 +2708,12 @@ def edit_journal(entry_id):
     try:
         snap = doc_ref.get()
         if not snap.exists:
-            print("[edit_journal] entry not found:", entry_id)
+            log.warning("journal entry not found: %s", entry_id)
             flash("Journal entry not found", "error")
             return redirect(url_for('journal_history'))
         data = snap.to_dict() or {}
-    except Exception as e:
-        print("[edit_journal] Firestore read error:", e)
+    except Exception:
+        log.exception("journal entry read failed")
         flash("Failed to load journal entry", "error")
         return redirect(url_for('journal_history'))
 
@@ -2430,10 +2729,11 @@ def edit_journal(entry_id):
                 'content': content,
                 'updatedAt': datetime.now()
             })
-            print("[edit_journal POST] updated entry:", entry_id)
+            journal_index.upsert(data.get('userID', user_uid), entry_id, content, data.get('createdAt'))
+            log.debug("updated journal entry %s", entry_id)
             flash("Journal entry updated successfully", "success")
-        except Exception as e:
-            print("[edit_journal POST] update error:", e)
+        except Exception:
+            log.exception("journal entry update failed")
             flash("Failed to update journal entry", "error")
 
         return redirect(url_for('journal_history'))
@@ -2457,7 +2757,7 @@ def edit_journal(entry_id):
 
 
 # ---- DEV ONLY: quick session setter for curl (remove later) ----
-@app.route('/_dev/set-session')
+@route('/_dev/set-session')
 def _dev_set_session():
     session['user_email'] = 'test@gmail.com'
     session['user_uid'] = 'localdev'
@@ -2467,7 +2767,7 @@ def _dev_set_session():
 
 
 # ---------------- Debug helpers ---------------- #
-@app.route('/debug-session')
+@route('/debug-session')
 def debug_session():
     return jsonify({
         'authenticated': 'user_email' in session,
@@ -2476,11 +2776,30 @@ def debug_session():
         'user_uid': session.get('user_uid'),
     })
 
-@app.route('/_debug/routes')
+def metrics_allowed():
+    """The request carries the METRICS_TOKEN bearer token (proxies make remote_addr useless here)."""
+    token = current_app.config.get('METRICS_TOKEN') or ''
+    scheme, _, given = (request.headers.get('Authorization') or '').partition(' ')
+    if not token or scheme.lower() != 'bearer' or not given:
+        return False
+    return hmac.compare_digest(given.encode('utf-8'), token.encode('utf-8'))
+
+@route('/metrics')
+def metrics_endpoint():
+    """Prometheus text exposition; only for scrapers holding METRICS_TOKEN."""
+    if not metrics_allowed():
+        abort(404)
+    return current_app.response_class(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+@route('/_debug/routes')
 def _debug_routes():
-    return {'endpoints': sorted(list(dict(app.view_functions).keys()))}
+    endpoints = sorted(list(dict(current_app.view_functions).keys()))
+    if not metrics_allowed():
+        return {'endpoints': endpoints}
+    return {'endpoints': endpoints,
+            'metrics': {'url': url_for('metrics_endpoint'), 'routes': metrics.endpoint_summary(endpoints)}}
 
-@app.route('/_debug/create_users')
+@route('/_debug/create_users')
 def _debug_create_users():
     """Create missing user documents"""
     try:
@@ -2492,8 +2811,6 @@ def _debug_create_users():
             'uid': current_user_uid,
             'email': 'swarheka@stevens.edu',
             'displayName': 'Swarhekar',
-            'friends': [],
-            'friendRequests': {'incoming': [], 'outgoing': []},
             'stats': {'currentStreak': 0, 'longestStreak': 0, 'totalHabitsCompleted': 0},
             'createdAt': datetime.now(),
             'lastLoginAt': datetime.now()
@@ -2507,8 +2824,6 @@ def _debug_create_users():
             'uid': arundhati_uid,
             'email': 'arundhati059@gmail.com',
             'displayName': 'Arundhati',
-            'friends': [],
-            'friendRequests': {'incoming': [], 'outgoing': []},
             'stats': {'currentStreak': 5, 'longestStreak': 10, 'totalHabitsCompleted': 25},
             'createdAt': datetime.now(),
             'lastLoginAt': datetime.now()
@@ -2517,7 +2832,8 @@ def _debug_create_users():
         db.collection('users').document(arundhati_uid).set(arundhati_data)
         
         # Create user documents for all Firebase Auth users who don't have Firestore docs
-        auth_users = auth.list_users().users
+        from firebase_admin import auth
+        auth_users = auth.list_users(app=firebase_app.get()).users
         created_count = 0
         
         for auth_user in auth_users:
@@ -2527,8 +2843,6 @@ def _debug_create_users():
                     'uid': auth_user.uid,
                     'email': auth_user.email,
                     'displayName': auth_user.display_name or 'User',
-                    'friends': [],
-                    'friendRequests': {'incoming': [], 'outgoing': []},
                     'stats': {'currentStreak': 0, 'longestStreak': 0, 'totalHabitsCompleted': 0},
                     'createdAt': datetime.now(),
                     'lastLoginAt': datetime.now()
@@ -2547,7 +2861,7 @@ def _debug_create_users():
         return {'success': False, 'error': str(e)}
     
 # DELETE PROFILE
-@app.route('/api/profile/delete', methods=['DELETE'])
+@route('/api/profile/delete', methods=['DELETE'])
 def delete_profile():
     """Permanently delete the current user's account and related data."""
     if 'user_uid' not in session:
@@ -2560,50 +2874,44 @@ def delete_profile():
         if not db:
             return jsonify({'error': 'Database unavailable'}), 500
 
-        # 1. Delete this user's habits and their completions
-        habits_query = db.collection('habits').where('userID', '==', user_uid).stream()
-        for habit_doc in habits_query:
-            habit_id = habit_doc.id
-
-            # delete completions for this habit (same pattern as delete_habit)
-            completions_query = db.collection('habit_completions').where('habitID', '==', habit_id).stream()
-            for completion_doc in completions_query:
-                completion_doc.reference.delete()
-
-            habit_doc.reference.delete()
+        # 1. Delete this user's habits and their completions (same pattern as delete_habit)
+        habit_docs = list(db.collection('habits').where('userID', '==', user_uid).stream())
+        writer = BatchWriter(db)
+        completions.clear_completions(db, [h.id for h in habit_docs], writer)
+        for habit_doc in habit_docs:
+            writer.delete(habit_doc.reference)
+        writer.commit()
+        leaderboard.remove_user(user_uid)
 
         # 2. Delete this user's goals (if you have a goals collection)
         goals_query = db.collection('goals').where('userID', '==', user_uid).stream()
         for goal_doc in goals_query:
             goal_doc.reference.delete()
 
-        # 3. Remove this user from friends / requests
-        users_ref = db.collection('users')
-        all_users = users_ref.stream()
-        for other_doc in all_users:
-            if other_doc.id == user_uid:
-                continue
-            users_ref.document(other_doc.id).update({
-                'friends': firestore.ArrayRemove([user_uid]),
-                'friendRequests.incoming': firestore.ArrayRemove([user_uid]),
-                'friendRequests.outgoing': firestore.ArrayRemove([user_uid]),
-            })
+        # 3. Remove this user from friends / requests (both sides of every edge)
+        writer = BatchWriter(db)
+        user_doc = db.collection('users').document(user_uid).get()
+        _migrate_friend_graph(user_uid, user_doc.to_dict() if user_doc.exists else None)
+        friend_graph.forget_user(writer, db, user_uid)
+        writer.commit()
 
         # 4. Delete the user document itself
         db.collection('users').document(user_uid).delete()
+        if user_email:
+            user_directory.index_ref(db, user_email).delete()
+        directory.remove(user_uid)
+        journal_index.drop_user(user_uid)
 
         # 5. Clear session
         session.clear()
 
         return jsonify({'success': True}), 200
 
-    except Exception as e:
-        print("[delete_profile] Error deleting profile:", e)
-        import traceback
-        print(traceback.format_exc())
+    except Exception:
+        log.exception("error deleting profile")
         return jsonify({'error': 'Failed to delete profile'}), 500
 
-@app.route('/api/update-meal-day', methods=['POST'])
+@route('/api/update-meal-day', methods=['POST'])
 def update_meal_day():
     """Update the meals for a specific day in the active meal plan."""
     if 'user_uid' not in session:
@@ -2649,15 +2957,19 @@ def update_meal_day():
         }
 
         plan_doc.reference.update(update_data)
+        touch(user_uid, 'meals')
 
         return jsonify({'success': True, 'message': f'{day.capitalize()} meals updated successfully!'}), 200
 
-    except Exception as e:
-        print("[update_meal_day] Error updating meal day:", e)
+    except Exception:
+        log.exception("error updating meal day")
         return jsonify({'error': 'Failed to update meal day'}), 500
 
 
 
+app = create_app()  # the WSGI entry point (web_app:app) and what the tests drive
+startup_profile.finish(app, clients=[('firebase_app', firebase_app), ('firestore_client', db)])
+
 # ---------------- Run ---------------- #
 if __name__ == '__main__':
     # host/port visible to your curl and browser